@@ -5,13 +5,17 @@ from typing import Dict
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import requests
 
+import metrics
+
 # Configuración de Auth0
 AUTH0_DOMAIN = os.getenv("AUTH0_DOMAIN", "dev-n5t4wuedvu54i50n.us.auth0.com")
 API_AUDIENCE = os.getenv("AUTH0_AUDIENCE", "https://api.g6-arquisis.com")
 ALGORITHMS = ["RS256"]
 
 # Obtener y cachear las llaves públicas de Auth0
-jwks_url = f"https://{AUTH0_DOMAIN}/.well-known/jwks.json"
+# AUTH0_JWKS_URL / AUTH0_ISSUER permiten apuntar a un emisor local (loadtest/standins.py)
+jwks_url = os.getenv("AUTH0_JWKS_URL", f"https://{AUTH0_DOMAIN}/.well-known/jwks.json")
+AUTH0_ISSUER = os.getenv("AUTH0_ISSUER", f"https://{AUTH0_DOMAIN}/")
 
 # Cache de JWKS para evitar requests repetidos
 jwks_cache = None
@@ -28,8 +32,9 @@ def get_jwks():
     # Si no hay cache o el cache expiró, obtener nuevas llaves
     if jwks_cache is None or (jwks_cache_time and current_time - jwks_cache_time > JWKS_CACHE_DURATION):
         try:
-            response = requests.get(jwks_url, timeout=10)  # Timeout de 10 segundos
-            response.raise_for_status()
+            with metrics.timed("upstream", "auth0"):
+                response = requests.get(jwks_url, timeout=10)  # Timeout de 10 segundos
+                response.raise_for_status()
             jwks_cache = response.json()
             jwks_cache_time = current_time
         except requests.RequestException as e:
@@ -73,7 +78,7 @@ def verify_jwt(credentials: HTTPAuthorizationCredentials = Depends(security)) ->
                 rsa_key,
                 algorithms=ALGORITHMS,
                 audience=API_AUDIENCE,
-                issuer=f"https://{AUTH0_DOMAIN}/"
+                issuer=AUTH0_ISSUER
             )
             return payload
         else:
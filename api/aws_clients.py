@@ -0,0 +1,61 @@
+"""
+Clientes de AWS compartidos por el proceso (S3 y Lambda de boletas).
+
+boto3.client(...) resuelve credenciales, región y endpoints cada vez que se crea; antes se
+creaba uno por solicitud. Aquí se crean una sola vez, al primer uso y bajo un lock (los
+clientes de boto3 son thread-safe una vez creados; la creación no lo es), con un pool de
+conexiones HTTP del tamaño del threadpool de la API y timeouts acotados para que una
+Lambda lenta no retenga un hilo indefinidamente.
+"""
+
+import os
+import threading
+
+try:
+    import boto3
+    from botocore.config import Config
+except ImportError:
+    boto3 = None
+    Config = None
+
+AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "40"))
+# La invocación síncrona espera a que la Lambda genere el PDF; la asíncrona solo encola
+LAMBDA_READ_TIMEOUT = int(os.getenv("LAMBDA_READ_TIMEOUT", "30"))
+
+S3_RECEIPTS_BUCKET = os.getenv("S3_RECEIPTS_BUCKET", "g6-arquisis-receipts-dev")
+LAMBDA_PDF_FUNCTION = os.getenv("LAMBDA_PDF_FUNCTION", "g6-arquisis-pdf-service-dev-generateReceipt")
+
+_lock = threading.Lock()
+_clients = {}
+
+
+def _config(read_timeout):
+    return Config(
+        region_name=AWS_REGION,
+        max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+        connect_timeout=5,
+        read_timeout=read_timeout,
+        retries={"max_attempts": 3, "mode": "standard"},
+    )
+
+
+def _client(service, read_timeout=10):
+    client = _clients.get(service)
+    if client is not None:
+        return client
+    if boto3 is None:
+        raise RuntimeError("boto3 no está instalado")
+    with _lock:
+        if service not in _clients:
+            # una sesión propia: boto3.client() usa la sesión global, que no es thread-safe
+            _clients[service] = boto3.session.Session().client(service, config=_config(read_timeout))
+        return _clients[service]
+
+
+def s3():
+    return _client("s3")
+
+
+def lambda_():
+    return _client("lambda", read_timeout=LAMBDA_READ_TIMEOUT)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Benchmark de /my-properties contra la BD: consulta anterior (p.* de todas las solicitudes
+del usuario, dict armado filtrando claves) vs la paginada por cursor con columnas
+proyectadas, completa y compact. Mide latencia (consulta + armado de filas + JSON) y
+tamaño del JSON de respuesta.
+
+Con --seed N crea un usuario sintético con N solicitudes dentro de una transacción que se
+revierte al terminar (no deja datos). Sin --seed usa --user-id.
+
+Uso: python bench_my_properties.py --seed 2000 [--limit 50] [--runs 20]
+     python bench_my_properties.py --user-id auth0|abc [--limit 50]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+import uuid
+
+import psycopg2
+from dotenv import load_dotenv
+from psycopg2.extras import RealDictCursor
+
+load_dotenv()
+
+# Igual que main.py (no se importa main para no levantar FastAPI/MQTT)
+MY_PROPERTY_COLUMNS = ("id", "name", "price", "currency", "bedrooms", "bathrooms", "m2",
+                       "location", "img", "url", "is_project", "timestamp", "visit_slots")
+MY_PROPERTY_SUMMARY_COLUMNS = ("name", "price", "currency", "img", "url")
+
+
+def old_query(cur, user_id):
+    cur.execute("""
+        SELECT pr.request_id, pr.url, pr.status, pr.created_at, pr.amount,
+               pr.status = 'ACCEPTED' AS has_receipt,
+               p.*
+        FROM purchase_requests pr
+        LEFT JOIN properties p ON pr.url = p.url
+        WHERE pr.user_id = %s
+        ORDER BY pr.created_at DESC
+    """, (user_id,))
+    result = []
+    for r in cur.fetchall():
+        property_obj = {k: r[k] for k in r.keys() if k not in ["request_id", "url", "status", "created_at", "amount", "has_receipt"]}
+        result.append({
+            "request_id": str(r["request_id"]), "url": r["url"], "status": r["status"],
+            "created_at": r["created_at"].isoformat() + "Z",
+            "amount": float(r["amount"]) if r["amount"] is not None else 0.0,
+            "has_receipt": bool(r["has_receipt"]), "property": property_obj
+        })
+    return result, None
+
+
+def new_query(cur, user_id, limit, compact, after=None):
+    columns = MY_PROPERTY_SUMMARY_COLUMNS if compact else MY_PROPERTY_COLUMNS
+    params = [user_id, *(after or ()), limit + 1]
+    cur.execute(f"""
+        SELECT pr.request_id, pr.url AS request_url, pr.status, pr.created_at, pr.amount,
+               pr.status = 'ACCEPTED' AS has_receipt,
+               {", ".join(f"p.{c} AS p_{c}" for c in columns)}
+        FROM purchase_requests pr
+        LEFT JOIN properties p ON pr.url = p.url
+        WHERE pr.user_id = %s {"AND (pr.created_at, pr.request_id) < (%s, %s)" if after else ""}
+        ORDER BY pr.created_at DESC, pr.request_id DESC
+        LIMIT %s
+    """, params)
+    rows = cur.fetchall()
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after = (rows[-1]["created_at"], rows[-1]["request_id"])
+    return [{
+        "request_id": str(r["request_id"]), "url": r["request_url"], "status": r["status"],
+        "created_at": r["created_at"].isoformat() + "Z",
+        "amount": float(r["amount"]) if r["amount"] is not None else 0.0,
+        "has_receipt": bool(r["has_receipt"]),
+        "property": {c: r[f"p_{c}"] for c in columns}
+    } for r in rows], next_after
+
+
+def seed(cur, n):
+    user_id = f"bench|{uuid.uuid4().hex[:12]}"
+    cur.execute("INSERT INTO users (user_id, name, email) VALUES (%s, 'Bench', %s)",
+                (user_id, f"{user_id}@bench.local"))
+    cur.execute("SELECT url FROM properties ORDER BY id LIMIT 500")
+    urls = [r["url"] for r in cur.fetchall()] or ["https://bench.local/sin-propiedad"]
+    cur.execute("""
+        INSERT INTO purchase_requests (request_id, user_id, group_id, url, status, amount, created_at)
+        SELECT gen_random_uuid(), %s, 'bench', (%s::text[])[1 + i %% %s],
+               (ARRAY['ACCEPTED','PENDING','REJECTED'])[1 + i %% 3]::request_status,
+               1000 + i, NOW() - make_interval(mins => i)
+        FROM generate_series(1, %s) AS i
+    """, (user_id, urls, len(urls), n))
+    cur.execute("ANALYZE purchase_requests")
+    return user_id
+
+
+def measure(fn, runs):
+    times = []
+    for _ in range(runs):
+        t = time.perf_counter()
+        rows, after = fn()
+        body = json.dumps(rows, default=str)
+        times.append((time.perf_counter() - t) * 1000)
+    return statistics.median(times), len(body), len(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latencia y tamaño de /my-properties")
+    parser.add_argument("--user-id")
+    parser.add_argument("--seed", type=int, help="Crea un usuario sintético con N solicitudes")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    if not args.user_id and not args.seed:
+        parser.error("usar --user-id o --seed")
+
+    conn = psycopg2.connect(
+        dbname=os.getenv("DB_NAME"), user=os.getenv("DB_USER"), password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST", "localhost"), port=os.getenv("DB_PORT", "5432"),
+        cursor_factory=RealDictCursor,
+    )
+    cur = conn.cursor()
+    try:
+        user_id = seed(cur, args.seed) if args.seed else args.user_id
+        cases = [
+            ("antes: todo, p.*", lambda: old_query(cur, user_id)),
+            (f"página de {args.limit}", lambda: new_query(cur, user_id, args.limit, False)),
+            (f"página de {args.limit}, compact", lambda: new_query(cur, user_id, args.limit, True)),
+        ]
+        print(f"🧪 /my-properties de {user_id} (mediana de {args.runs} corridas)")
+        print("=" * 64)
+        base = None
+        for name, fn in cases:
+            ms, size, n = measure(fn, args.runs)
+            base = base or (ms, size)
+            print(f"   {name:28s} {n:6d} filas {ms:8.2f} ms {size / 1024:9.1f} KiB"
+                  f"  ({ms / base[0]:.2f}x tiempo, {size / base[1]:.2f}x bytes)")
+
+        # recorrer todas las páginas con el cursor
+        t = time.perf_counter()
+        pages = total = 0
+        after = None
+        while True:
+            rows, after = new_query(cur, user_id, args.limit, False, after)
+            pages += 1
+            total += len(rows)
+            if after is None:
+                break
+        print(f"   recorrido completo por cursor: {total} filas en {pages} páginas, "
+              f"{(time.perf_counter() - t) * 1000:.1f} ms")
+    finally:
+        conn.rollback()  # los datos sintéticos no quedan
+        cur.close()
+        conn.close()
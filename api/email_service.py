@@ -1,3 +1,4 @@
+import logging
 import os
 import smtplib
 from email.mime.text import MIMEText
@@ -5,6 +6,8 @@ from email.mime.multipart import MIMEMultipart
 from typing import Optional
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 class EmailService:
     """
     Servicio para envío de correos electrónicos mediante SMTP.
@@ -40,11 +43,11 @@ class EmailService:
             bool: True si se envió exitosamente, False en caso contrario
         """
         if not self.enabled:
-            print(f"📧 Email deshabilitado. No se enviará email a {to_email}")
+            logger.debug("Email deshabilitado; no se envía", extra={"event": "email.disabled"})
             return False
             
         if not self.smtp_user or not self.smtp_password:
-            print("⚠️ Credenciales SMTP no configuradas. No se puede enviar email.")
+            logger.warning("Credenciales SMTP no configuradas; no se puede enviar email", extra={"event": "email.failed"})
             return False
             
         try:
@@ -70,11 +73,11 @@ class EmailService:
                 server.login(self.smtp_user, self.smtp_password)
                 server.send_message(msg)
             
-            print(f"✅ Email enviado exitosamente a {to_email}")
+            logger.info("Email enviado", extra={"event": "email.sent", "subject": subject})
             return True
             
         except Exception as e:
-            print(f"❌ Error al enviar email a {to_email}: {e}")
+            logger.warning("Error al enviar email: %s", e, extra={"event": "email.failed", "subject": subject})
             return False
     
     def send_payment_confirmation(
@@ -0,0 +1,161 @@
+"""
+Logging estructurado y no bloqueante, común a los servicios.
+
+setup(service) configura el logger raíz una sola vez por proceso:
+- Una línea JSON por registro (ts, level, service, logger, msg, los campos pasados en
+  extra=... y exc con el traceback). LOG_FORMAT=text da líneas legibles para desarrollo.
+- QueueHandler + QueueListener: quien loguea solo encola el registro; el formateo y la
+  escritura a stdout ocurren en el hilo del listener. La cola es acotada (LOG_QUEUE_SIZE):
+  si se llena se descarta el registro y se cuenta, en vez de bloquear un request.
+- LOG_LEVEL (INFO por defecto).
+- Muestreo de eventos de alto volumen: los registros con extra={"event": nombre} bajo
+  WARNING se dejan pasar con la tasa de ese evento (sample_rates del servicio, sobrescrita
+  por LOG_SAMPLE_RATES="mqtt.message=0.01,email.sent=0.1"). El registro lleva la tasa en
+  sample_rate para poder extrapolar conteos.
+
+Con fork (prefork de Celery) el hilo del listener no pasa al hijo: se crea uno nuevo en
+cada proceso hijo.
+
+Debe ser idéntico en api/, mqtt_listener/, jobmaster/ y jobmaster/worker/ (cada servicio
+se construye por separado); scripts/check_shared_modules.py lo verifica en CI.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import traceback
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Atributos propios de LogRecord: lo demás viene de extra=... y va como campo del JSON
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_service = None
+_handler = None
+_listener = None
+
+
+def parse_rates(spec):
+    rates = {}
+    for part in (spec or "").split(","):
+        name, _, rate = part.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "service": _service,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        event = getattr(record, "event", None)
+        if event is None or record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(event, 1.0)
+        if rate >= 1.0:
+            return True
+        record.sample_rate = rate
+        return random.random() < rate
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    dropped = 0
+
+    def prepare(self, record):
+        # Se resuelve aquí lo que depende del hilo que loguea (args, traceback)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info)).rstrip()
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _NonBlockingQueueHandler.dropped += 1
+
+
+def _stream_handler():
+    handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "text":
+        handler.setFormatter(logging.Formatter(
+            f"%(asctime)s %(levelname)s [{_service}] %(name)s: %(message)s"))
+    else:
+        handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def _start_listener():
+    global _listener
+    _handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+    _listener = QueueListener(_handler.queue, _stream_handler(), respect_handler_level=False)
+    _listener.start()
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()  # vacía la cola antes de salir
+
+
+def setup(service, sample_rates=None, capture=()):
+    """
+    Configura el logging del proceso (idempotente) y retorna el logger del servicio.
+    `capture`: loggers que traen sus propios handlers (p. ej. los de uvicorn) y deben
+    pasar por la cola.
+    """
+    global _service, _handler
+    if _handler is not None:
+        return logging.getLogger(service)
+    _service = service
+
+    rates = {**(sample_rates or {}), **parse_rates(os.getenv("LOG_SAMPLE_RATES"))}
+    _handler = _NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _handler.addFilter(SamplingFilter(rates))
+    _start_listener()
+
+    root = logging.getLogger()
+    root.handlers = [_handler]
+    root.setLevel(LOG_LEVEL)
+    for name in capture:
+        captured = logging.getLogger(name)
+        captured.handlers = []
+        captured.propagate = True
+
+    atexit.register(_stop_listener)
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_start_listener)
+    return logging.getLogger(service)
+
+
+def dropped():
+    """Registros descartados por cola llena en este proceso."""
+    return _NonBlockingQueueHandler.dropped
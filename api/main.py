@@ -1,9 +1,4 @@
-from fastapi.responses import StreamingResponse
-import io
-try:
-    from reportlab.pdfgen import canvas
-except ImportError:
-    canvas = None
+from fastapi.responses import FileResponse, JSONResponse
 
 import os
 from fastapi import (
@@ -20,22 +15,38 @@ from fastapi import (
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from datetime import datetime, timezone, date
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 import uuid
 from pydantic import BaseModel
 import paho.mqtt.client as mqtt
 import uuid as uuidlib
 from time import sleep
+import threading
 import json
+import base64
 from webpay_service import WebPayService
 from jobs_client import jobs_auth_client
 import requests
+import httpx
+from urllib.parse import unquote, urlparse
 
 # Importar la dependencia de autenticación
 from auth import verify_jwt
 from email_service import EmailService
+import aws_clients
+import receipt_keys
+import receipt_renderer
+import metrics
+import profiling
+import log_config
+
+# JSON a stdout a través de una cola (ver log_config.py); también los logs de uvicorn
+logger = log_config.setup(
+    "api",
+    sample_rates={"email.sent": 0.1},
+    capture=("uvicorn", "uvicorn.error", "uvicorn.access"),
+)
 
 # Crear instancia del servicio WebPay y Email
 webpay_service = WebPayService()
@@ -97,6 +108,13 @@ class PurchaseDetail(BaseModel):
     authorization_code: Optional[str] = None
 
 def mqtt_publish_with_fibonacci(topic: str, payload: str, max_retries: int = 6):
+    with metrics.timed("mqtt", topic) as span:
+        ok = _mqtt_publish_with_fibonacci(topic, payload, max_retries)
+        if not ok:
+            span["outcome"] = "error"
+    return ok
+
+def _mqtt_publish_with_fibonacci(topic: str, payload: str, max_retries: int):
     fib = [1, 1]
     for _ in range(max_retries - 2):
         fib.append(fib[-1] + fib[-2])
@@ -121,16 +139,18 @@ def mqtt_publish_with_fibonacci(topic: str, payload: str, max_retries: int = 6):
             attempt += 1
 
 def get_connection():
-    return psycopg2.connect(
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        host=DB_HOST,
-        port=DB_PORT,
-        cursor_factory=RealDictCursor,
-        connect_timeout=10,  # Timeout de conexión de 10 segundos
-        application_name="fastapi_app"
-    )
+    # TimedCursor: RealDictCursor que suma el tiempo de cada consulta al request (metrics.py)
+    with metrics.timed("db_connect"):
+        return psycopg2.connect(
+            dbname=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            host=DB_HOST,
+            port=DB_PORT,
+            cursor_factory=metrics.TimedCursor,
+            connect_timeout=10,  # Timeout de conexión de 10 segundos
+            application_name="fastapi_app"
+        )
 
 def ensure_user_exists(user_id: str, name: str, email: str, phone: str = None):
     """Crear usuario si no existe, NO actualizar si existe"""
@@ -303,7 +323,7 @@ def upsert_admin_discount(property_url: str, discount_percent: float, active: bo
 
 
 # ===== Helper para encolar recomendaciones en JobMaster =====
-def enqueue_recommendations(
+def _recommendations_payload(
     user_id: str,
     property_id: Optional[str] = None,
     prefs: Optional[dict] = None,
@@ -312,12 +332,8 @@ def enqueue_recommendations(
     location: Optional[str] = None,
     bedrooms: Optional[int] = None,
     bathrooms: Optional[int] = None
-) -> Optional[str]:
-    """
-    Llama al JobMaster para crear un job de recomendaciones.
-    Devuelve el job_id o None si falla (no interrumpe el flujo).
-    """
-    payload = {
+) -> dict:
+    return {
         "user_id": user_id,
         "property_id": property_id,
         "preferences": prefs or {},
@@ -327,16 +343,74 @@ def enqueue_recommendations(
         "bedrooms": bedrooms,
         "bathrooms": bathrooms
     }
+
+
+def enqueue_recommendations(
+    user_id: str,
+    property_id: Optional[str] = None,
+    prefs: Optional[dict] = None,
+    budget_min: Optional[float] = None,
+    budget_max: Optional[float] = None,
+    location: Optional[str] = None,
+    bedrooms: Optional[int] = None,
+    bathrooms: Optional[int] = None
+) -> Optional[str]:
+    """
+    Llama al JobMaster para crear un job de recomendaciones.
+    Devuelve el job_id o None si falla (no interrumpe el flujo).
+    """
+    payload = _recommendations_payload(
+        user_id, property_id, prefs, budget_min, budget_max, location, bedrooms, bathrooms
+    )
     try:
-        r = requests.post(f"{WORKER_SERVICE_URL}/job", json=payload, timeout=6)
-        r.raise_for_status()
+        with metrics.timed("upstream", "jobmaster"):
+            r = requests.post(f"{WORKER_SERVICE_URL}/job", json=payload, timeout=6)
+            r.raise_for_status()
         data = r.json() if r.content else {}
         return (data or {}).get("job_id")
     except Exception as e:
-        print(f"[WARN] enqueue_recommendations failed: {e}")
+        logger.warning("enqueue_recommendations falló: %s", e, extra={"event": "recs.enqueue_failed"})
         return None
 
 
+# Para quien no necesita el job_id: se juntan las solicitudes de una ventana corta y se
+# envían en un solo POST /jobs/batch (un pipeline de Redis + un group de Celery en JobMaster).
+RECS_BATCH_WINDOW_SECONDS = float(os.getenv("RECS_BATCH_WINDOW_SECONDS", "0.25"))
+RECS_BATCH_MAX = 500
+_recs_pending: list = []
+_recs_cond = threading.Condition()
+_recs_thread: Optional[threading.Thread] = None
+
+
+def _recs_batch_loop():
+    while True:
+        with _recs_cond:
+            while not _recs_pending:
+                _recs_cond.wait()
+        sleep(RECS_BATCH_WINDOW_SECONDS)
+        with _recs_cond:
+            batch = _recs_pending[:RECS_BATCH_MAX]
+            del _recs_pending[:RECS_BATCH_MAX]
+        try:
+            with metrics.timed("upstream", "jobmaster"):
+                r = requests.post(f"{WORKER_SERVICE_URL}/jobs/batch", json={"jobs": batch}, timeout=10)
+                r.raise_for_status()
+        except Exception as e:
+            logger.warning("enqueue_recommendations por lote falló: %s", e,
+                           extra={"event": "recs.enqueue_failed", "jobs": len(batch)})
+
+
+def enqueue_recommendations_deferred(**kwargs) -> None:
+    """Como enqueue_recommendations, pero asíncrono y agrupado; no retorna job_id."""
+    global _recs_thread
+    with _recs_cond:
+        if _recs_thread is None:
+            _recs_thread = threading.Thread(target=_recs_batch_loop, name="recs-batch", daemon=True)
+            _recs_thread.start()
+        _recs_pending.append(_recommendations_payload(**kwargs))
+        _recs_cond.notify()
+
+
 app = FastAPI(title="API de Propiedades")
 
 # Configuración de CORS para permitir el frontend
@@ -355,10 +429,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
     allow_headers=["*"],
-    expose_headers=["*"],
+    # Con allow_credentials el navegador ignora el comodín: los headers que el frontend lee
+    # (el cursor de /my-properties) van explícitos
+    expose_headers=["*", "X-Next-Cursor", "X-Instance-Name"],
     max_age=86400,
 )
 
+# Latencia por ruta, requests en curso y tiempos de BD/MQTT/upstream (ver metrics.py y /metrics).
+# Se agrega al final para quedar por fuera de CORS y medir el request completo.
+# ProfilingMiddleware no hace nada mientras el profiling esté apagado (/admin/profiling).
+app.add_middleware(profiling.ProfilingMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Endpoint adicional para manejar preflight requests
 @app.options("/{path:path}")
 async def options_handler(path: str):
@@ -568,6 +650,15 @@ class AdminDiscountResponse(BaseModel):
     url: str
     discount_percent: float
 
+
+class ProfilingRequest(BaseModel):
+    enabled: bool = True
+    sample_rate: float = 0.1          # fracción de requests que encienden el sampler (0-1)
+    interval_ms: float = 5.0
+    duration_seconds: int = 300       # se apaga solo
+    slow_query_ms: Optional[float] = None
+    reset: bool = False               # descarta las muestras y consultas lentas anteriores
+
 @app.get("/properties")
 def list_properties(
     response: Response,
@@ -929,7 +1020,7 @@ def purchase_property(purchase_data: PurchaseRequest, user: dict = Depends(verif
             prefs=None
         )
     except Exception as e:
-        print(f"[WARN] enqueue_recommendations (purchase) failed: {e}")
+        logger.warning("enqueue_recommendations (purchase) falló: %s", e, extra={"event": "recs.enqueue_failed"})
 
     return PurchaseResponse(
         new_balance=new_balance,
@@ -957,6 +1048,14 @@ def health_check():
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/metrics")
+def metrics_endpoint():
+    """Métricas en formato Prometheus (requiere prometheus_client)"""
+    body, content_type = metrics.render()
+    if body is None:
+        raise HTTPException(status_code=503, detail="prometheus_client no está instalado")
+    return Response(content=body, media_type=content_type)
+
 @app.get("/health/db")
 def health_check_db():
     """Verificar conectividad a la base de datos"""
@@ -997,7 +1096,8 @@ def auth_test(user: dict = Depends(verify_jwt)):
 @app.post("/jobs/test")
 def jobs_test(user: dict = Depends(verify_jwt)):
     """Endpoint de prueba que invoca al workers service protegido con access token."""
-    result = jobs_auth_client.call_workers_echo({"hello": "world"})
+    with metrics.timed("upstream", "workers_service"):
+        result = jobs_auth_client.call_workers_echo({"hello": "world"})
     return result
 
 @app.post("/visits/request", response_model=VisitRequestOut)
@@ -1132,7 +1232,7 @@ def create_visit_request(
             finally:
                 cur2.close(); conn2.close()
     except Exception as e:
-        print(f"Failed to create recommendation job: {str(e)}")
+        logger.warning("No se pudo crear el job de recomendaciones: %s", e, extra={"event": "recs.enqueue_failed"})
 
     enqueue_purchase_event(background_tasks, "purchase_requested", {
         "request_id": str(request_id),
@@ -1191,11 +1291,31 @@ def get_purchase_detail(purchase_id: str, user: dict = Depends(verify_jwt)):
         cur.close()
         conn.close()
 
+# Con RECEIPTS_ASYNC la Lambda se invoca en modo Event y el endpoint responde 202 de
+# inmediato; el cliente consulta /receipt/status hasta que la boleta esté lista.
+RECEIPTS_ASYNC = os.getenv("RECEIPTS_ASYNC", "true").lower() == "true"
+# Una boleta PENDING más antigua que esto se da por perdida (la Lambda falló) y se reintenta
+RECEIPT_PENDING_TIMEOUT_SECONDS = int(os.getenv("RECEIPT_PENDING_TIMEOUT_SECONDS", "120"))
+
+def _receipt_pending_response(purchase_id: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=202,
+        content={
+            "status": "pending",
+            "status_url": f"/purchases/{purchase_id}/receipt/status",
+            "retry_after": 2
+        },
+        headers={"Retry-After": "2"}
+    )
+
 @app.get("/purchases/{purchase_id}/receipt")
 def get_purchase_receipt(purchase_id: str, user: dict = Depends(verify_jwt)):
     """
     Entrega el PDF de la boleta de compra si la compra está ACCEPTED.
     Ahora usa AWS Lambda para generar el PDF y lo almacena en S3.
+    La URL queda en purchase_requests.receipt_url (normalmente la pre-genera el
+    mqtt_listener al aceptarse la compra), así que las siguientes solicitudes solo leen la BD.
+    Si aún no existe y RECEIPTS_ASYNC está activo, encola la Lambda y responde 202.
     """
     user_id = user.get("sub")
     conn = get_connection()
@@ -1204,13 +1324,16 @@ def get_purchase_receipt(purchase_id: str, user: dict = Depends(verify_jwt)):
     try:
         cur.execute("""
             SELECT pr.request_id, pr.url, pr.status, pr.created_at, pr.amount,
-                   pr.authorization_code, pr.status = 'ACCEPTED' AS has_receipt,
+                   pr.authorization_code, pr.status = 'ACCEPTED' AS has_receipt, pr.receipt_url,
+                   pr.receipt_status,
+                   COALESCE(pr.receipt_requested_at > CURRENT_TIMESTAMP - make_interval(secs => %s), FALSE)
+                       AS receipt_in_flight,
                    p.*, u.name as user_name, u.email as user_email, u.phone as user_phone
             FROM purchase_requests pr
             LEFT JOIN properties p ON pr.url = p.url
             LEFT JOIN users u ON pr.user_id = u.user_id
             WHERE pr.request_id = %s AND pr.user_id = %s
-        """, (purchase_id, user_id))
+        """, (RECEIPT_PENDING_TIMEOUT_SECONDS, purchase_id, user_id))
         
         r = cur.fetchone()
         
@@ -1220,13 +1343,26 @@ def get_purchase_receipt(purchase_id: str, user: dict = Depends(verify_jwt)):
         if not r["has_receipt"]:
             raise HTTPException(status_code=403, detail="La compra aún no está aceptada, no hay boleta disponible")
         
-        existing_pdf_url = check_existing_pdf(purchase_id)
-        if existing_pdf_url:
-            return {"pdf_url": existing_pdf_url, "cached": True}
+        if r["receipt_url"]:
+            return {"pdf_url": r["receipt_url"], "cached": True}
+
+        if r["receipt_status"] == "PENDING" and r["receipt_in_flight"]:
+            return _receipt_pending_response(purchase_id)
+
+        # Boletas generadas antes de guardar la URL en la BD
+        if r["receipt_status"] is None:
+            existing_pdf_url = check_existing_pdf(r)
+            if existing_pdf_url:
+                save_receipt_url(conn, purchase_id, existing_pdf_url)
+                return {"pdf_url": existing_pdf_url, "cached": True}
+
+        if RECEIPTS_ASYNC and request_receipt_async(conn, purchase_id, r):
+            return _receipt_pending_response(purchase_id)
         
         pdf_url = generate_pdf_with_lambda(r, user)
         
         if pdf_url:
+            save_receipt_url(conn, purchase_id, pdf_url)
             return {"pdf_url": pdf_url, "cached": False}
         else:
             return generate_pdf_local_fallback(r)
@@ -1235,116 +1371,106 @@ def get_purchase_receipt(purchase_id: str, user: dict = Depends(verify_jwt)):
         cur.close()
         conn.close()
 
-def check_existing_pdf(purchase_id: str) -> Optional[str]:
+@app.get("/purchases/{purchase_id}/receipt/status")
+def get_purchase_receipt_status(purchase_id: str, user: dict = Depends(verify_jwt)):
     """
-    Verifica si ya existe un PDF para esta compra en S3
+    Estado de la boleta: ready (con pdf_url), pending (202), failed o not_requested.
+    Mientras está pending revisa si la Lambda ya subió el PDF a S3.
     """
+    user_id = user.get("sub")
+    conn = get_connection()
+    cur = conn.cursor()
     try:
-        import boto3
-        s3_client = boto3.client('s3')
-        bucket_name = os.getenv('S3_RECEIPTS_BUCKET', 'g6-arquisis-receipts-dev')
-        
-        response = s3_client.list_objects_v2(
-            Bucket=bucket_name,
-            Prefix=f"receipts/boleta_{purchase_id}_"
-        )
-        
-        if 'Contents' in response and response['Contents']:
-            latest_file = max(response['Contents'], key=lambda x: x['LastModified'])
-            return f"https://{bucket_name}.s3.amazonaws.com/{latest_file['Key']}"
-        
+        cur.execute("""
+            SELECT pr.receipt_url, pr.receipt_key, pr.receipt_status,
+                   COALESCE(pr.receipt_requested_at > CURRENT_TIMESTAMP - make_interval(secs => %s), FALSE)
+                       AS receipt_in_flight
+            FROM purchase_requests pr
+            WHERE pr.request_id = %s AND pr.user_id = %s
+        """, (RECEIPT_PENDING_TIMEOUT_SECONDS, purchase_id, user_id))
+        r = cur.fetchone()
+        if not r:
+            raise HTTPException(status_code=403, detail="No tienes acceso a esta compra o no existe")
+
+        if r["receipt_url"]:
+            return {"status": "ready", "pdf_url": r["receipt_url"]}
+        if r["receipt_status"] != "PENDING":
+            return {"status": (r["receipt_status"] or "not_requested").lower()}
+
+        # receipt_key es la key que calculó quien encoló la Lambda: un HEAD basta
+        pdf_url = receipt_key_url(r["receipt_key"]) if r["receipt_key"] else None
+        if pdf_url:
+            save_receipt_url(conn, purchase_id, pdf_url)
+            return {"status": "ready", "pdf_url": pdf_url}
+        if r["receipt_in_flight"]:
+            return _receipt_pending_response(purchase_id)
+
+        cur.execute("""
+            UPDATE purchase_requests SET receipt_status = 'FAILED'
+            WHERE request_id = %s AND receipt_url IS NULL AND receipt_status = 'PENDING'
+        """, (purchase_id,))
+        conn.commit()
+        return {"status": "failed"}
+    finally:
+        cur.close()
+        conn.close()
+
+def save_receipt_url(conn, purchase_id: str, pdf_url: str):
+    """Guarda la URL (y la key de S3) de la boleta; si ya había una, se mantiene."""
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            UPDATE purchase_requests
+               SET receipt_url = %s, receipt_key = %s, receipt_status = 'READY',
+                   receipt_generated_at = CURRENT_TIMESTAMP
+             WHERE request_id = %s AND receipt_url IS NULL
+        """, (pdf_url, unquote(urlparse(pdf_url).path.lstrip("/")), purchase_id))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error("Error guardando la URL de la boleta: %s", e, extra={"event": "receipt.save_failed"})
+    finally:
+        cur.close()
+
+def receipt_key_url(key: str) -> Optional[str]:
+    """URL pública de la boleta si el objeto existe en S3 (HEAD), si no None"""
+    try:
+        bucket_name = aws_clients.S3_RECEIPTS_BUCKET
+        with metrics.timed("upstream", "s3"):
+            found = receipt_keys.exists(aws_clients.s3(), bucket_name, key)
+        if found:
+            return receipt_keys.public_url(bucket_name, key)
         return None
     except Exception as e:
-        print(f"Error checking existing PDF: {e}")
+        logger.warning("Error consultando la boleta en S3: %s", e, extra={"event": "receipt.head_failed"})
         return None
 
-def _convert_decimals(obj):
+def check_existing_pdf(purchase_data: dict) -> Optional[str]:
     """
-    Convierte recursivamente todos los Decimal, datetime, date y UUID a tipos serializables JSON
+    Verifica si ya existe en S3 la boleta con estos datos (key direccionada por contenido,
+    ver receipt_keys.py)
     """
-    from decimal import Decimal
-    import uuid
-    
-    if isinstance(obj, Decimal):
-        return float(obj)
-    elif isinstance(obj, datetime):
-        return obj.isoformat() + 'Z'
-    elif isinstance(obj, date):
-        return obj.isoformat()
-    elif isinstance(obj, uuid.UUID):
-        return str(obj)
-    elif isinstance(obj, dict):
-        return {k: _convert_decimals(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [_convert_decimals(item) for item in obj]
-    elif isinstance(obj, tuple):
-        return tuple(_convert_decimals(item) for item in obj)
-    elif isinstance(obj, set):
-        return [_convert_decimals(item) for item in obj]
-    elif hasattr(obj, '__dict__'):
-        return _convert_decimals(obj.__dict__)
-    return obj
+    return receipt_key_url(_receipt_key(purchase_data))
+
+def _receipt_payload(purchase_data: dict) -> str:
+    """Evento de la Lambda de boletas (JSON) a partir de la fila de la compra (receipt_keys.py)."""
+    return receipt_keys.event_payload(purchase_data, GROUP_ID)
+
+def _receipt_key(purchase_data: dict) -> str:
+    """Key de S3 que usará la Lambda para este payload (calculada sobre el JSON que recibe)"""
+    return receipt_keys.receipt_key(json.loads(_receipt_payload(purchase_data)))
 
 def generate_pdf_with_lambda(purchase_data: dict, user_data: dict) -> Optional[str]:
     """
-    Genera PDF usando AWS Lambda
+    Genera PDF usando AWS Lambda (invocación síncrona: espera a que suba el PDF)
     """
     try:
-        import boto3
-        import json
-        from decimal import Decimal
-        
-        lambda_client = boto3.client('lambda')
-        function_name = os.getenv('LAMBDA_PDF_FUNCTION', 'g6-arquisis-pdf-service-dev-generateReceipt')
-        
-        purchase_data_clean = _convert_decimals(dict(purchase_data))
-        
-        payload = {
-            "purchase_data": {
-                "request_id": str(purchase_data_clean['request_id']),
-                "amount": purchase_data_clean.get('amount', 0.0),
-                "status": purchase_data_clean.get('status', ''),
-                "created_at": purchase_data_clean.get('created_at', ''),
-                "authorization_code": purchase_data_clean.get('authorization_code')
-            },
-            "user_data": {
-                "name": purchase_data_clean.get('user_name', ''),
-                "email": purchase_data_clean.get('user_email', ''),
-                "phone": purchase_data_clean.get('user_phone', '')
-            },
-            "property_data": {
-                "name": purchase_data_clean.get('name', ''),
-                "price": purchase_data_clean.get('price', 0.0) if purchase_data_clean.get('price') is not None else 0.0,
-                "currency": purchase_data_clean.get('currency', 'CLP'),
-                "url": purchase_data_clean['url'],
-                "location": purchase_data_clean.get('location'),
-                "bedrooms": purchase_data_clean.get('bedrooms'),
-                "bathrooms": purchase_data_clean.get('bathrooms'),
-                "m2": purchase_data_clean.get('m2')
-            },
-            "group_id": GROUP_ID
-        }
-        
-        payload = _convert_decimals(payload)
-        
-        def json_serializer(obj):
-            from decimal import Decimal
-            import uuid
-            if isinstance(obj, Decimal):
-                return float(obj)
-            elif isinstance(obj, datetime):
-                return obj.isoformat() + 'Z'
-            elif isinstance(obj, date):
-                return obj.isoformat()
-            elif isinstance(obj, uuid.UUID):
-                return str(obj)
-            raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
-        
-        response = lambda_client.invoke(
-            FunctionName=function_name,
-            InvocationType='RequestResponse',
-            Payload=json.dumps(payload, default=json_serializer)
-        )
+        with metrics.timed("upstream", "lambda"):
+            response = aws_clients.lambda_().invoke(
+                FunctionName=aws_clients.LAMBDA_PDF_FUNCTION,
+                InvocationType='RequestResponse',
+                Payload=_receipt_payload(purchase_data)
+            )
         
         result = json.loads(response['Payload'].read())
         
@@ -1352,90 +1478,195 @@ def generate_pdf_with_lambda(purchase_data: dict, user_data: dict) -> Optional[s
             body = json.loads(result['body'])
             return body.get('pdf_url')
         else:
-            print(f"Lambda error: {result}")
+            logger.error("La Lambda de boletas respondió con error: %s", result, extra={"event": "receipt.lambda_failed"})
             return None
             
     except Exception as e:
-        print(f"Error calling Lambda: {e}")
+        logger.error("Error llamando a la Lambda de boletas: %s", e, extra={"event": "receipt.lambda_failed"})
         return None
 
+def request_receipt_async(conn, purchase_id: str, purchase_data: dict) -> bool:
+    """
+    Marca la boleta como PENDING e invoca la Lambda en modo Event (retorna apenas AWS
+    acepta el evento). True si quedó una generación en curso (esta u otra concurrente);
+    False si no se pudo encolar y hay que generarla de forma síncrona.
+    """
+    cur = conn.cursor()
+    try:
+        # solo un request encola: el resto ve la fila ya PENDING y responde 202
+        payload = _receipt_payload(purchase_data)
+        cur.execute("""
+            UPDATE purchase_requests
+               SET receipt_status = 'PENDING', receipt_requested_at = CURRENT_TIMESTAMP,
+                   receipt_key = %s
+             WHERE request_id = %s AND receipt_url IS NULL
+               AND (receipt_status IS DISTINCT FROM 'PENDING'
+                    OR receipt_requested_at < CURRENT_TIMESTAMP - make_interval(secs => %s))
+            RETURNING request_id
+        """, (receipt_keys.receipt_key(json.loads(payload)), purchase_id, RECEIPT_PENDING_TIMEOUT_SECONDS))
+        claimed = cur.fetchone() is not None
+        conn.commit()
+        if not claimed:
+            return True
+
+        try:
+            with metrics.timed("upstream", "lambda"):
+                aws_clients.lambda_().invoke(
+                    FunctionName=aws_clients.LAMBDA_PDF_FUNCTION,
+                    InvocationType='Event',
+                    Payload=payload
+                )
+            return True
+        except Exception as e:
+            logger.error("Error invocando la Lambda de boletas (async): %s", e,
+                         extra={"event": "receipt.lambda_failed", "request_id": purchase_id})
+            cur.execute(
+                "UPDATE purchase_requests SET receipt_status = 'FAILED' WHERE request_id = %s AND receipt_url IS NULL",
+                (purchase_id,)
+            )
+            conn.commit()
+            return False
+    except Exception as e:
+        conn.rollback()
+        logger.error("Error solicitando la boleta: %s", e, extra={"event": "receipt.request_failed"})
+        return False
+    finally:
+        cur.close()
+
 def generate_pdf_local_fallback(purchase_data: dict):
     """
-    Fallback a generación local de PDF si Lambda falla
+    Fallback a generación local de PDF si Lambda falla.
+    Se renderiza en el pool de procesos de receipt_renderer y queda en disco por request_id.
     """
-    if canvas is None:
+    if not receipt_renderer.available():
         raise HTTPException(status_code=500, detail="reportlab no está instalado y Lambda falló")
     
-    buffer = io.BytesIO()
-    pdf = canvas.Canvas(buffer)
-    pdf.setTitle("Boleta de Compra")
-    
-    pdf.drawString(100, 800, f"Boleta de Compra - ID: {purchase_data['request_id']}")
-    pdf.drawString(100, 780, f"Propiedad: {purchase_data['url']}")
-    pdf.drawString(100, 760, f"Monto: ${purchase_data['amount']:.2f}")
-    pdf.drawString(100, 740, f"Fecha: {purchase_data['created_at'].isoformat() + 'Z'}")
-    pdf.drawString(100, 720, f"Código de Autorización: {purchase_data.get('authorization_code', '-')}")
-    pdf.drawString(100, 700, f"Estado: {purchase_data['status']}")
-    
-    pdf.showPage()
-    pdf.save()
-    buffer.seek(0)
+    try:
+        path = receipt_renderer.render({
+            "request_id": str(purchase_data['request_id']),
+            "url": purchase_data['url'],
+            "amount": f"${purchase_data['amount']:.2f}",
+            "created_at": purchase_data['created_at'].isoformat() + 'Z',
+            "authorization_code": purchase_data.get('authorization_code') or '-',
+            "status": purchase_data['status']
+        })
+    except receipt_renderer.RenderTimeout:
+        # el render sigue en el pool: el reintento lo espera o lo encuentra en disco
+        raise HTTPException(status_code=503, detail="La boleta se está generando, intenta de nuevo",
+                            headers={"Retry-After": "5"})
     
-    return StreamingResponse(
-        buffer, 
+    return FileResponse(
+        path,
         media_type="application/pdf",
         headers={"Content-Disposition": f"inline; filename=boleta_{purchase_data['request_id']}.pdf"}
     )
 
+# Columnas de la propiedad que entrega /my-properties (antes p.*, incluidas las internas)
+MY_PROPERTY_COLUMNS = ("id", "name", "price", "currency", "bedrooms", "bathrooms", "m2",
+                       "location", "img", "url", "is_project", "timestamp", "visit_slots")
+# compact=true: solo el resumen de la propiedad
+MY_PROPERTY_SUMMARY_COLUMNS = ("name", "price", "currency", "img", "url")
+MY_PROPERTIES_MAX_LIMIT = 200
+MY_PROPERTIES_PAGE_SIZE = 50
+# Página cuando el cliente no pasa ?limit=. 0 (por defecto) mantiene el contrato anterior
+# para los clientes que no paginan: todo el historial en una respuesta. Con ?limit= o
+# ?cursor= siempre se pagina.
+MY_PROPERTIES_DEFAULT_LIMIT = int(os.getenv("MY_PROPERTIES_DEFAULT_LIMIT", "0"))
+
+def _encode_my_properties_cursor(created_at: datetime, request_id) -> str:
+    raw = f"{created_at.isoformat()}|{request_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_my_properties_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, request_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), str(uuid.UUID(request_id))
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="cursor inválido")
+
 # Actualizado: Endpoint para historial con información extendida
 @app.get("/my-properties", response_model=list[MyProperty])
-def my_properties(user: dict = Depends(verify_jwt)):
+def my_properties(
+    response: Response,
+    user: dict = Depends(verify_jwt),
+    limit: Optional[int] = Query(None, ge=1, le=MY_PROPERTIES_MAX_LIMIT),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor de la página anterior"),
+    compact: bool = Query(False, description="Solo el resumen de la propiedad (nombre, precio, imagen, url)")
+):
     """
     Devuelve las solicitudes de compra del usuario con detalles extendidos.
+    Paginado por cursor (keyset sobre created_at, request_id, índice
+    idx_pr_user_created): si hay más resultados la respuesta trae el header
+    X-Next-Cursor, que se pasa como ?cursor= para pedir la página siguiente.
+    Sin ?limit= ni ?cursor= trae todo el historial, salvo que MY_PROPERTIES_DEFAULT_LIMIT
+    fije una página por defecto.
     """
+    if limit is None:
+        limit = MY_PROPERTIES_DEFAULT_LIMIT or (MY_PROPERTIES_PAGE_SIZE if cursor else None)
     user_id = user.get("sub")
     NAMESPACE = "https://api.g6.tech/claims"
     email = user.get(f"{NAMESPACE}/email") or user.get("email", "")
     ensure_user_exists(user_id, user.get("name", ""), email, user.get("phone_number", ""))
 
+    columns = MY_PROPERTY_SUMMARY_COLUMNS if compact else MY_PROPERTY_COLUMNS
+    params = [user_id]
+    after = ""
+    if cursor:
+        after = "AND (pr.created_at, pr.request_id) < (%s, %s)"
+        params.extend(_decode_my_properties_cursor(cursor))
+    params.append(limit + 1 if limit else None)  # LIMIT NULL = sin límite
+
     conn = get_connection()
     cur = conn.cursor()
     
-    print(f"🔍 /my-properties called with user_id={user_id}")
-    
+    logger.debug("/my-properties", extra={"event": "my_properties.called", "user_id": user_id})
+
     try:
-        cur.execute("""
-            SELECT pr.request_id, pr.url, pr.status, pr.created_at, pr.amount,
+        cur.execute(f"""
+            SELECT pr.request_id, pr.url AS request_url, pr.status, pr.created_at, pr.amount,
                    pr.status = 'ACCEPTED' AS has_receipt,
-                   p.*
+                   {", ".join(f"p.{c} AS p_{c}" for c in columns)}
             FROM purchase_requests pr
             LEFT JOIN properties p ON pr.url = p.url
-            WHERE pr.user_id = %s
-            ORDER BY pr.created_at DESC
-        """, (user_id,))
+            WHERE pr.user_id = %s {after}
+            ORDER BY pr.created_at DESC, pr.request_id DESC
+            LIMIT %s
+        """, params)
         
         rows = cur.fetchall()
-        result = []
-        
-        for r in rows:
-            property_obj = {k: r[k] for k in r.keys() if k not in ["request_id", "url", "status", "created_at", "amount", "has_receipt"]}
-            result.append(MyProperty(
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            response.headers["X-Next-Cursor"] = _encode_my_properties_cursor(
+                rows[-1]["created_at"], rows[-1]["request_id"]
+            )
+
+        return [
+            MyProperty(
                 request_id=str(r["request_id"]),
-                url=r["url"],
+                url=r["request_url"],
                 status=r["status"],
                 created_at=r["created_at"].isoformat() + "Z",
                 amount=float(r["amount"]) if r["amount"] is not None else 0.0,
                 has_receipt=bool(r["has_receipt"]),
-                property=property_obj
-            ))
-        
-        return result
+                property={c: r[f"p_{c}"] for c in columns}
+            )
+            for r in rows
+        ]
     finally:
         cur.close()
         conn.close()
 
 # ===== WORKER SERVICE ENDPOINTS =====
 
+def _webpay_call(method, *args, **kwargs):
+    """Llamada a WebPayService medida como upstream "webpay" (los errores vienen en success)."""
+    with metrics.timed("upstream", "webpay") as span:
+        result = method(*args, **kwargs)
+        if not result.get("success"):
+            span["outcome"] = "error"
+    return result
+
 @app.post("/webpay/create", response_model=WebPayCreateResponse)
 def create_webpay_transaction(
     request: WebPayCreateRequest,
@@ -1488,7 +1719,8 @@ def create_webpay_transaction(
     session_id = f"session_{user_id}_{int(datetime.now().timestamp())}"
     return_url = f"{FRONTEND_ORIGIN}/webpay/return?token="
     
-    result = webpay_service.create_transaction(
+    result = _webpay_call(
+        webpay_service.create_transaction,
         amount=request.amount,
         order_id=order_id,
         session_id=session_id,
@@ -1513,7 +1745,7 @@ def commit_webpay_transaction(
     """Confirmar transacción de WebPay para reserva de visita"""
     user_id = user.get("sub")
     
-    result = webpay_service.commit_transaction(request.token)
+    result = _webpay_call(webpay_service.commit_transaction, request.token)
     
     if not result["success"]:
         # Error al comunicarse con Transbank
@@ -1593,9 +1825,9 @@ def commit_webpay_transaction(
                         amount=amount,
                         authorization_code=authorization_code
                     )
-                    print(f"📧 Email de confirmación de pago enviado a {user_email}")
                 except Exception as e:
-                    print(f"⚠️ Error al enviar email de confirmación: {e}")
+                    logger.warning("Error al enviar email de confirmación: %s", e,
+                                   extra={"event": "email.failed", "request_id": str(request_id)})
             
             body = json.dumps({
                 "request_id": str(request_id),
@@ -1632,7 +1864,8 @@ def commit_webpay_transaction(
             
             validation_ok = mqtt_publish_with_fibonacci(VALIDATION_TOPIC, validation_body)
             if not validation_ok:
-                print(f"⚠️ WARNING: No se pudo publicar validación para request_id={request_id}, pero la compra está registrada")
+                logger.warning("No se pudo publicar la validación; la compra está registrada",
+                               extra={"event": "mqtt.publish_failed", "request_id": str(request_id)})
             
             # Disparar recomendaciones post pago validado (best-effort)
             try:
@@ -1651,7 +1884,7 @@ def commit_webpay_transaction(
                 if p and isinstance(p.get("location"), dict):
                     loc_addr = p["location"].get("address", "") or ""
 
-                _ = enqueue_recommendations(
+                enqueue_recommendations_deferred(
                     user_id=user_id,
                     property_id=str(p["id"]) if p and p.get("id") is not None else None,
                     prefs={
@@ -1670,7 +1903,7 @@ def commit_webpay_transaction(
                     bathrooms=p.get("bathrooms") if p else None
                 )
             except Exception as e:
-                print(f"[WARN] enqueue_recommendations (webpay/commit) failed: {e}")
+                logger.warning("enqueue_recommendations (webpay/commit) falló: %s", e, extra={"event": "recs.enqueue_failed"})
 
             enqueue_purchase_event(background_tasks, "purchase_requested", {
                 "request_id": str(request_id),
@@ -1713,7 +1946,7 @@ def commit_webpay_transaction(
 @app.get("/webpay/status/{token}")
 def get_webpay_status(token: str, user: dict = Depends(verify_jwt)):
     """Obtener estado de transacción WebPay"""
-    result = webpay_service.get_transaction_status(token)
+    result = _webpay_call(webpay_service.get_transaction_status, token)
     
     if result["success"]:
         return result["transaction"]
@@ -1726,7 +1959,7 @@ def webpay_return(token: str = None):
     if not token:
         return {"error": "Token no proporcionado"}
     
-    result = webpay_service.get_transaction_status(token)
+    result = _webpay_call(webpay_service.get_transaction_status, token)
     
     if result["success"]:
         transaction = result["transaction"]
@@ -1765,11 +1998,12 @@ def generate_recommendations(request: RecommendationRequest, user: dict = Depend
             "bedrooms": request.bedrooms,
             "bathrooms": request.bathrooms
         }
-        response = requests.post(
-            f"{WORKER_SERVICE_URL}/job",
-            json=worker_request,
-            timeout=10
-        )
+        with metrics.timed("upstream", "jobmaster"):
+            response = requests.post(
+                f"{WORKER_SERVICE_URL}/job",
+                json=worker_request,
+                timeout=10
+            )
         if response.status_code == 200:
             result = response.json()
             return RecommendationResponse(
@@ -1795,26 +2029,92 @@ def generate_recommendations(request: RecommendationRequest, user: dict = Depend
             detail=f"Failed to generate recommendations: {str(e)}"
         )
 
-@app.get("/recommendations/{job_id}")
-def get_recommendation_status(job_id: str, user: dict = Depends(verify_jwt)):
+@app.get("/recommendations/property/{property_id}")
+def get_precomputed_recommendations(property_id: int, user: dict = Depends(verify_jwt)):
     """
-    Get recommendation job status and results
+    Top-3 precalculado de una propiedad (property_recommendations, lo llena el worker al
+    ingresar propiedades). Es una búsqueda por clave primaria; 404 si aún no se calculó,
+    en cuyo caso el cliente puede usar POST /recommendations/generate.
     """
+    conn = get_connection()
+    cur = conn.cursor()
     try:
-        response = requests.get(
-            f"{WORKER_SERVICE_URL}/job/{job_id}",
-            timeout=10
+        cur.execute(
+            "SELECT result, computed_at FROM property_recommendations WHERE property_id = %s",
+            (property_id,)
         )
+        row = cur.fetchone()
+    finally:
+        cur.close()
+        conn.close()
+
+    if row is None:
+        raise HTTPException(status_code=404, detail="Recomendaciones no precalculadas")
+    return {
+        "property_id": property_id,
+        "status": "completed",
+        "result": row["result"],
+        "computed_at": row["computed_at"].isoformat()
+    }
+
+# El long-poll de GET /recommendations/{job_id}?wait= espera al JobMaster con httpx async:
+# así no retiene un hilo del threadpool (40 por defecto, compartido con todos los endpoints
+# síncronos) mientras el job corre. Sobre MAX_RECS_WAITERS esperas simultáneas por proceso
+# se responde 503.
+MAX_RECS_WAITERS = int(os.getenv("MAX_RECS_WAITERS", "200"))
+_recs_waiters = 0  # solo se toca desde el event loop
+_jobmaster_async: Optional[httpx.AsyncClient] = None
+
+
+def _jobmaster_client() -> httpx.AsyncClient:
+    global _jobmaster_async
+    if _jobmaster_async is None:
+        _jobmaster_async = httpx.AsyncClient(base_url=WORKER_SERVICE_URL)
+    return _jobmaster_async
+
+
+@app.get("/recommendations/{job_id}")
+async def get_recommendation_status(
+    job_id: str,
+    wait: int = Query(0, ge=0, le=25, description="Segundos a esperar a que el job termine (long-poll)"),
+    user: dict = Depends(verify_jwt),
+):
+    """
+    Get recommendation job status and results.
+    Con wait > 0 la respuesta llega apenas el job termina (o al cumplirse wait),
+    en vez de que el cliente consulte en loop.
+    """
+    global _recs_waiters
+    if wait and _recs_waiters >= MAX_RECS_WAITERS:
+        raise HTTPException(status_code=503, detail="Too many clients waiting on recommendations",
+                            headers={"Retry-After": "1"})
+    try:
+        with metrics.timed("upstream", "jobmaster"):
+            if wait:
+                _recs_waiters += 1
+                try:
+                    response = await _jobmaster_client().get(
+                        f"/job/{job_id}/wait",
+                        params={"timeout": wait},
+                        timeout=wait + 10
+                    )
+                finally:
+                    _recs_waiters -= 1
+            else:
+                response = await _jobmaster_client().get(f"/job/{job_id}", timeout=10)
         if response.status_code == 200:
             return response.json()
         elif response.status_code == 404:
             raise HTTPException(status_code=404, detail="Job not found")
+        elif response.status_code == 503:
+            # el JobMaster alcanzó su propio tope de waiters (MAX_JOB_WAITERS)
+            raise HTTPException(status_code=503, detail="Worker service busy", headers={"Retry-After": "1"})
         else:
             raise HTTPException(
                 status_code=502, 
                 detail=f"Worker service error: {response.text}"
             )
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(
             status_code=503, 
             detail=f"Worker service unavailable: {str(e)}"
@@ -1885,6 +2185,48 @@ def deactivate_admin_discount(request: AdminDiscountRequest, admin: dict = Depen
     discount = upsert_admin_discount(request.url, request.discount_percent, False)
     return AdminDiscountResponse(success=True, url=request.url, discount_percent=discount)
 
+
+@app.get("/admin/profiling")
+def get_profiling_status(admin: dict = Depends(verify_admin)):
+    """Estado del profiling de este proceso y muestras por ruta."""
+    return {"instance": INSTANCE_NAME, **profiling.status()}
+
+
+@app.post("/admin/profiling")
+def configure_profiling(request: ProfilingRequest, admin: dict = Depends(verify_admin)):
+    """Enciende/apaga el muestreo de stacks de un porcentaje de los requests (ver profiling.py)."""
+    if not 0 <= request.sample_rate <= 1:
+        raise HTTPException(status_code=400, detail="sample_rate debe estar entre 0 y 1")
+    if request.reset:
+        profiling.reset()
+    if request.slow_query_ms is not None:
+        profiling.config.slow_query_ms = request.slow_query_ms
+    if request.enabled:
+        profiling.enable(app, request.sample_rate, request.interval_ms, request.duration_seconds)
+    else:
+        profiling.disable()
+    return {"instance": INSTANCE_NAME, **profiling.status()}
+
+
+@app.get("/admin/profiling/flamegraph")
+def get_profiling_flamegraph(route: Optional[str] = None, admin: dict = Depends(verify_admin)):
+    """
+    Stacks muestreados en formato collapsed (flamegraph.pl / speedscope). Con `route`
+    (p. ej. /webpay/commit) solo los de esa ruta; sin ella, todas con la ruta como raíz.
+    """
+    name = (route or "todas").strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+    return Response(
+        content=profiling.collapsed(route),
+        media_type="text/plain",
+        headers={"Content-Disposition": f'attachment; filename="{INSTANCE_NAME}-{name}.collapsed"'},
+    )
+
+
+@app.get("/admin/profiling/slow-queries")
+def get_slow_queries(admin: dict = Depends(verify_admin)):
+    """Consultas que superaron slow_query_ms (más recientes primero, sin valores de parámetros)."""
+    return {"slow_query_ms": profiling.config.slow_query_ms, "queries": profiling.slow_queries()}
+
 @app.post("/admin/auctions/offer", response_model=AuctionOfferResponse)
 def create_auction_offer(request: AuctionOfferRequest, admin: dict = Depends(verify_admin)):
     """
@@ -2040,15 +2382,13 @@ def get_auction_offers(admin: dict = Depends(verify_admin)):
                     property=property_obj
                 ))
             except Exception as e:
-                print(f"⚠️ Error procesando fila de oferta: {e}")
-                print(f"   Datos: {r}")
+                logger.warning("Error procesando fila de oferta: %s", e,
+                               extra={"event": "auctions.bad_row", "auction_id": str(r.get("auction_id"))})
                 continue  # Continuar con la siguiente fila
         
         return result
     except Exception as e:
-        print(f"❌ Error en get_auction_offers: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error en get_auction_offers", extra={"event": "auctions.offers_failed"})
         raise HTTPException(status_code=500, detail=f"Error al obtener ofertas: {str(e)}")
     finally:
         cur.close()
@@ -2241,8 +2581,8 @@ def get_auction_proposals(admin: dict = Depends(verify_admin)):
                     property=property_obj
                 ))
             except Exception as e:
-                print(f"⚠️ Error procesando fila de propuesta: {e}")
-                print(f"   Datos: {r}")
+                logger.warning("Error procesando fila de propuesta: %s", e,
+                               extra={"event": "auctions.bad_row", "auction_id": str(r.get("auction_id"))})
                 continue  # Continuar con la siguiente fila
         
         return result
@@ -2503,10 +2843,11 @@ def worker_heartbeat():
     RF04: Check if worker service is available for frontend indicator
     """
     try:
-        response = requests.get(
-            f"{WORKER_SERVICE_URL}/heartbeat",
-            timeout=5
-        )
+        with metrics.timed("upstream", "jobmaster"):
+            response = requests.get(
+                f"{WORKER_SERVICE_URL}/heartbeat",
+                timeout=5
+            )
         if response.status_code == 200:
             result = response.json()
             return WorkerHeartbeatResponse(
@@ -0,0 +1,222 @@
+"""
+Instrumentación de la API: latencia por ruta, requests en curso, tiempo de BD por request,
+publicaciones MQTT y llamadas a servicios externos (WebPay, JobMaster, Lambda/S3, Auth0).
+
+- MetricsMiddleware (ASGI) mide cada request y lo etiqueta con la plantilla de la ruta
+  (/properties/{property_id}, no el id), para que la cardinalidad quede acotada.
+- TimedCursor reemplaza a RealDictCursor en get_connection() y suma el tiempo de cada
+  execute a la fase "db" del request en curso. El histograma de BD por request toma lo
+  acumulado al enviar la respuesta: las consultas de las BackgroundTasks no cuentan.
+- timed(phase, target) mide un bloque: suma su duración a la fase del request en curso (si
+  hay uno; en hilos de fondo solo se observa el histograma) y la observa por target.
+- /metrics (main.py) expone todo en formato Prometheus. Con varios procesos de uvicorn
+  (--workers) hay que definir PROMETHEUS_MULTIPROC_DIR para que se agreguen entre procesos.
+- Con SERVER_TIMING=true cada respuesta trae Server-Timing (db, db_connect, mqtt,
+  upstream, total) para verlo en las devtools del navegador.
+
+prometheus_client es opcional: sin él no hay /metrics, pero Server-Timing sigue funcionando.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from psycopg2.extras import RealDictCursor
+
+import profiling
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST,
+        CollectorRegistry,
+        Counter,
+        Gauge,
+        Histogram,
+        generate_latest,
+        multiprocess,
+    )
+except ImportError:
+    CONTENT_TYPE_LATEST = "text/plain"
+    Counter = Gauge = Histogram = None
+
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() == "true"
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Buckets en segundos: de 2.5 ms (lecturas simples) a 30 s (Lambda síncrona)
+LATENCY_BUCKETS = (0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PHASES = ("db", "db_connect", "mqtt", "upstream")
+
+enabled = Histogram is not None
+
+if enabled:
+    REQUEST_SECONDS = Histogram(
+        "api_request_duration_seconds", "Latencia de los requests HTTP",
+        ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+    )
+    IN_PROGRESS = Gauge(
+        "api_requests_in_progress", "Requests HTTP en curso", ["method"],
+        multiprocess_mode="livesum",
+    )
+    REQUEST_DB_SECONDS = Histogram(
+        "api_request_db_seconds", "Tiempo en la BD (conexión + consultas) por request",
+        ["route"], buckets=LATENCY_BUCKETS,
+    )
+    DB_QUERIES = Counter("api_db_queries_total", "Consultas ejecutadas", ["route"])
+    MQTT_PUBLISH_SECONDS = Histogram(
+        "api_mqtt_publish_seconds", "Duración de las publicaciones MQTT (con reintentos)",
+        ["topic", "outcome"], buckets=LATENCY_BUCKETS,
+    )
+    UPSTREAM_SECONDS = Histogram(
+        "api_upstream_seconds", "Duración de las llamadas a servicios externos",
+        ["target", "outcome"], buckets=LATENCY_BUCKETS,
+    )
+
+# Tiempos del request en curso: {"db": s, "db_connect": s, "mqtt": s, "upstream": s, "queries": n}
+# y "request" ("GET /ruta", para el registro de consultas lentas).
+# El middleware fija un dict nuevo por request; los endpoints síncronos corren en el
+# threadpool con una copia del contexto, que apunta al mismo dict.
+_current: ContextVar = ContextVar("request_timings", default=None)
+
+
+def _add(phase, seconds):
+    timings = _current.get()
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def timed(phase, target=None):
+    """
+    Mide el bloque y lo suma a `phase` del request en curso; lo observa por `target`.
+    Entrega un dict cuyo "outcome" ("ok", o "error" si el bloque lanza una excepción) el
+    llamador puede cambiar cuando el error se informa por valor de retorno.
+    """
+    start = time.perf_counter()
+    result = {"outcome": "ok"}
+    try:
+        yield result
+    except Exception:
+        result["outcome"] = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        _add(phase, elapsed)
+        if enabled and target is not None:
+            if phase == "mqtt":
+                MQTT_PUBLISH_SECONDS.labels(target, result["outcome"]).observe(elapsed)
+            elif phase == "upstream":
+                UPSTREAM_SECONDS.labels(target, result["outcome"]).observe(elapsed)
+
+
+def _observe_query(query, params, start):
+    elapsed = time.perf_counter() - start
+    _add("db", elapsed)
+    _add("queries", 1)
+    if elapsed * 1000 >= profiling.config.slow_query_ms:
+        timings = _current.get()
+        profiling.log_slow_query(query, params, elapsed, timings.get("request") if timings else None)
+
+
+class TimedCursor(RealDictCursor):
+    """
+    RealDictCursor que suma el tiempo de cada consulta a la fase "db" del request y
+    registra las que superan profiling.config.slow_query_ms (SQL y parámetros redactados).
+    """
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            _observe_query(query, vars, start)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            _observe_query(query, None, start)
+
+
+def _route_template(scope):
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Versiones de Starlette que no guardan la ruta en el scope: buscarla
+    from starlette.routing import Match
+    for candidate in scope["app"].router.routes:
+        match, _ = candidate.matches(scope)
+        if match == Match.FULL:
+            return candidate.path
+    return "<sin ruta>"
+
+
+def _server_timing(timings, total):
+    parts = [f"{phase};dur={timings[phase] * 1000:.1f}" for phase in PHASES if timings.get(phase)]
+    if timings.get("queries"):
+        parts.append(f'queries;desc="{int(timings["queries"])} consultas"')
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: latencia, requests en curso, tiempo de BD y Server-Timing."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        timings = {"request": f"{method} {scope['path']}"}
+        token = _current.set(timings)
+        start = time.perf_counter()
+        status = 500
+        end = None
+        # Tiempos al terminar la respuesta: las consultas de las BackgroundTasks (que corren
+        # después, en el mismo contexto) no cuentan en la BD del request
+        sent = None
+
+        async def send_wrapper(message):
+            nonlocal status, end, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING:
+                    header = _server_timing(timings, time.perf_counter() - start)
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode())]
+            elif message["type"] == "http.response.body" and not message.get("more_body"):
+                # Las BackgroundTasks corren después: no cuentan en la latencia del request
+                end = time.perf_counter()
+                sent = dict(timings)
+            await send(message)
+
+        if enabled:
+            IN_PROGRESS.labels(method).inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            if enabled:
+                IN_PROGRESS.labels(method).dec()
+                route = _route_template(scope)
+                REQUEST_SECONDS.labels(method, route, str(status)).observe((end or time.perf_counter()) - start)
+                measured = sent if sent is not None else timings
+                db_seconds = measured.get("db", 0.0) + measured.get("db_connect", 0.0)
+                if db_seconds:
+                    REQUEST_DB_SECONDS.labels(route).observe(db_seconds)
+                if measured.get("queries"):
+                    DB_QUERIES.labels(route).inc(measured["queries"])
+
+
+def render():
+    """Cuerpo y content-type de /metrics (None si prometheus_client no está instalado)."""
+    if not enabled:
+        return None, CONTENT_TYPE_LATEST
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,228 @@
+"""
+Profiling bajo demanda de la API (endpoints /admin/profiling en main.py).
+
+Sampler por muestreo de stacks: un hilo lee sys._current_frames() cada `interval_ms` y
+atribuye cada stack a la ruta cuyo endpoint aparece en él (el mismo code object que
+registró FastAPI), así funciona igual para endpoints síncronos, que corren en el
+threadpool, y async. No instrumenta llamadas (a diferencia de cProfile): el costo es el
+de leer los stacks en cada muestra, y solo se paga mientras hay requests muestreados en
+curso. ProfilingMiddleware elige `sample_rate` de los requests; mientras alguno está en
+curso se muestrean todos los endpoints activos del proceso. Se apaga solo al cumplirse
+`duration_seconds`.
+
+El resultado es por ruta en formato "collapsed" (una línea por stack: frames separados
+por ';' y la cantidad de muestras), que leen flamegraph.pl y https://www.speedscope.app.
+
+Consultas lentas: metrics.TimedCursor llama a log_slow_query() con las que superan
+SLOW_QUERY_MS. Se registra el SQL con los literales reemplazados por '?' y solo el tipo de
+cada parámetro, nunca su valor.
+
+Los datos son por proceso: con varios workers de uvicorn cada uno tiene los suyos.
+"""
+
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+SLOW_QUERY_HISTORY = 200
+MAX_STACKS_PER_ROUTE = 5000
+MAX_DEPTH = 128
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilingConfig:
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.interval_ms = 5.0
+        self.until = 0.0
+        self.slow_query_ms = SLOW_QUERY_MS
+
+
+config = ProfilingConfig()
+
+_lock = threading.Condition()
+_active = 0                       # requests muestreados en curso
+_thread = None
+_endpoint_routes = {}             # code object del endpoint -> plantilla de la ruta
+_stacks = {}                      # ruta -> Counter(stack collapsed -> muestras)
+_sampled_requests = Counter()     # ruta -> requests que encendieron el sampler
+_samples_taken = 0
+_slow_queries = deque(maxlen=SLOW_QUERY_HISTORY)
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collect(own_ident):
+    """Una muestra: agrega el stack de cada hilo que está dentro de un endpoint."""
+    for ident, frame in sys._current_frames().items():
+        if ident == own_ident:
+            continue
+        chain = []
+        route = None
+        root = 0
+        while frame is not None and len(chain) < MAX_DEPTH:
+            chain.append(frame.f_code)
+            if frame.f_code in _endpoint_routes:
+                # el endpoint más externo del stack es la raíz del flamegraph
+                route, root = _endpoint_routes[frame.f_code], len(chain)
+            frame = frame.f_back
+        if route is None:
+            continue
+        collapsed = ";".join(_frame_label(code) for code in reversed(chain[:root]))
+        with _lock:
+            stacks = _stacks.setdefault(route, Counter())
+            if collapsed in stacks or len(stacks) < MAX_STACKS_PER_ROUTE:
+                stacks[collapsed] += 1
+            else:
+                stacks["[stacks descartados]"] += 1
+
+
+def _sampler_loop():
+    global _samples_taken
+    own = threading.get_ident()
+    while True:
+        with _lock:
+            while _active == 0:
+                _lock.wait()
+        time.sleep(config.interval_ms / 1000)
+        _collect(own)
+        _samples_taken += 1
+
+
+def _ensure_thread():
+    global _thread
+    if _thread is None:
+        _thread = threading.Thread(target=_sampler_loop, name="profiling-sampler", daemon=True)
+        _thread.start()
+
+
+def register_routes(app):
+    """Indexa los endpoints de la app por code object (se llama al habilitar el profiling)."""
+    for route in app.routes:
+        endpoint = getattr(route, "endpoint", None)
+        code = getattr(endpoint, "__code__", None)
+        if code is not None and hasattr(route, "path"):
+            _endpoint_routes[code] = route.path
+
+
+def enable(app, sample_rate, interval_ms, duration_seconds):
+    register_routes(app)
+    config.sample_rate = max(0.0, min(1.0, sample_rate))
+    config.interval_ms = max(1.0, interval_ms)
+    config.until = time.time() + duration_seconds
+    config.enabled = True
+    _ensure_thread()
+
+
+def disable():
+    config.enabled = False
+
+
+def reset():
+    global _samples_taken
+    with _lock:
+        _stacks.clear()
+        _sampled_requests.clear()
+        _samples_taken = 0
+    _slow_queries.clear()
+
+
+def is_active():
+    if config.enabled and time.time() >= config.until:
+        config.enabled = False
+    return config.enabled
+
+
+def status():
+    with _lock:
+        routes = {
+            route: {"samples": sum(stacks.values()), "sampled_requests": _sampled_requests[route]}
+            for route, stacks in _stacks.items()
+        }
+    return {
+        "enabled": is_active(),
+        "sample_rate": config.sample_rate,
+        "interval_ms": config.interval_ms,
+        "remaining_seconds": max(0, round(config.until - time.time())) if config.enabled else 0,
+        "slow_query_ms": config.slow_query_ms,
+        "samples_taken": _samples_taken,
+        "routes": routes,
+    }
+
+
+def collapsed(route=None):
+    """Stacks en formato collapsed; sin `route`, los de todas las rutas bajo su nombre."""
+    with _lock:
+        if route is not None:
+            items = [(stack, n) for stack, n in _stacks.get(route, {}).items()]
+        else:
+            items = [(f"{r};{stack}", n) for r, stacks in _stacks.items() for stack, n in stacks.items()]
+    return "\n".join(f"{stack} {n}" for stack, n in sorted(items)) + ("\n" if items else "")
+
+
+class ProfilingMiddleware:
+    """Enciende el sampler durante `sample_rate` de los requests HTTP."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _active
+        if scope["type"] != "http" or not is_active() or random.random() >= config.sample_rate:
+            return await self.app(scope, receive, send)
+        with _lock:
+            _active += 1
+            _lock.notify()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            with _lock:
+                _active -= 1
+            route = scope.get("route")
+            _sampled_requests[getattr(route, "path", scope["path"])] += 1
+
+
+# ---------- Consultas lentas ----------
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def redact_sql(query):
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    query = str(query)  # psycopg2.sql.Composed
+    return _WHITESPACE.sub(" ", _LITERALS.sub("?", query)).strip()
+
+
+def _param_types(params):
+    if params is None:
+        return []
+    if isinstance(params, dict):
+        return {k: type(v).__name__ for k, v in params.items()}
+    return [type(v).__name__ for v in params]
+
+
+def log_slow_query(query, params, seconds, context=None):
+    entry = {
+        "at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "ms": round(seconds * 1000, 1),
+        "request": context,
+        "sql": redact_sql(query),
+        "params": _param_types(params),
+    }
+    _slow_queries.append(entry)
+    logger.warning("Consulta lenta", extra={"event": "db.slow_query", **entry})
+
+
+def slow_queries():
+    return list(reversed(_slow_queries))
@@ -0,0 +1,149 @@
+"""
+Render local de boletas PDF (respaldo cuando la Lambda no responde).
+
+- El render corre en un pool de procesos (spawn): ReportLab es CPU puro y en el proceso
+  de la API retendría el GIL y un hilo del threadpool durante todo el render.
+- Cada proceso importa ReportLab una sola vez, al crearse (initializer del pool). La
+  parte fija de la boleta (título, etiquetas, líneas) se dibuja en cada render: son pocos
+  comandos y ReportLab no puede reutilizar contenido ya renderizado entre PDFs distintos.
+  Lo que no se repite es el render completo: queda en disco (ver abajo).
+- El PDF se escribe directo a disco en RECEIPT_CACHE_DIR/boleta_{request_id}.pdf y se
+  reutiliza en las solicitudes siguientes; la API lo entrega con FileResponse (streaming
+  desde el archivo, sin armar el PDF en memoria).
+- render() espera a lo más RECEIPT_RENDER_TIMEOUT segundos y lanza RenderTimeout; el
+  render sigue en el pool y la siguiente solicitud de la misma boleta lo espera en vez de
+  encolar otro.
+"""
+
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as RenderTimeout  # noqa: F401 (lo captura la API)
+from functools import partial
+
+RECEIPT_CACHE_DIR = os.getenv("RECEIPT_CACHE_DIR", "/tmp/receipts")
+RECEIPT_RENDER_PROCESSES = int(os.getenv("RECEIPT_RENDER_PROCESSES", "2"))
+RECEIPT_RENDER_TIMEOUT = float(os.getenv("RECEIPT_RENDER_TIMEOUT", "30"))
+
+# (campo, etiqueta, y); la etiqueta es parte fija y el valor va en VALUE_X
+_FIELDS = (
+    ("request_id", "ID de Solicitud:", 700),
+    ("url", "Propiedad:", 680),
+    ("amount", "Monto:", 660),
+    ("created_at", "Fecha:", 640),
+    ("authorization_code", "Código de Autorización:", 620),
+    ("status", "Estado:", 600),
+)
+VALUE_X = 250
+
+_pool = None
+_lock = threading.Lock()
+_inflight = {}
+
+
+# ---------- Proceso de render ----------
+_reportlab = None
+
+
+def _load_reportlab():
+    """Módulos de ReportLab del proceso, importados una sola vez."""
+    global _reportlab
+    if _reportlab is None:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+        _reportlab = {"canvas": canvas, "pagesize": A4}
+    return _reportlab
+
+
+def _draw_static(c):
+    c.setFont("Helvetica-Bold", 16)
+    c.drawString(100, 760, "Boleta de Compra")
+    c.setLineWidth(0.5)
+    c.line(100, 745, 500, 745)
+    c.setFont("Helvetica-Bold", 11)
+    for _, label, y in _FIELDS:
+        c.drawString(100, y, label)
+    c.line(100, 585, 500, 585)
+    c.setFont("Helvetica-Oblique", 9)
+    c.drawString(100, 565, "Boleta generada localmente (respaldo del servicio de boletas)")
+
+
+def _render(fields, path):
+    """Dibuja la boleta en path (escritura atómica). Corre en el pool de procesos."""
+    rl = _load_reportlab()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    c = rl["canvas"].Canvas(tmp, pagesize=rl["pagesize"], pageCompression=1)
+    c.setTitle("Boleta de Compra")
+    _draw_static(c)
+    c.setFont("Helvetica", 11)
+    for key, _, y in _FIELDS:
+        c.drawString(VALUE_X, y, str(fields.get(key) if fields.get(key) is not None else "-"))
+    c.showPage()
+    c.save()
+    os.replace(tmp, path)
+    return path
+
+
+def _init_process():
+    # importa ReportLab al crear el proceso, no en la primera boleta
+    try:
+        _load_reportlab()
+    except ImportError:
+        pass
+
+
+# ---------- API ----------
+def available():
+    try:
+        import reportlab  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _get_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=RECEIPT_RENDER_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process,
+            )
+        return _pool
+
+
+def receipt_path(request_id):
+    safe = re.sub(r"[^A-Za-z0-9_-]", "_", str(request_id))
+    return os.path.join(RECEIPT_CACHE_DIR, f"boleta_{safe}.pdf")
+
+
+def render(fields):
+    """
+    Ruta del PDF de la boleta (fields: request_id, url, amount, created_at,
+    authorization_code, status, ya como texto). Si ya está en disco no se vuelve a
+    renderizar; solicitudes simultáneas de la misma boleta esperan el mismo render.
+    Lanza RenderTimeout si no termina dentro de RECEIPT_RENDER_TIMEOUT.
+    """
+    path = receipt_path(fields["request_id"])
+    if os.path.exists(path):
+        return path
+    os.makedirs(RECEIPT_CACHE_DIR, exist_ok=True)
+    pool = _get_pool()
+    with _lock:
+        future = _inflight.get(path)
+        submitted = future is None
+        if submitted:
+            future = _inflight[path] = pool.submit(_render, fields, path)
+    if submitted:
+        # fuera del lock: si ya terminó, el callback corre aquí mismo y toma el lock
+        future.add_done_callback(partial(_forget, path))
+    return future.result(timeout=RECEIPT_RENDER_TIMEOUT)
+
+
+def _forget(path, future):
+    with _lock:
+        if _inflight.get(path) is future:
+            del _inflight[path]
@@ -6,6 +6,44 @@ from typing import Dict, Any, Optional
 from transbank.webpay.webpay_plus.transaction import Transaction
 from transbank.common.options import WebpayOptions
 from transbank.common.integration_type import IntegrationType
+import requests
+
+# Ruta de la API REST de WebPay Plus (la misma que usa el SDK de Transbank)
+WEBPAY_TRANSACTIONS_PATH = "/rswebpaytransaction/api/webpay/v1.2/transactions"
+
+
+class _RestTransaction:
+    """
+    Misma interfaz que transbank...Transaction (create/commit/status) contra la API REST
+    en WEBPAY_API_URL. Se usa para apuntar a un stub local (loadtest/standins.py); el
+    SDK solo permite los hosts de integración y producción de Transbank.
+    """
+
+    def __init__(self, api_url, commerce_code, api_key):
+        self.base = api_url.rstrip("/") + WEBPAY_TRANSACTIONS_PATH
+        self.headers = {
+            "Tbk-Api-Key-Id": commerce_code,
+            "Tbk-Api-Key-Secret": api_key,
+            "Content-Type": "application/json",
+        }
+
+    def _request(self, method, path="", body=None):
+        response = requests.request(method, self.base + path, json=body, headers=self.headers, timeout=10)
+        response.raise_for_status()
+        return response.json()
+
+    def create(self, buy_order, session_id, amount, return_url):
+        return self._request("POST", body={
+            "buy_order": buy_order, "session_id": session_id,
+            "amount": amount, "return_url": return_url,
+        })
+
+    def commit(self, token):
+        return self._request("PUT", f"/{token}")
+
+    def status(self, token):
+        return self._request("GET", f"/{token}")
+
 
 class WebPayService:
     def __init__(self):
@@ -19,6 +57,13 @@ class WebPayService:
             api_key=self.api_key,
             integration_type=IntegrationType.TEST
         )
+        # Base de la API REST a usar en vez del SDK (stub de pruebas de carga)
+        self.api_url = os.getenv("WEBPAY_API_URL")
+
+    def _transaction(self):
+        if self.api_url:
+            return _RestTransaction(self.api_url, self.commerce_code, self.api_key)
+        return Transaction(self.options)
     
     def create_transaction(self, amount: float, order_id: str, session_id: str, 
                           return_url: str) -> Dict[str, Any]:
@@ -27,7 +72,7 @@ class WebPayService:
         """
         try:
             # Crear instancia de Transaction con options
-            transaction = Transaction(self.options)
+            transaction = self._transaction()
             response = transaction.create(
                 buy_order=order_id,
                 session_id=session_id,
@@ -54,7 +99,7 @@ class WebPayService:
         Confirmar una transacción
         """
         try:
-            transaction = Transaction(self.options)
+            transaction = self._transaction()
             response = transaction.commit(token)
             
             return {
@@ -86,7 +131,7 @@ class WebPayService:
         Obtener estado de una transacción
         """
         try:
-            transaction = Transaction(self.options)
+            transaction = self._transaction()
             response = transaction.status(token)
             
             return {
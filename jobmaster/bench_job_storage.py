@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memoria por job en Redis: formato anterior (job:{id} como JSON con el
+resultado embebido) vs el actual (hash job:{id} + result:{id} con codec.py).
+
+Escribe N jobs sintéticos de cada formato en una BD de Redis aparte, mide
+MEMORY USAGE por clave y la variación de used_memory, y los borra al terminar.
+
+Uso: python bench_job_storage.py [--jobs 2000] [--recommendations 10] [--db 15]
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+
+import redis
+
+import codec
+from main import _job_to_hash, _result_key
+
+PREFIX = "bench:jobstore"
+
+
+def sample_job(n_recs):
+    job_id = str(uuid.uuid4())
+    now = datetime.now(timezone.utc).isoformat()
+    recs = [{
+        "id": random.randint(1, 10 ** 6),
+        "name": f"Departamento {i} en arriendo, excelente ubicación",
+        "price": random.randint(300000, 2000000),
+        "currency": "$",
+        "bedrooms": random.randint(1, 4),
+        "bathrooms": random.randint(1, 3),
+        "location": "Providencia, Santiago",
+        "url": f"https://www.portalinmobiliario.com/MLC-{random.randint(10 ** 8, 10 ** 9)}",
+        "img": f"https://http2.mlstatic.com/D_NQ_NP_{random.randint(10 ** 6, 10 ** 7)}-O.webp",
+        "distance_km": round(random.uniform(0, 5), 3),
+        "score": round(random.random(), 4),
+    } for i in range(n_recs)]
+    return {
+        "job_id": job_id,
+        "user_id": "bench-user",
+        "property_id": random.randint(1, 10 ** 5),
+        "preferences": {},
+        "budget_min": None,
+        "budget_max": None,
+        "location": None,
+        "bedrooms": None,
+        "bathrooms": None,
+        "status": "completed",
+        "created_at": now,
+        "completed_at": now,
+        "task_id": job_id,
+        "events": True,
+        "result": {"property_id": 1, "recommendations": recs, "algorithm": "simple"},
+    }
+
+
+def write_legacy(r, jobs):
+    pipe = r.pipeline(transaction=False)
+    for d in jobs:
+        pipe.setex(f"{PREFIX}:old:job:{d['job_id']}", 86400, json.dumps(d))
+    pipe.execute()
+    return [f"{PREFIX}:old:job:{d['job_id']}" for d in jobs]
+
+
+def write_hash(r, jobs):
+    keys = []
+    pipe = r.pipeline(transaction=False)
+    for d in jobs:
+        d = dict(d, result_key=d["job_id"])
+        hkey, rkey = f"{PREFIX}:new:job:{d['job_id']}", f"{PREFIX}:new:{_result_key(d['job_id'])}"
+        pipe.hset(hkey, mapping=_job_to_hash(d))
+        pipe.expire(hkey, 86400)
+        pipe.setex(rkey, 86400, codec.encode(d["result"]))
+        keys += [hkey, rkey]
+    pipe.execute()
+    return keys
+
+
+def measure(r, label, writer, jobs):
+    before = r.info("memory")["used_memory"]
+    t = time.perf_counter()
+    keys = writer(r, jobs)
+    elapsed = time.perf_counter() - t
+    after = r.info("memory")["used_memory"]
+    pipe = r.pipeline(transaction=False)
+    for k in keys:
+        pipe.memory_usage(k, samples=0)
+    usage = sum(v or 0 for v in pipe.execute())
+    print(f"   {label:28s} MEMORY USAGE/job={usage / len(jobs):9.1f} B  "
+          f"used_memory Δ/job={(after - before) / len(jobs):9.1f} B  escritura={elapsed * 1000:8.1f} ms")
+    for i in range(0, len(keys), 500):
+        r.delete(*keys[i:i + 500])
+    return usage
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memoria por job en Redis")
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--recommendations", type=int, default=10)
+    parser.add_argument("--db", type=int, default=15, help="BD de Redis a usar (se escriben y borran claves bench:*)")
+    args = parser.parse_args()
+
+    r = redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"), db=args.db)
+    jobs = [sample_job(args.recommendations) for _ in range(args.jobs)]
+
+    print(f"🧪 Almacenamiento de jobs: {args.jobs} jobs con {args.recommendations} recomendaciones")
+    print(f"   codec: msgpack={'sí' if codec.msgpack else 'no'} zstd={'sí' if codec.zstandard else 'no'}")
+    print("=" * 60)
+    old = measure(r, "JSON (formato anterior)", write_legacy, jobs)
+    new = measure(r, "hash + result comprimido", write_hash, jobs)
+    if old:
+        print(f"\n   reducción: {(1 - new / old) * 100:.1f}%")
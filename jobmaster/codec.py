@@ -0,0 +1,65 @@
+"""
+Serialización compacta de resultados de jobs en Redis.
+
+El primer byte indica el formato: m = msgpack, j = JSON; en mayúscula (M/J) el resto va
+comprimido con zstd. msgpack y zstandard son opcionales: sin ellos se escribe JSON sin
+comprimir, y lo escrito con ellos solo se puede leer si están instalados.
+Debe ser idéntico en jobmaster/ y jobmaster/worker/ (el JobMaster y el worker se construyen
+por separado); scripts/check_shared_modules.py lo verifica en CI.
+"""
+
+import json
+import threading
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Por debajo de esto zstd no compensa el costo (resultados vacíos o de un elemento)
+COMPRESS_MIN_BYTES = 256
+
+# Un contexto zstd no se puede usar desde varios hilos a la vez (el JobMaster llama a
+# encode/decode desde el threadpool de FastAPI): cada hilo crea los suyos
+_local = threading.local()
+
+
+def _cctx():
+    if not hasattr(_local, "cctx"):
+        _local.cctx = zstandard.ZstdCompressor(level=3)
+    return _local.cctx
+
+
+def _dctx():
+    if not hasattr(_local, "dctx"):
+        _local.dctx = zstandard.ZstdDecompressor()
+    return _local.dctx
+
+
+def encode(obj) -> bytes:
+    if msgpack is not None:
+        tag, raw = b"m", msgpack.packb(obj, use_bin_type=True)
+    else:
+        tag, raw = b"j", json.dumps(obj, separators=(",", ":")).encode()
+    if zstandard is not None and len(raw) >= COMPRESS_MIN_BYTES:
+        return tag.upper() + _cctx().compress(raw)
+    return tag + raw
+
+
+def decode(blob):
+    if not blob:
+        return None
+    tag, payload = blob[:1], blob[1:]
+    if tag in (b"M", b"J"):
+        payload = _dctx().decompress(payload)
+        tag = tag.lower()
+    if tag == b"m":
+        return msgpack.unpackb(payload, raw=False)
+    if tag == b"j":
+        return json.loads(payload)
+    return json.loads(blob)  # JSON plano sin prefijo
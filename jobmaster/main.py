@@ -1,29 +1,207 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime, timezone
-from celery import Celery
+from celery import Celery, group
 from celery.result import AsyncResult
-import os, json, redis
+import os, json, time, redis
+import redis.asyncio as aioredis
+from fastapi.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 
+import codec
+import log_config
+
 load_dotenv()
 
+# JSON a stdout a través de una cola (ver log_config.py); también los logs de uvicorn
+logger = log_config.setup("jobmaster", capture=("uvicorn", "uvicorn.error", "uvicorn.access"))
+
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
 
 # Redis para almacenar jobs (TTL 24h)
 redis_client = redis.from_url(REDIS_URL)
+JOB_TTL = 86400
+
+# Índices de listados: sorted sets con score = created_at (epoch). Las entradas más
+# antiguas que JOB_TTL se recortan en cada escritura y las claves expiran junto a los jobs.
+JOBS_IDX_ALL = "jobs:idx:all"
+
+def _idx_user(user_id: str) -> str:
+    return f"jobs:idx:user:{user_id}"
+
+def _idx_status(status: str) -> str:
+    return f"jobs:idx:status:{status}"
+
+def _created_ts(data: dict) -> float:
+    try:
+        return datetime.fromisoformat(data["created_at"]).timestamp()
+    except Exception:
+        return datetime.now(timezone.utc).timestamp()
 
-def store_job(job_id: str, data: dict, ttl: int = 86400):
-    redis_client.setex(f"job:{job_id}", ttl, json.dumps(data))
+# Formato del job: hash job:{id} con campos escalares (las transiciones actualizan solo
+# status/progress/...), los parámetros de la solicitud en un campo "request" compacto y el
+# resultado guardado una sola vez, comprimido (codec.py), en result:{task_id o job_id}.
+_JOB_FIELDS = ("job_id", "user_id", "status", "created_at", "completed_at", "property_id",
+               "task_id", "error", "progress", "coalesced_with", "result_key")
+_JOB_FLAGS = ("events", "cached")
+_JOB_REQUEST_FIELDS = ("preferences", "budget_min", "budget_max", "location", "bedrooms", "bathrooms")
+
+def _result_key(key: str) -> str:
+    return f"result:{key}"
+
+def _job_to_hash(data: dict) -> dict:
+    mapping = {k: str(data[k]) for k in _JOB_FIELDS if data.get(k) is not None}
+    for k in _JOB_FLAGS:
+        if data.get(k):
+            mapping[k] = "1"
+    request = {k: data[k] for k in _JOB_REQUEST_FIELDS if data.get(k) not in (None, {}, [])}
+    if request:
+        mapping["request"] = json.dumps(request, separators=(",", ":"))
+    return mapping
+
+def _job_from_hash(raw: dict) -> dict:
+    h = {k.decode(): v.decode() for k, v in raw.items()}
+    data = {k: h.get(k) for k in _JOB_FIELDS}
+    for k in ("property_id", "progress"):
+        if data[k] is not None:
+            data[k] = int(float(data[k]))
+    for k in _JOB_FLAGS:
+        data[k] = h.get(k) == "1"
+    data.update({k: None for k in _JOB_REQUEST_FIELDS})
+    data["preferences"] = {}
+    if h.get("request"):
+        data.update(json.loads(h["request"]))
+    return data
+
+def _index_job(pipe, job_id: str, data: dict, ttl: int, prev_status: Optional[str] = None):
+    """Encola la actualización de los índices jobs:idx:* del job."""
+    score = _created_ts(data)
+    cutoff = datetime.now(timezone.utc).timestamp() - ttl
+    idx_keys = [JOBS_IDX_ALL, _idx_status(data.get("status") or "unknown")]
+    if data.get("user_id"):
+        idx_keys.append(_idx_user(data["user_id"]))
+    if prev_status and prev_status != data.get("status"):
+        pipe.zrem(_idx_status(prev_status), job_id)
+    for k in idx_keys:
+        pipe.zadd(k, {job_id: score})
+        pipe.zremrangebyscore(k, "-inf", cutoff)
+        pipe.expire(k, ttl)
+
+def store_job(job_id: str, data: dict, ttl: int = JOB_TTL, prev_status: Optional[str] = None, pipe=None,
+              replace: bool = False):
+    """
+    Guarda el job completo (hash + resultado, si trae) y sus índices en un solo pipeline.
+    replace=True borra antes la clave (jobs en el formato JSON anterior).
+    Si se pasa pipe, solo encola los comandos (el llamador hace execute()).
+    """
+    own_pipe = pipe is None
+    if own_pipe:
+        pipe = redis_client.pipeline(transaction=False)
+    if data.get("result") is not None:
+        data["result_key"] = data.get("result_key") or job_id
+        pipe.setex(_result_key(data["result_key"]), ttl, codec.encode(data["result"]))
+    if replace:
+        pipe.delete(f"job:{job_id}")
+    pipe.hset(f"job:{job_id}", mapping=_job_to_hash(data))
+    pipe.expire(f"job:{job_id}", ttl)
+    _index_job(pipe, job_id, data, ttl, prev_status)
+    if own_pipe:
+        pipe.execute()
+
+def update_job(job_id: str, data: dict, fields: dict, prev_status: Optional[str] = None, pipe=None):
+    """Transición: escribe solo los campos que cambiaron (data ya los contiene) y mueve los índices."""
+    own_pipe = pipe is None
+    if own_pipe:
+        pipe = redis_client.pipeline(transaction=False)
+    mapping = {k: str(v) for k, v in fields.items() if v is not None}
+    if mapping:
+        pipe.hset(f"job:{job_id}", mapping=mapping)
+    if prev_status and prev_status != data.get("status"):
+        _index_job(pipe, job_id, data, JOB_TTL, prev_status)
+    if own_pipe:
+        pipe.execute()
+
+def _load_job(job_id: str, raw) -> Optional[dict]:
+    """
+    Respuesta de HGETALL job:{id} -> dict; None si no existe. WRONGTYPE significa que el
+    job sigue en el formato JSON anterior (reindex_jobs aún no lo migró): se migra aquí.
+    """
+    if isinstance(raw, redis.ResponseError):
+        if "WRONGTYPE" not in str(raw):
+            raise raw
+        legacy = redis_client.get(f"job:{job_id}")
+        if not legacy:
+            return None
+        data = json.loads(legacy)
+        ttl = redis_client.ttl(f"job:{job_id}")
+        store_job(job_id, data, ttl=ttl if ttl and ttl > 0 else JOB_TTL, replace=True)
+        return data
+    return _job_from_hash(raw) if raw else None
 
 def get_job(job_id: str):
-    raw = redis_client.get(f"job:{job_id}")
-    return json.loads(raw) if raw else None
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hgetall(f"job:{job_id}")
+    return _load_job(job_id, pipe.execute(raise_on_error=False)[0])
+
+# Cache de resultados escrito por el worker (worker/recs_cache.py); el mqtt_listener
+# renueva recs:ver:{comuna_key}:{bedrooms} cuando cambia un bucket.
+RECS_CACHE_ENABLED = os.getenv("RECS_CACHE_ENABLED", "true").lower() == "true"
+
+def get_cached_recommendations_many(property_ids) -> Dict[int, Any]:
+    """
+    {property_id: resultado} para los que tienen entrada vigente (la versión del bucket no
+    cambió desde que se calculó). Dos MGET sin importar cuántos property_id sean.
+    Una versión que falta (desalojada por el LRU) es un miss: el worker la vuelve a sembrar.
+    """
+    property_ids = list(dict.fromkeys(property_ids))
+    if not RECS_CACHE_ENABLED or not property_ids:
+        return {}
+    try:
+        raws = redis_client.mget([f"recs:prop:{pid}" for pid in property_ids])
+        entries = {pid: json.loads(raw) for pid, raw in zip(property_ids, raws) if raw}
+        hits = {}
+        if entries:
+            versions = redis_client.mget([
+                f"recs:ver:{e.get('comuna_key') or ''}:{e['bedrooms'] if e.get('bedrooms') is not None else ''}"
+                for e in entries.values()
+            ])
+            for (pid, entry), current in zip(entries.items(), versions):
+                if current is not None and int(current) == entry.get("version"):
+                    hits[pid] = entry["result"]
+        pipe = redis_client.pipeline(transaction=False)
+        if hits:
+            pipe.incrby("recs:cache:hits", len(hits))
+        if len(property_ids) > len(hits):
+            pipe.incrby("recs:cache:misses", len(property_ids) - len(hits))
+        pipe.execute()
+        return hits
+    except Exception:
+        return {}
+
+def get_cached_recommendations(property_id: int):
+    """Resultado cacheado si la versión del bucket no cambió desde que se calculó; si no, None."""
+    return get_cached_recommendations_many([property_id]).get(property_id)
+
+def recs_cache_stats():
+    hits, misses = (int(v or 0) for v in redis_client.mget("recs:cache:hits", "recs:cache:misses"))
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_ratio": round(hits / total, 4) if total else None}
 
 # Celery (misma URL que workers)
 cel = Celery("recommendation_worker", broker=REDIS_URL, backend=REDIS_URL)
 
+# Colas y prioridades (mismo esquema que worker/celery_app.py; 0 = prioridad más alta)
+INTERACTIVE_QUEUE = "recs.interactive"
+BULK_QUEUE = "recs.bulk"
+PRIORITY_STEPS = list(range(10))
+INTERACTIVE_PRIORITY = 0
+BULK_PRIORITY = 6
+cel.conf.broker_transport_options = {"priority_steps": PRIORITY_STEPS, "sep": ":", "queue_order_strategy": "priority"}
+# Mensajes pendientes por proceso que justifican uno más (AUTOSCALE_TASKS_PER_PROCESS del worker)
+AUTOSCALE_TASKS_PER_PROCESS = int(os.getenv("AUTOSCALE_TASKS_PER_PROCESS", "4"))
+
 app = FastAPI(title="JobMaster Service", version="1.1.0")
 
 
@@ -36,6 +214,11 @@ class JobRequest(BaseModel):
     location: Optional[str] = None
     bedrooms: Optional[int] = None
     bathrooms: Optional[int] = None
+    priority: Optional[int] = None  # 0 (más alta) .. 9; por defecto según la cola
+
+class JobBatchRequest(BaseModel):
+    jobs: List[JobRequest]
+    interactive: bool = False  # True: cola interactive en vez de bulk
 
 # Endpoints
 
@@ -46,8 +229,12 @@ def root():
         "version": "1.1.0",
         "endpoints": {
             "create_job": "POST /job",
+            "create_jobs_batch": "POST /jobs/batch",
             "get_job": "GET /job/{job_id}",
+            "wait_job": "GET /job/{job_id}/wait?timeout=25",
+            "job_events": "GET /job/{job_id}/events (SSE)",
             "list_jobs": "GET /jobs",
+            "queue_metrics": "GET /metrics/queues",
             "heartbeat": "GET /heartbeat"
         }
     }
@@ -56,8 +243,11 @@ def root():
 def heartbeat():
     ok = True
     workers_count = 0
+    cache = None
     try:
         redis_client.ping()
+        cache = recs_cache_stats()
+        cache["coalesced"] = int(redis_client.get("recs:coalesced") or 0)
         pings = cel.control.ping() or []
         workers_count = len(pings)
     except Exception:
@@ -66,18 +256,42 @@ def heartbeat():
         "status": ok,
         "timestamp": datetime.now(timezone.utc).isoformat(),
         "service": "JobMaster",
-        "workers_active": workers_count
+        "workers_active": workers_count,
+        "recommendations_cache": cache
     }
 
-@app.post("/job")
-def create_job(job: JobRequest):
-    import uuid
-    job_id = str(uuid.uuid4())
-    data = {
+# Jobs idénticos (user_id, property_id) dentro de esta ventana comparten job_id, mientras el
+# job siga en vuelo: al terminar la task el worker borra la clave (task_events.py)
+JOB_DEDUP_SECONDS = int(os.getenv("JOB_DEDUP_SECONDS", "60"))
+MAX_BATCH_JOBS = 500
+
+# Single-flight: una sola task en vuelo por property_id; los demás jobs se adjuntan a ella.
+# El worker libera la clave al terminar la task (recs_cache.py); el TTL cubre workers caídos.
+RECS_INFLIGHT_SECONDS = int(os.getenv("RECS_INFLIGHT_SECONDS", "300"))
+
+def _inflight_key(property_id) -> str:
+    return f"recs:inflight:{property_id}"
+
+def _dedup_key(job: JobRequest) -> str:
+    return f"jobs:inflight:{job.user_id}:{job.property_id}"
+
+# Claves de dedup de los jobs que esperan una task ({clave: job_id}); el worker las borra
+# al terminar la task (task_events.py), solo si siguen apuntando a su job
+def _task_dedup_key(task_id: str) -> str:
+    return f"task-dedup:{task_id}"
+
+# Borra KEYS[1] solo si sigue apuntando a ARGV[1] (igual que task_events._RELEASE_INFLIGHT)
+_RELEASE_IF_OWNER = """
+if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end
+return 0
+"""
+
+def _new_job_data(job: JobRequest, job_id: str, created_at: str) -> dict:
+    return {
         "job_id": job_id,
         "user_id": job.user_id,
         "status": "pending",
-        "created_at": datetime.now(timezone.utc).isoformat(),
+        "created_at": created_at,
         "preferences": job.preferences or {},
         "property_id": job.property_id,
         "budget_min": job.budget_min,
@@ -86,51 +300,259 @@ def create_job(job: JobRequest):
         "bedrooms": job.bedrooms,
         "bathrooms": job.bathrooms
     }
-    store_job(job_id, data)
 
+def _submit_jobs(jobs: List[JobRequest], queue: str = INTERACTIVE_QUEUE) -> List[dict]:
+    """
+    Crea los jobs (todos con property_id) con un round trip por etapa:
+    dedup (SET NX GET), cache de resultados (MGET), single-flight por property_id
+    (SET NX GET), guardado (pipeline) y envío a Celery.
+    Retorna una respuesta por job, en el mismo orden.
+    """
+    import uuid
+    created_at = datetime.now(timezone.utc).isoformat()
+    job_ids = [str(uuid.uuid4()) for _ in jobs]
+
+    # 1) Dedup: el primero en tomar la clave crea el job; el resto recibe su job_id
+    pipe = redis_client.pipeline(transaction=False)
+    for job, job_id in zip(jobs, job_ids):
+        pipe.set(_dedup_key(job), job_id, nx=True, ex=JOB_DEDUP_SECONDS, get=True)
+    previous = pipe.execute()
+
+    responses = [None] * len(jobs)
+    fresh = []
+    for i, (job, prev) in enumerate(zip(jobs, previous)):
+        if prev:
+            responses[i] = {
+                "job_id": prev.decode(),
+                "status": "deduplicated",
+                "message": "Identical job already in flight",
+                "created_at": None
+            }
+        else:
+            fresh.append(i)
+
+    # 2) Cache de resultados: el job nace completado, sin pasar por Celery
+    cached = get_cached_recommendations_many(int(jobs[i].property_id) for i in fresh)
+
+    # 3) Single-flight: si ya hay una task en vuelo para el property_id, el job se adjunta
+    compute = [i for i in fresh if int(jobs[i].property_id) not in cached]
+    pipe = redis_client.pipeline(transaction=False)
+    for i in compute:
+        pipe.set(_inflight_key(int(jobs[i].property_id)), job_ids[i], nx=True, ex=RECS_INFLIGHT_SECONDS, get=True)
+    leaders = {i: (leader.decode() if leader else None) for i, leader in zip(compute, pipe.execute())}
+
+    # 4) Guardado de todos los jobs en un pipeline
+    pipe = redis_client.pipeline(transaction=False)
+    to_send = []
+    followers = {}
+    for i in fresh:
+        job, job_id = jobs[i], job_ids[i]
+        data = _new_job_data(job, job_id, created_at)
+        result = cached.get(int(job.property_id))
+        if result is not None:
+            if result.get("recommendations"):
+                result["recommendations"] = result["recommendations"][:3]
+            data["status"] = "completed"
+            data["result"] = result
+            data["cached"] = True
+            data["completed_at"] = datetime.now(timezone.utc).isoformat()
+            message = "Job served from cache"
+            # el job ya terminó: no hay nada en vuelo que deduplicar
+            pipe.eval(_RELEASE_IF_OWNER, 1, _dedup_key(job), job_id)
+        elif leaders.get(i):
+            # comparte la task (y sus eventos task:{id}) del job que la creó
+            data["task_id"] = leaders[i]
+            data["events"] = True
+            data["coalesced_with"] = leaders[i]
+            followers.setdefault(leaders[i], []).append((i, data))
+            pipe.hset(_task_dedup_key(leaders[i]), _dedup_key(job), job_id)
+            pipe.expire(_task_dedup_key(leaders[i]), JOB_DEDUP_SECONDS)
+            message = "Job attached to in-flight computation"
+        else:
+            # task_id = job_id: el worker publica sus transiciones en task:{job_id} (task_events.py)
+            data["task_id"] = job_id
+            data["events"] = True
+            to_send.append((i, data))
+            pipe.hset(_task_dedup_key(job_id), _dedup_key(job), job_id)
+            pipe.expire(_task_dedup_key(job_id), JOB_DEDUP_SECONDS)
+            message = "Job created successfully"
+        store_job(job_id, data, pipe=pipe)
+        responses[i] = {
+            "job_id": job_id,
+            "status": data["status"],
+            "message": message,
+            "created_at": created_at
+        }
+    if followers:
+        pipe.incrby("recs:coalesced", sum(len(v) for v in followers.values()))
+    pipe.execute()
+
+    # 5) Envío: una task directa o un group (una sola conexión al broker para todo el lote)
     # Usa solo el algoritmo simple del enunciado (no requiere ML pesado)
-    if job.property_id is not None:
-        async_res = cel.send_task("tasks.generate_recommendations_simple", args=[int(job.property_id)])
-    else:
-        # Si no hay property_id, usa la primera propiedad disponible o retorna error
+    if to_send:
+        default_priority = INTERACTIVE_PRIORITY if queue == INTERACTIVE_QUEUE else BULK_PRIORITY
+        # enqueued_at viaja en los headers del mensaje: permite medir la edad del más antiguo
+        options = {"queue": queue, "headers": {"enqueued_at": time.time()}}
+
+        def _priority(i):
+            p = jobs[i].priority
+            return default_priority if p is None else min(max(p, PRIORITY_STEPS[0]), PRIORITY_STEPS[-1])
+
+        try:
+            if len(to_send) == 1:
+                i, data = to_send[0]
+                cel.send_task("tasks.generate_recommendations_simple",
+                              args=[int(data["property_id"])], task_id=data["job_id"],
+                              priority=_priority(i), **options)
+            else:
+                group(
+                    cel.signature("tasks.generate_recommendations_simple",
+                                  args=[int(data["property_id"])], task_id=data["job_id"],
+                                  priority=_priority(i), **options)
+                    for i, data in to_send
+                ).apply_async()
+        except Exception as e:
+            logger.warning("send_task falló: %s", e, extra={"event": "jobs.send_failed", "jobs": len(to_send)})
+            failed_at = datetime.now(timezone.utc).isoformat()
+            pipe = redis_client.pipeline(transaction=False)
+            for i, data in to_send:
+                # Otras solicitudes pueden haberse adjuntado a esta task (leen task:{id}): la
+                # transición "failed" las termina igual que si la hubiera publicado el worker
+                task_key = f"task:{data['job_id']}"
+                pipe.hset(task_key, mapping={"status": "failed", "error": "task_not_scheduled",
+                                             "updated_at": failed_at})
+                pipe.expire(task_key, JOB_TTL)
+                pipe.publish(f"task-events:{data['job_id']}", json.dumps({"status": "failed", "progress": None}))
+                pipe.delete(_inflight_key(int(data["property_id"])))
+                for j, d in [(i, data)] + followers.get(data["job_id"], []):
+                    d["status"] = "failed"
+                    d["error"] = "task_not_scheduled"
+                    update_job(d["job_id"], d, {"status": "failed", "error": "task_not_scheduled"},
+                               prev_status="pending", pipe=pipe)
+                    pipe.delete(_dedup_key(jobs[j]))
+                    responses[j]["status"] = "failed"
+                    responses[j]["message"] = "task_not_scheduled"
+            pipe.execute()
+            for i, data in to_send:
+                _release_dedup(data["job_id"])
+    return responses
+
+def _release_dedup(task_id: str):
+    """Borra las claves de dedup registradas para la task (como task_events._release_dedup)."""
+    owners = redis_client.hgetall(_task_dedup_key(task_id))
+    pipe = redis_client.pipeline(transaction=False)
+    for key, job_id in owners.items():
+        pipe.eval(_RELEASE_IF_OWNER, 1, key, job_id)
+    pipe.delete(_task_dedup_key(task_id))
+    pipe.execute()
+
+def _queue_metrics(queue: str, now: float) -> dict:
+    """Profundidad por prioridad y edad del mensaje más antiguo (cola de cada lista = LINDEX -1)."""
+    keys = [queue if p == 0 else f"{queue}:{p}" for p in PRIORITY_STEPS]
+    pipe = redis_client.pipeline(transaction=False)
+    for k in keys:
+        pipe.llen(k)
+        pipe.lindex(k, -1)
+    replies = pipe.execute()
+    by_priority, oldest = {}, None
+    for p, depth, tail in zip(PRIORITY_STEPS, replies[0::2], replies[1::2]):
+        if not depth:
+            continue
+        by_priority[p] = depth
+        try:
+            enqueued_at = float(json.loads(tail)["headers"]["enqueued_at"])
+            oldest = enqueued_at if oldest is None else min(oldest, enqueued_at)
+        except Exception:
+            pass  # mensaje sin header (encolado antes de este cambio)
+    depth = sum(by_priority.values())
+    return {
+        "depth": depth,
+        "by_priority": by_priority,
+        "oldest_age_seconds": round(now - oldest, 3) if oldest is not None else None,
+    }
+
+@app.get("/metrics/queues")
+def queue_metrics():
+    """Backlog de las colas de recomendaciones y cuántos procesos sugiere para drenarlo."""
+    now = time.time()
+    queues = {q: _queue_metrics(q, now) for q in (INTERACTIVE_QUEUE, BULK_QUEUE)}
+    backlog = sum(q["depth"] for q in queues.values())
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "queues": queues,
+        "backlog": backlog,
+        "suggested_processes": -(-backlog // AUTOSCALE_TASKS_PER_PROCESS),
+    }
+
+@app.post("/job")
+def create_job(job: JobRequest):
+    if job.property_id is None:
         raise HTTPException(status_code=400, detail="property_id is required for recommendations")
 
-    if not async_res or not async_res.id:
-        data["status"] = "failed"
-        data["error"] = "task_not_scheduled"
-        store_job(job_id, data)
-        raise HTTPException(status_code=500, detail="Celery did not return a task id")
+    response = _submit_jobs([job])[0]
+    if response["status"] == "failed":
+        raise HTTPException(status_code=500, detail="Celery did not schedule the task")
+    return response
+
+@app.post("/jobs/batch")
+def create_jobs_batch(batch: JobBatchRequest):
+    """Crea muchos jobs con un pipeline de Redis y un group de Celery."""
+    if len(batch.jobs) > MAX_BATCH_JOBS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_JOBS} jobs per batch")
+
+    valid = [i for i, j in enumerate(batch.jobs) if j.property_id is not None]
+    responses = [{"job_id": None, "status": "rejected", "message": "property_id is required for recommendations",
+                  "created_at": None}] * len(batch.jobs)
+    queue = INTERACTIVE_QUEUE if batch.interactive else BULK_QUEUE
+    for i, response in zip(valid, _submit_jobs([batch.jobs[i] for i in valid], queue) if valid else []):
+        responses[i] = response
 
-    data["task_id"] = async_res.id
-    store_job(job_id, data)
+    counts = {}
+    for r in responses:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    return {"jobs": responses, "total": len(responses), "by_status": counts}
 
+TERMINAL_STATUSES = {"completed", "failed"}
+
+def _job_response(data: dict) -> dict:
     return {
-        "job_id": job_id,
-        "status": "pending",
-        "message": "Job created successfully",
-        "created_at": data["created_at"]
+        "job_id": data["job_id"],
+        "status": data["status"],
+        "result": data.get("result"),
+        "error": data.get("error"),
+        "created_at": data["created_at"],
+        "completed_at": data.get("completed_at"),
+        "progress": data.get("progress")
     }
 
-@app.get("/job/{job_id}")
-def get_job_status(job_id: str):
-    data = get_job(job_id)
-    if not data:
-        raise HTTPException(status_code=404, detail="Job not found")
+def _apply_task_event(job_id: str, data: dict, event: dict) -> dict:
+    """Mezcla el hash task:{id} en el job; solo escribe (campos sueltos) si cambió el estado."""
+    if not event:
+        return data
+    event = {k.decode(): v.decode() for k, v in event.items()}
+    prev_status = data["status"]
+    status = event.get("status", prev_status)
+    if "progress" in event:
+        data["progress"] = int(float(event["progress"]))
+    if status == prev_status:
+        return data
 
-    task_id = data.get("task_id")
-    if not task_id:
-        # evita AsyncResult(None)
-        return {
-            "job_id": data["job_id"],
-            "status": data["status"],
-            "result": data.get("result"),
-            "error": data.get("error") or "task_id_missing",
-            "created_at": data["created_at"],
-            "completed_at": data.get("completed_at"),
-            "progress": data.get("progress")
-        }
+    fields = {"status": status, "progress": data.get("progress")}
+    if status == "completed":
+        # el worker guardó el resultado en result:{task_id}; el job solo lo referencia
+        fields["result_key"] = data["task_id"]
+    if event.get("error"):
+        fields["error"] = event["error"]
+    if status in TERMINAL_STATUSES:
+        fields["completed_at"] = event.get("updated_at") or datetime.now(timezone.utc).isoformat()
+    data.update(fields)
+    update_job(job_id, data, fields, prev_status=prev_status)
+    return data
 
-    r = AsyncResult(task_id, app=cel)
+def _poll_backend(job_id: str, data: dict) -> dict:
+    """Jobs creados antes de task_events: consulta el result backend de Celery."""
+    prev_status = data["status"]
+    r = AsyncResult(data["task_id"], app=cel)
     state = r.state 
 
     if state == "SUCCESS":
@@ -143,53 +565,211 @@ def get_job_status(job_id: str):
         except Exception:
             pass
         data["completed_at"] = datetime.now(timezone.utc).isoformat()
-        store_job(job_id, data)
 
     elif state == "FAILURE":
         data["status"] = "failed"
         data["error"] = str(r.info)
         data["completed_at"] = datetime.now(timezone.utc).isoformat()
-        store_job(job_id, data)
 
     elif state == "PROGRESS":
         info = r.info or {}
         data["status"] = "processing"
         data["progress"] = info.get("progress", 0)
-        store_job(job_id, data)
 
     else:
         data["status"] = state.lower()
-        store_job(job_id, data)
 
-    return {
-        "job_id": data["job_id"],
-        "status": data["status"],
-        "result": data.get("result"),
-        "error": data.get("error"),
-        "created_at": data["created_at"],
-        "completed_at": data.get("completed_at"),
-        "progress": data.get("progress")
-    }
+    if data["status"] != prev_status or state == "PROGRESS":
+        store_job(job_id, data, prev_status=prev_status, replace=True)
+    return data
 
-@app.get("/jobs")
-def list_jobs(user_id: Optional[str] = None, status: Optional[str] = None):
-    keys = redis_client.keys("job:*")
-    jobs = []
-    for k in keys:
+def read_job_status(job_id: str) -> Optional[dict]:
+    """
+    Job + última transición publicada por el worker, en un solo round trip a Redis
+    (dos si el job está adjunto a la task de otro job).
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hgetall(f"job:{job_id}")
+    pipe.hgetall(f"task:{job_id}")
+    pipe.get(_result_key(job_id))
+    raw, event, blob = pipe.execute(raise_on_error=False)
+    data = _load_job(job_id, raw)
+    if data is None:
+        return None
+    if data["status"] not in TERMINAL_STATUSES and data.get("task_id"):
+        if data.get("events"):
+            if data["task_id"] != job_id:
+                event = redis_client.hgetall(f"task:{data['task_id']}")
+            data = _apply_task_event(job_id, data, event)
+        else:
+            data = _poll_backend(job_id, data)
+
+    if data["status"] == "completed" and data.get("result") is None and data.get("result_key"):
+        if data["result_key"] != job_id:
+            blob = redis_client.get(_result_key(data["result_key"]))
+        result = codec.decode(blob)
+        if isinstance(result, dict) and result.get("recommendations"):
+            result["recommendations"] = result["recommendations"][:3]
+        data["result"] = result
+    return data
+
+# Long-poll y SSE: los waiters son async sobre redis.asyncio, así no ocupan un hilo del
+# threadpool (40 por defecto, el mismo que atiende POST /job y GET /job/{id}) mientras
+# esperan. Sobre MAX_JOB_WAITERS simultáneos por proceso se responde 503.
+MAX_JOB_WAITERS = int(os.getenv("MAX_JOB_WAITERS", "500"))
+async_redis = aioredis.from_url(REDIS_URL)
+_waiters = 0  # solo se toca desde el event loop: no necesita lock
+
+def _acquire_waiter():
+    global _waiters
+    if _waiters >= MAX_JOB_WAITERS:
+        raise HTTPException(status_code=503, detail="Too many clients waiting on jobs",
+                            headers={"Retry-After": "1"})
+    _waiters += 1
+
+def _release_waiter():
+    global _waiters
+    _waiters -= 1
+
+class _WaiterStream(StreamingResponse):
+    """StreamingResponse que libera el cupo del waiter al terminar, aunque el cliente se desconecte."""
+
+    async def __call__(self, scope, receive, send):
         try:
-            d = json.loads(redis_client.get(k))
-            if user_id and d.get("user_id") != user_id:
-                continue
-            if status and d.get("status") != status:
+            await super().__call__(scope, receive, send)
+        finally:
+            _release_waiter()
+
+async def _job_transitions(job_id: str, timeout: float):
+    """Estado actual del job y luego uno por cada transición publicada, hasta terminal o timeout."""
+    pubsub = async_redis.pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(f"task-events:{job_id}")
+    try:
+        # se lee después de suscribirse para no perder una transición intermedia;
+        # read_job_status es un par de round trips cortos: va al threadpool y lo suelta
+        data = await run_in_threadpool(read_job_status, job_id)
+        if data is None:
+            return
+        if data.get("task_id") not in (None, job_id):
+            # job adjunto: los eventos salen por el canal de la task compartida
+            await pubsub.subscribe(f"task-events:{data['task_id']}")
+            data = await run_in_threadpool(read_job_status, job_id)
+        yield data
+        deadline = time.monotonic() + timeout
+        while data["status"] not in TERMINAL_STATUSES and data.get("events"):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if await pubsub.get_message(timeout=remaining) is None:
                 continue
-            jobs.append({
-                "job_id": d["job_id"],
-                "user_id": d.get("user_id"),
-                "status": d.get("status"),
-                "created_at": d.get("created_at"),
-                "completed_at": d.get("completed_at")
-            })
-        except Exception:
-            continue
-    jobs.sort(key=lambda x: x["created_at"] or "", reverse=True)
-    return {"jobs": jobs, "total": len(jobs)}
+            data = await run_in_threadpool(read_job_status, job_id)
+            yield data
+    finally:
+        await pubsub.aclose()
+
+@app.get("/job/{job_id}")
+def get_job_status(job_id: str):
+    data = read_job_status(job_id)
+    if not data:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    response = _job_response(data)
+    if not data.get("task_id") and not data.get("cached"):
+        response["error"] = data.get("error") or "task_id_missing"
+    return response
+
+@app.get("/job/{job_id}/wait")
+async def wait_job(job_id: str, timeout: float = Query(25, ge=0, le=60)):
+    """Long-poll: responde apenas el job termina o al cumplirse timeout (segundos)."""
+    _acquire_waiter()
+    try:
+        data = None
+        async for data in _job_transitions(job_id, timeout):
+            pass
+    finally:
+        _release_waiter()
+    if data is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(data)
+
+@app.get("/job/{job_id}/events")
+async def job_events(job_id: str, timeout: float = Query(120, ge=1, le=600)):
+    """Server-Sent Events con cada transición del job; se cierra al terminar."""
+    if not await async_redis.exists(f"job:{job_id}"):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def stream():
+        async for data in _job_transitions(job_id, timeout):
+            yield f"event: status\ndata: {json.dumps(_job_response(data))}\n\n"
+
+    _acquire_waiter()  # lo libera _WaiterStream al cerrar la respuesta
+    return _WaiterStream(stream(), media_type="text/event-stream",
+                         headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/jobs")
+def list_jobs(user_id: Optional[str] = None, status: Optional[str] = None,
+              limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0)):
+    """Listado paginado (más recientes primero) desde los índices jobs:idx:*."""
+    if user_id and status:
+        # intersección temporal; ambos sets están acotados por el recorte de JOB_TTL
+        import uuid
+        key = f"jobs:idx:tmp:{uuid.uuid4()}"
+        pipe = redis_client.pipeline()
+        pipe.zinterstore(key, [_idx_user(user_id), _idx_status(status)], aggregate="MAX")
+        pipe.expire(key, 30)
+        pipe.execute()
+        temporary = True
+    else:
+        key = _idx_user(user_id) if user_id else (_idx_status(status) if status else JOBS_IDX_ALL)
+        temporary = False
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.zcard(key)
+        pipe.zrevrange(key, offset, offset + limit - 1)
+        total, ids = pipe.execute()
+    finally:
+        if temporary:
+            redis_client.delete(key)
+
+    summary = ("job_id", "user_id", "status", "created_at", "completed_at")
+    pipe = redis_client.pipeline(transaction=False)
+    for i in ids:
+        pipe.hmget(f"job:{i.decode()}", *summary)
+    jobs = []
+    for values in (pipe.execute(raise_on_error=False) if ids else []):
+        if isinstance(values, Exception) or values[0] is None:
+            continue  # expiró entre el recorte del índice y la lectura
+        jobs.append({k: (v.decode() if v is not None else None) for k, v in zip(summary, values)})
+    return {"jobs": jobs, "total": total, "limit": limit, "offset": offset}
+
+
+JOBS_FORMAT_KEY = "jobs:format"
+
+@app.on_event("startup")
+def reindex_jobs():
+    """
+    Migra jobs guardados como JSON (formato anterior) a hashes y construye los índices si
+    faltan. Usa SCAN (no KEYS) y no hace nada si ya está todo al día.
+    """
+    try:
+        needs_index = not redis_client.exists(JOBS_IDX_ALL)
+        if not needs_index and redis_client.get(JOBS_FORMAT_KEY) == b"hash":
+            return
+        for k in redis_client.scan_iter(match="job:*", count=500):
+            kind = redis_client.type(k)
+            ttl = redis_client.ttl(k)
+            ttl = ttl if ttl and ttl > 0 else JOB_TTL
+            if kind == b"string":
+                raw = redis_client.get(k)
+                if raw:
+                    d = json.loads(raw)
+                    store_job(d["job_id"], d, ttl=ttl, replace=True)
+            elif kind == b"hash" and needs_index:
+                d = _job_from_hash(redis_client.hgetall(k))
+                pipe = redis_client.pipeline(transaction=False)
+                _index_job(pipe, d["job_id"], d, ttl)
+                pipe.execute()
+        redis_client.set(JOBS_FORMAT_KEY, "hash")
+    except Exception as e:
+        logger.warning("reindex_jobs falló: %s", e, extra={"event": "jobs.reindex_failed"})
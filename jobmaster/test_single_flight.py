@@ -0,0 +1,71 @@
+"""
+Pruebas del single-flight de _submit_jobs contra un Redis en memoria (fakeredis con Lua),
+sin broker de Celery.
+Uso: pytest jobmaster/test_single_flight.py
+"""
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+import main  # noqa: E402
+
+
+class FakeCelery:
+    """Registra los envíos; on_send corre antes de cada uno (puede fallar a propósito)."""
+
+    def __init__(self):
+        self.sent = []
+        self.on_send = None
+
+    def send_task(self, name, args=None, task_id=None, **options):
+        if self.on_send is not None:
+            self.on_send()
+        self.sent.append(task_id)
+
+
+@pytest.fixture
+def cel(monkeypatch):
+    monkeypatch.setattr(main, "redis_client", fakeredis.FakeRedis())
+    monkeypatch.setattr(main, "get_cached_recommendations_many", lambda ids: {})
+    fake = FakeCelery()
+    monkeypatch.setattr(main, "cel", fake)
+    return fake
+
+
+def _submit(user_id, property_id=7):
+    return main._submit_jobs([main.JobRequest(user_id=user_id, property_id=property_id)])[0]
+
+
+def test_followers_share_the_leader_task(cel):
+    leader = _submit("u1")
+    follower = _submit("u2")
+    assert leader["status"] == "pending" and cel.sent == [leader["job_id"]]
+    assert follower["message"] == "Job attached to in-flight computation"
+    assert main.read_job_status(follower["job_id"])["task_id"] == leader["job_id"]
+
+
+def test_failed_leader_fails_followers_from_other_requests(cel):
+    followers = []
+
+    def attach_then_fail():
+        # otra solicitud se adjunta a la task mientras esta todavía no se envía
+        followers.append(_submit("u2"))
+        raise ConnectionError("broker caído")
+
+    cel.on_send = attach_then_fail
+    leader = _submit("u1")
+    follower = followers[0]
+    assert leader["status"] == "failed" and follower["status"] == "pending"
+
+    status = main.read_job_status(follower["job_id"])
+    assert status["status"] == "failed" and status["error"] == "task_not_scheduled"
+    r = main.redis_client
+    assert not r.exists(main._inflight_key(7))
+    assert not r.exists("jobs:inflight:u1:7") and not r.exists("jobs:inflight:u2:7")
+
+    # sin la clave en vuelo ni el dedup, un reintento crea y envía una task nueva
+    cel.on_send = None
+    retry = _submit("u2")
+    assert retry["status"] == "pending" and retry["job_id"] != follower["job_id"]
+    assert cel.sent == [retry["job_id"]]
@@ -0,0 +1,59 @@
+"""
+Autoscaler de Celery guiado por el backlog de las colas de recomendaciones.
+
+El Autoscaler por defecto solo mira las tasks ya reservadas por el worker; con
+worker_prefetch_multiplier=1 eso es como mucho un mensaje por proceso, así que nunca
+ve la cola. Este lee la profundidad de recs.interactive/recs.bulk en Redis (todas las
+listas de prioridad) y pide un proceso por cada TASKS_PER_PROCESS mensajes pendientes,
+dentro de los límites de --autoscale=max,min.
+"""
+
+import logging
+import math
+import os
+import time
+
+import redis
+from celery.worker.autoscale import Autoscaler
+
+from celery_app import BULK_QUEUE, INTERACTIVE_QUEUE, PRIORITY_STEPS, REDIS_URL
+
+logger = logging.getLogger(__name__)
+
+TASKS_PER_PROCESS = int(os.getenv("AUTOSCALE_TASKS_PER_PROCESS", "4"))
+DEPTH_CACHE_SECONDS = 1.0
+
+
+def queue_keys(queue):
+    """Listas de Redis de una cola con priority_steps y sep=":" (prioridad 0 = nombre de la cola)."""
+    return [queue if p == 0 else f"{queue}:{p}" for p in PRIORITY_STEPS]
+
+
+def queue_depth(client, queue):
+    pipe = client.pipeline(transaction=False)
+    for k in queue_keys(queue):
+        pipe.llen(k)
+    return sum(pipe.execute())
+
+
+class QueueDepthAutoscaler(Autoscaler):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._redis = redis.from_url(REDIS_URL, socket_timeout=2)
+        self._depth = 0
+        self._depth_at = 0.0
+
+    def _backlog(self):
+        now = time.monotonic()
+        if now - self._depth_at >= DEPTH_CACHE_SECONDS:
+            try:
+                self._depth = sum(queue_depth(self._redis, q) for q in (INTERACTIVE_QUEUE, BULK_QUEUE))
+            except Exception as e:
+                logger.warning("autoscale: no se pudo leer la profundidad de las colas: %s", e)
+            self._depth_at = now
+        return self._depth
+
+    @property
+    def qty(self):
+        # procesos deseados: los ocupados + uno por cada TASKS_PER_PROCESS en cola
+        return super().qty + math.ceil(self._backlog() / TASKS_PER_PROCESS)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark local del ranking de recomendaciones: Python puro vs numpy.
+No requiere BD ni Redis; genera propiedades sintéticas en memoria.
+
+Uso: python bench_recommendations.py [tamaños separados por coma]
+     python bench_recommendations.py 1000,100000,1000000
+"""
+
+import random
+import sys
+import time
+
+import numpy as np
+
+from tasks import (
+    TOP_K,
+    _extract_comuna_key,
+    _load_numpy,
+    _get_address,
+    _get_lat_lon,
+    _haversine,
+    _prepare_candidates,
+    _rank_arrays,
+    _rank_numpy,
+    _rank_python,
+)
+
+COMUNAS = ["Ñuñoa", "Providencia", "Las Condes", "Santiago", "Maipú", "La Florida",
+           "Vitacura", "Macul", "San Miguel", "Peñalolén"]
+BASE_LAT, BASE_LON = -33.4569, -70.5975
+
+
+def make_rows(n, seed=42):
+    """Filas con la misma forma que entrega RealDictCursor (location como dict JSONB)."""
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n):
+        comuna = COMUNAS[i % len(COMUNAS)]
+        loc = {"address": f"Calle {i} {rnd.randint(1, 9999)}, {comuna}"}
+        if rnd.random() > 0.1:  # ~10% sin coordenadas
+            loc["lat"] = BASE_LAT + rnd.uniform(-0.08, 0.08)
+            loc["lon"] = BASE_LON + rnd.uniform(-0.08, 0.08)
+        rows.append({
+            "id": i + 1,
+            "name": f"Propiedad {i + 1}",
+            "price": float(rnd.randint(50_000_000, 300_000_000)),
+            "bedrooms": 2,
+            "bathrooms": 1,
+            "m2": 60.0,
+            "url": f"https://example.com/p/{i + 1}",
+            "location": loc,
+        })
+    return rows
+
+
+def legacy_rank(rows, comuna_key, base_lat, base_lon, k=TOP_K):
+    """Algoritmo previo: filtra por address y llama _get_lat_lon dentro del sort key."""
+    candidates = [r for r in rows if _extract_comuna_key(_get_address(r.get("location"))) == comuna_key]
+
+    def _sort_key(r):
+        lat, lon = _get_lat_lon(r.get("location"))
+        dist = _haversine(base_lat, base_lon, lat, lon)
+        d = dist if dist is not None else float("inf")
+        return (d, float(r["price"]) if r["price"] is not None else 1e18)
+
+    return sorted(candidates, key=_sort_key)[:k]
+
+
+def timed(fn, repeats):
+    best = float("inf")
+    result = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def run(n):
+    rows = make_rows(n)
+    comuna_key = _extract_comuna_key(f"x, {COMUNAS[0]}")
+    repeats = 3 if n <= 100_000 else 1
+
+    t_legacy, legacy = timed(lambda: legacy_rank(rows, comuna_key, BASE_LAT, BASE_LON), repeats)
+    t_prep, candidates = timed(lambda: _prepare_candidates(rows, comuna_key), repeats)
+    t_py, py = timed(lambda: _rank_python(BASE_LAT, BASE_LON, candidates), repeats)
+    t_np, vec = timed(lambda: _rank_numpy(BASE_LAT, BASE_LON, candidates), repeats)
+
+    # Ranking sobre arrays ya cargados (escenario con índice en memoria)
+    lats = np.array([c[2] if c[2] is not None else np.nan for c in candidates])
+    lons = np.array([c[3] if c[3] is not None else np.nan for c in candidates])
+    prices = np.array([c[0]["price"] for c in candidates], dtype=float)
+    t_arr, _ = timed(lambda: _rank_arrays(BASE_LAT, BASE_LON, lats, lons, prices), repeats)
+
+    same = [r["id"] for r in legacy] == [c[0]["id"] for c, _ in py] == [c[0]["id"] for c, _ in vec]
+
+    print(f"\n📊 n={n:,} (candidatos en comuna: {len(candidates):,})")
+    print(f"   legacy (parse x2 + sorted) : {t_legacy * 1000:10.2f} ms")
+    print(f"   parse único de location    : {t_prep * 1000:10.2f} ms")
+    print(f"   ranking Python (sorted)    : {t_py * 1000:10.2f} ms  -> total {(t_prep + t_py) * 1000:.2f} ms")
+    print(f"   ranking numpy (argpartition): {t_np * 1000:9.2f} ms  -> total {(t_prep + t_np) * 1000:.2f} ms")
+    print(f"   numpy sobre arrays cargados: {t_arr * 1000:10.3f} ms")
+    print(f"   mismos resultados: {'✅' if same else '❌'}")
+    return same
+
+
+if __name__ == "__main__":
+    sizes = [int(x) for x in (sys.argv[1] if len(sys.argv) > 1 else "1000,100000,1000000").split(",")]
+    _load_numpy()  # tasks importa numpy de forma diferida
+    print("🧪 Benchmark ranking de recomendaciones (Python puro vs numpy)")
+    print("=" * 60)
+    ok = all(run(n) for n in sizes)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la búsqueda de vecinos en la BD: bucket completo + ranking en Python
+vs prefijo de geohash vs PostGIS KNN (si la extensión está disponible).
+
+Crea una tabla propia (bench_properties_spatial), la llena con datos sintéticos y
+mide latencia por consulta para cada tamaño. Usa las mismas variables DB_* del worker.
+
+Uso: python bench_spatial.py [tamaños separados por coma] [--queries 200] [--keep]
+     python bench_spatial.py 10000,100000,1000000
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from psycopg2.extras import execute_values
+
+import spatial
+from geohash import encode
+from tasks import TOP_K, _rank_candidates, get_connection
+
+TABLE = "bench_properties_spatial"
+COMUNAS = ["ñuñoa", "providencia", "las condes", "santiago", "maipú", "la florida",
+           "vitacura", "macul", "san miguel", "peñalolén"]
+CENTER_LAT, CENTER_LON = -33.45, -70.62
+
+
+def has_postgis(cur):
+    cur.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'postgis'")
+    return cur.fetchone() is not None
+
+
+def create_table(conn, postgis):
+    cur = conn.cursor()
+    cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    if postgis:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS postgis")
+        cur.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    cur.execute(f"""
+        CREATE TABLE {TABLE} (
+            id SERIAL PRIMARY KEY,
+            name TEXT, price NUMERIC, bedrooms INT, bathrooms INT, m2 NUMERIC,
+            url TEXT, location JSONB,
+            comuna_key TEXT, lat DOUBLE PRECISION, lon DOUBLE PRECISION, geohash TEXT
+        )
+    """)
+    if postgis:
+        cur.execute(f"""
+            ALTER TABLE {TABLE} ADD COLUMN geog geography(Point, 4326)
+                GENERATED ALWAYS AS (ST_SetSRID(ST_MakePoint(lon, lat), 4326)::geography) STORED
+        """)
+    conn.commit()
+    cur.close()
+
+
+def seed(conn, n, postgis, batch=10000):
+    rnd = random.Random(7)
+    cur = conn.cursor()
+    for start in range(0, n, batch):
+        rows = []
+        for i in range(start, min(n, start + batch)):
+            comuna = COMUNAS[i % len(COMUNAS)]
+            lat = CENTER_LAT + rnd.uniform(-0.1, 0.1)
+            lon = CENTER_LON + rnd.uniform(-0.1, 0.1)
+            rows.append((f"Propiedad {i}", rnd.randint(50_000_000, 300_000_000), rnd.randint(1, 4), 1, 60,
+                         f"https://example.com/p/{i}", f'{{"address": "Calle {i}, {comuna}"}}',
+                         comuna, lat, lon, encode(lat, lon)))
+        execute_values(cur, f"""
+            INSERT INTO {TABLE} (name, price, bedrooms, bathrooms, m2, url, location, comuna_key, lat, lon, geohash)
+            VALUES %s
+        """, rows)
+        conn.commit()
+    cur.execute(f"CREATE INDEX ON {TABLE} (comuna_key, bedrooms, price)")
+    cur.execute(f"CREATE INDEX ON {TABLE} (comuna_key, bedrooms, geohash text_pattern_ops)")
+    if postgis:
+        cur.execute(f"CREATE INDEX ON {TABLE} USING GIST (comuna_key, bedrooms, geog)")
+    cur.execute(f"ANALYZE {TABLE}")
+    conn.commit()
+    cur.close()
+
+
+def bucket_scan(cur, base):
+    cur.execute(f"""
+        SELECT {spatial.CANDIDATE_COLUMNS}
+        FROM {TABLE}
+        WHERE comuna_key = %s AND bedrooms = %s AND price <= %s AND id <> %s
+    """, (base["comuna_key"], base["bedrooms"], base["price"], base["id"]))
+    candidates = [(r, None, r["lat"], r["lon"]) for r in cur.fetchall()]
+    return _rank_candidates(base["lat"], base["lon"], candidates, TOP_K)[0]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def run(conn, n, queries, postgis):
+    print(f"\n📦 Sembrando {n:,} propiedades...")
+    t0 = time.perf_counter()
+    create_table(conn, postgis)
+    seed(conn, n, postgis)
+    print(f"   listo en {time.perf_counter() - t0:.1f}s")
+
+    cur = conn.cursor()
+    cur.execute(f"SELECT id, price, bedrooms, comuna_key, lat, lon FROM {TABLE} ORDER BY random() LIMIT %s", (queries,))
+    bases = cur.fetchall()
+
+    methods = {
+        "bucket+ranking": bucket_scan,
+        "geohash": lambda c, b: spatial.nearest_geohash(
+            c, b, TOP_K, lambda la, lo, cands, k: _rank_candidates(la, lo, cands, k)[0], table=TABLE),
+    }
+    if postgis:
+        methods["postgis KNN"] = lambda c, b: spatial.nearest_postgis(c, b, TOP_K, table=TABLE)
+
+    reference = {b["id"]: [x[0][0]["id"] for x in bucket_scan(cur, b)] for b in bases}
+    for name, fn in methods.items():
+        lat_ms, mismatches = [], 0
+        for b in bases:
+            t = time.perf_counter()
+            top = fn(cur, b)
+            lat_ms.append((time.perf_counter() - t) * 1000)
+            if top is not None and [x[0][0]["id"] for x in top] != reference[b["id"]]:
+                mismatches += 1
+        print(f"   {name:15s} p50={statistics.median(lat_ms):8.2f} ms  p95={percentile(lat_ms, 95):8.2f} ms"
+              f"  distintos al bucket={mismatches}")
+    cur.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de vecinos más cercanos en la BD")
+    parser.add_argument("sizes", nargs="?", default="10000,100000,1000000")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--keep", action="store_true", help="No borrar la tabla al terminar")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    cur = conn.cursor()
+    postgis = has_postgis(cur)
+    cur.close()
+    print(f"🧪 Benchmark espacial (PostGIS {'disponible' if postgis else 'no disponible'})")
+    print("=" * 60)
+    try:
+        for n in (int(x) for x in args.sizes.split(",")):
+            run(conn, n, args.queries, postgis)
+    finally:
+        if not args.keep:
+            cur = conn.cursor()
+            cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+            conn.commit()
+            cur.close()
+        conn.close()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark de arranque del worker de recomendaciones.
+
+Mide, en procesos nuevos, el costo de importar celery_app (lo que paga cada hijo
+reciclado), el de numpy (ahora diferido) y, si hay BD, el warm-up por proceso
+(pool + índice en memoria), conexión nueva vs pool y la primera task vs las siguientes.
+
+Uso: python bench_startup.py [--runs 5] [--property-id 123] [--importtime]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def timed_subprocess(code, runs):
+    """Mediana de segundos que reporta `code` (debe imprimir un float) en procesos nuevos."""
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], cwd=HERE, capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+def importtime_top(module, n=10):
+    """Módulos más caros de importar según python -X importtime (tiempo acumulado, µs)."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         cwd=HERE, capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self_us, cum_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cum_us), name.strip()))
+    return sorted(rows, reverse=True)[:n]
+
+
+def in_process(property_id, runs):
+    import tasks
+
+    t = time.perf_counter()
+    conn = tasks.get_connection()
+    conn.close()
+    print(f"   conexión nueva (antes, por task) : {(time.perf_counter() - t) * 1000:8.2f} ms")
+
+    t = time.perf_counter()
+    tasks._init_worker_process()
+    print(f"   worker_process_init (pool+índice): {(time.perf_counter() - t) * 1000:8.2f} ms")
+
+    t = time.perf_counter()
+    with tasks.db_connection():
+        pass
+    print(f"   conexión desde el pool           : {(time.perf_counter() - t) * 1000:8.2f} ms")
+
+    if property_id is None:
+        with tasks.db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT id FROM properties WHERE price IS NOT NULL LIMIT 1")
+            row = cur.fetchone()
+            cur.close()
+        if row is None:
+            print("   (sin propiedades: se omite la medición de tasks)")
+            return
+        property_id = row["id"]
+
+    lat = []
+    for _ in range(runs):
+        t = time.perf_counter()
+        tasks.generate_recommendations_simple(property_id)
+        lat.append((time.perf_counter() - t) * 1000)
+    print(f"   primera task                     : {lat[0]:8.2f} ms")
+    if len(lat) > 1:
+        print(f"   tasks siguientes (mediana)       : {statistics.median(lat[1:]):8.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de arranque del worker")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--property-id", type=int)
+    parser.add_argument("--importtime", action="store_true", help="Muestra los imports más caros")
+    args = parser.parse_args()
+
+    print("🧪 Arranque del worker de recomendaciones")
+    print("=" * 60)
+    clock = "import time; t = time.perf_counter(); {}; print(time.perf_counter() - t)"
+    print(f"   import celery_app (proceso nuevo): {timed_subprocess(clock.format('import celery_app'), args.runs) * 1000:8.2f} ms")
+    print(f"   import numpy (diferido)          : {timed_subprocess(clock.format('import numpy'), args.runs) * 1000:8.2f} ms")
+
+    if args.importtime:
+        print("\n   imports más caros de celery_app (acumulado):")
+        for cum_us, name in importtime_top("celery_app"):
+            print(f"     {cum_us / 1000:8.2f} ms  {name}")
+
+    print()
+    try:
+        in_process(args.property_id, args.runs)
+    except Exception as e:
+        print(f"   (sin BD, se omite el warm-up y las tasks: {e})")
@@ -1,11 +1,28 @@
 from celery import Celery
+from celery.signals import setup_logging
+from kombu import Queue
 import os
 from dotenv import load_dotenv
 
+import log_config
+
 load_dotenv()
 
+
+@setup_logging.connect
+def _setup_logging(**_):
+    # Con un receptor conectado Celery no configura el logging (ni se apropia del logger
+    # raíz): todo, incluidos los logs de Celery, sale en JSON por la cola de log_config.py
+    log_config.setup("worker")
+
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
 
+# Colas: interactive (jobs de un usuario esperando) y bulk (lotes/precálculos).
+# El JobMaster elige la cola y la prioridad (0 = más alta) al encolar.
+INTERACTIVE_QUEUE = "recs.interactive"
+BULK_QUEUE = "recs.bulk"
+PRIORITY_STEPS = list(range(10))
+
 app = Celery(
     "recommendation_worker",
     broker=REDIS_URL,
@@ -23,6 +40,13 @@ app.conf.update(
     task_soft_time_limit=25 * 60, # 25 min
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
+    task_queues=(Queue(INTERACTIVE_QUEUE), Queue(BULK_QUEUE)),
+    task_default_queue=INTERACTIVE_QUEUE,
+    task_default_priority=5,
+    # Prioridades en Redis: una lista por nivel (recs.bulk:6, ...), se atienden en orden
+    broker_transport_options={"priority_steps": PRIORITY_STEPS, "sep": ":", "queue_order_strategy": "priority"},
+    # --autoscale usa el backlog de las colas, no solo las tasks ya reservadas (autoscale.py)
+    worker_autoscaler="autoscale:QueueDepthAutoscaler",
 )
 
 # Importa el módulo de tareas para registrarlas
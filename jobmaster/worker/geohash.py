@@ -0,0 +1,67 @@
+"""
+Geohash mínimo (encode + celdas vecinas) para el fallback sin PostGIS.
+El listener usa el mismo encoder al ingresar propiedades (mqtt_listener/geo.py).
+"""
+
+import math
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_M_PER_DEG = 111320.0
+
+
+def encode(lat, lon, precision=9):
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    out = []
+    bit, ch, even = 0, 0, True
+    while len(out) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                ch = (ch << 1) | 1
+                lon_lo = mid
+            else:
+                ch <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch <<= 1
+                lat_hi = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            out.append(_BASE32[ch])
+            bit, ch = 0, 0
+    return "".join(out)
+
+
+def cell_size_deg(precision):
+    """(alto, ancho) en grados de una celda de la precisión dada."""
+    bits = 5 * precision
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def min_cell_size_m(precision, lat):
+    """Lado más corto de la celda en metros a esa latitud."""
+    h, w = cell_size_deg(precision)
+    return min(h * _M_PER_DEG, w * _M_PER_DEG * math.cos(math.radians(lat)))
+
+
+def neighbors(lat, lon, precision):
+    """Celda que contiene (lat, lon) y sus 8 vecinas (bloque 3x3, sin duplicados)."""
+    h, w = cell_size_deg(precision)
+    cells = []
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            la = max(-90.0, min(90.0, lat + dy * h))
+            lo = ((lon + dx * w + 180.0) % 360.0) - 180.0
+            c = encode(la, lo, precision)
+            if c not in cells:
+                cells.append(c)
+    return cells
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Generador de carga para las colas de recomendaciones.
+
+Para cada cantidad de procesos N fija el pool de los workers con
+control.autoscale(N, N), encola una ráfaga de jobs en el JobMaster y mide cuánto tarda
+en drenarse (throughput y latencia por job), leyendo los hashes task:{id} que publican
+los workers (task_events.py). Antes de cada ronda borra el cache de resultados para que
+todos los jobs lleguen a un worker.
+
+Uso: python loadgen.py --jobmaster http://localhost:8000 --jobs 300 --procs 1,2,4
+     python loadgen.py --bulk --property-ids 1-500
+"""
+
+import argparse
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import redis
+import requests
+
+from celery_app import REDIS_URL, app
+
+TERMINAL = {b"completed", b"failed"}
+
+
+def property_ids_from_db(n):
+    from tasks import get_connection
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT id FROM properties WHERE price IS NOT NULL ORDER BY random() LIMIT %s", (n,))
+        return [r["id"] for r in cur.fetchall()]
+    finally:
+        cur.close()
+        conn.close()
+
+
+def parse_ids(spec):
+    lo, _, hi = spec.partition("-")
+    return list(range(int(lo), int(hi) + 1)) if hi else [int(x) for x in spec.split(",")]
+
+
+def purge_cache(r):
+    for pattern in ("recs:prop:*", "recs:inflight:*"):
+        keys = list(r.scan_iter(match=pattern, count=1000))
+        for i in range(0, len(keys), 500):
+            r.delete(*keys[i:i + 500])
+
+
+def submit(base_url, user_id, pids, bulk):
+    """Encola los jobs; retorna {job_id: instante de envío}."""
+    sent = {}
+    if bulk:
+        for i in range(0, len(pids), 100):
+            chunk = pids[i:i + 100]
+            t = time.time()
+            r = requests.post(f"{base_url}/jobs/batch", timeout=30,
+                              json={"jobs": [{"user_id": user_id, "property_id": p} for p in chunk]})
+            r.raise_for_status()
+            for j in r.json()["jobs"]:
+                if j.get("job_id"):
+                    sent[j["job_id"]] = t
+        return sent
+
+    def one(pid):
+        t = time.time()
+        r = requests.post(f"{base_url}/job", json={"user_id": user_id, "property_id": pid}, timeout=30)
+        r.raise_for_status()
+        return r.json()["job_id"], t
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        for job_id, t in pool.map(one, pids):
+            sent[job_id] = t
+    return sent
+
+
+def wait_done(r, base_url, sent, timeout):
+    """Espera a que todos los jobs terminen; retorna (latencias en s, edad máx. de cola observada)."""
+    pending = set(sent)
+    done_at = {}
+    max_age = 0.0
+    deadline = time.time() + timeout
+    while pending and time.time() < deadline:
+        ids = list(pending)
+        pipe = r.pipeline(transaction=False)
+        for job_id in ids:
+            pipe.hmget(f"task:{job_id}", "status", "updated_at")
+        for job_id, (status, updated_at) in zip(ids, pipe.execute()):
+            if status in TERMINAL:
+                done_at[job_id] = datetime.fromisoformat(updated_at.decode()).timestamp()
+                pending.discard(job_id)
+        try:
+            metrics = requests.get(f"{base_url}/metrics/queues", timeout=5).json()
+            ages = [q["oldest_age_seconds"] or 0 for q in metrics["queues"].values()]
+            max_age = max([max_age] + ages)
+        except Exception:
+            pass
+        time.sleep(0.5)
+    if pending:
+        print(f"   ⚠️ {len(pending)} jobs sin terminar tras {timeout}s")
+    return [done_at[j] - sent[j] for j in done_at], max_age
+
+
+def run_round(r, args, procs, pids, round_no):
+    app.control.autoscale(procs, procs)
+    time.sleep(args.settle)
+    purge_cache(r)
+
+    user_id = f"loadgen-{int(time.time())}-{round_no}"
+    t0 = time.time()
+    sent = submit(args.jobmaster, user_id, pids, args.bulk)
+    latencies, max_age = wait_done(r, args.jobmaster, sent, args.timeout)
+    wall = time.time() - t0
+    if not latencies:
+        print(f"   procs={procs}: ningún job terminó")
+        return
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(0.95 * (len(latencies) - 1)))]
+    print(f"   procs={procs:2d}  jobs={len(latencies):4d}  wall={wall:7.2f}s  "
+          f"throughput={len(latencies) / wall:7.2f} jobs/s  p50={statistics.median(latencies):6.2f}s  "
+          f"p95={p95:6.2f}s  edad máx. cola={max_age:6.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carga sobre las colas de recomendaciones")
+    parser.add_argument("--jobmaster", default="http://localhost:8000")
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--procs", default="1,2,4", help="Procesos por worker en cada ronda")
+    parser.add_argument("--property-ids", help="Rango 1-500 o lista 3,5,8 (por defecto, ids al azar de la BD)")
+    parser.add_argument("--bulk", action="store_true", help="Enviar por POST /jobs/batch (cola recs.bulk)")
+    parser.add_argument("--settle", type=float, default=3.0, help="Segundos tras cambiar el pool")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    args = parser.parse_args()
+
+    r = redis.from_url(REDIS_URL)
+    pool = parse_ids(args.property_ids) if args.property_ids else property_ids_from_db(args.jobs)
+    if not pool:
+        raise SystemExit("No hay property_ids para generar carga")
+    # property_ids distintos: los repetidos se fusionarían en una sola task (single-flight)
+    if len(pool) < args.jobs:
+        print(f"⚠️ Solo hay {len(pool)} property_ids distintos; se usan {len(pool)} jobs por ronda")
+    pids = random.sample(pool, min(args.jobs, len(pool)))
+
+    print(f"🧪 Carga de recomendaciones: {len(pids)} jobs por ronda, "
+          f"{'batch/bulk' if args.bulk else 'POST /job interactive'}")
+    print("=" * 60)
+    for n, procs in enumerate(int(x) for x in args.procs.split(",")):
+        run_round(r, args, procs, pids, n)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Carga inicial de property_recommendations: encola tasks.precompute_bucket para cada
+bucket (comuna_key, bedrooms) con propiedades, en la cola recs.bulk. Con --inline los
+calcula en este proceso (sin workers), útil para medir o en desarrollo.
+
+Uso: python precompute_all.py [--inline] [--limit 50]
+"""
+
+import argparse
+import time
+
+from celery_app import BULK_QUEUE, PRIORITY_STEPS, app
+from tasks import get_connection, precompute_bucket
+
+
+def buckets(limit=None):
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT comuna_key, bedrooms, COUNT(*) AS n
+            FROM properties
+            WHERE comuna_key IS NOT NULL AND bedrooms IS NOT NULL AND price IS NOT NULL
+            GROUP BY comuna_key, bedrooms
+            ORDER BY n DESC
+            LIMIT %s
+        """, (limit,))
+        return [(r["comuna_key"], r["bedrooms"], r["n"]) for r in cur.fetchall()]
+    finally:
+        cur.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precalcula recomendaciones de todos los buckets")
+    parser.add_argument("--inline", action="store_true", help="Calcula aquí en vez de encolar")
+    parser.add_argument("--limit", type=int, help="Solo los N buckets más grandes")
+    args = parser.parse_args()
+
+    todo = buckets(args.limit)
+    print(f"🧮 {len(todo)} buckets, {sum(n for _, _, n in todo)} propiedades")
+    t0 = time.perf_counter()
+    for comuna_key, bedrooms, n in todo:
+        if args.inline:
+            res = precompute_bucket(comuna_key, bedrooms)
+            print(f"   {comuna_key}/{bedrooms}: {res['properties']} propiedades en {res['processing_time']}")
+        else:
+            app.send_task("tasks.precompute_bucket", args=[comuna_key, bedrooms],
+                          queue=BULK_QUEUE, priority=PRIORITY_STEPS[-1])
+    print(f"✅ {'Calculados' if args.inline else 'Encolados'} en {time.perf_counter() - t0:.2f}s")
@@ -0,0 +1,193 @@
+"""
+Índice en memoria de propiedades para el worker de recomendaciones.
+
+Cada proceso worker mantiene sus propiedades agrupadas por (comuna_key, bedrooms),
+con arrays numpy de precios (ordenados), lat y lon por grupo. Se refresca de forma
+incremental con un watermark sobre properties.timestamp, así la BD solo ve
+consultas de delta; cada cierto tiempo se hace una carga completa para recoger
+filas que llegaron con un timestamp anterior al watermark.
+
+El timestamp lo trae el mensaje MQTT (puede ser anterior al watermark), así que el delta
+no basta para garantizar que un bucket está al día: reload() relee un bucket completo
+por (comuna_key, bedrooms) y las propiedades pedidas por id, sin depender del watermark.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+PROPERTY_INDEX_REFRESH_SECONDS = float(os.getenv("PROPERTY_INDEX_REFRESH_SECONDS", "5"))
+PROPERTY_INDEX_FULL_REFRESH_SECONDS = float(os.getenv("PROPERTY_INDEX_FULL_REFRESH_SECONDS", "600"))
+
+_COLUMNS = "id, name, price, bedrooms, bathrooms, m2, url, location, timestamp, comuna_key, lat, lon"
+
+
+class _Bucket:
+    """Propiedades de un mismo (comuna_key, bedrooms); los arrays se reconstruyen solo si cambió."""
+
+    __slots__ = ("ids", "dirty", "records", "prices", "lats", "lons", "id_arr")
+
+    def __init__(self):
+        self.ids = set()
+        self.dirty = True
+        self.records = []
+        self.prices = self.lats = self.lons = self.id_arr = None
+
+    def build(self, rows_by_id):
+        recs = sorted((rows_by_id[i] for i in self.ids), key=lambda r: r["price"])
+        self.records = recs
+        self.prices = np.array([r["price"] for r in recs], dtype=float)
+        self.lats = np.array([r["lat"] if r["lat"] is not None else np.nan for r in recs], dtype=float)
+        self.lons = np.array([r["lon"] if r["lon"] is not None else np.nan for r in recs], dtype=float)
+        self.id_arr = np.array([r["id"] for r in recs], dtype=np.int64)
+        self.dirty = False
+
+
+class PropertyIndex:
+    def __init__(self, to_record, refresh_seconds=PROPERTY_INDEX_REFRESH_SECONDS,
+                 full_refresh_seconds=PROPERTY_INDEX_FULL_REFRESH_SECONDS):
+        # to_record(row) -> dict con id, price, bedrooms, comuna_key, address, lat, lon, ...
+        self._to_record = to_record
+        self._refresh_seconds = refresh_seconds
+        self._full_refresh_seconds = full_refresh_seconds
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._bucket_of = {}
+        self._buckets = {}
+        self._watermark = None
+        self._last_refresh = 0.0
+        self._last_full = 0.0
+        self.loaded = False
+
+    # ---------- Carga ----------
+    def _upsert(self, row, advance=True):
+        rec = self._to_record(row)
+        pid = rec["id"]
+        # sin precio o dormitorios nunca es candidato (price <= NULL / bedrooms = NULL en SQL)
+        key = (rec["comuna_key"], rec["bedrooms"]) if rec["price"] is not None and rec["bedrooms"] is not None else None
+        old_key = self._bucket_of.get(pid)
+        if old_key is not None:
+            old = self._buckets[old_key]
+            old.ids.discard(pid)
+            old.dirty = True
+        self._rows[pid] = rec
+        self._bucket_of[pid] = key
+        if key is not None:
+            bucket = self._buckets.setdefault(key, _Bucket())
+            bucket.ids.add(pid)
+            bucket.dirty = True
+        ts = row.get("timestamp")
+        if advance and ts is not None and (self._watermark is None or ts > self._watermark):
+            self._watermark = ts
+
+    def _remove(self, pid):
+        key = self._bucket_of.pop(pid, None)
+        if key is not None:
+            bucket = self._buckets[key]
+            bucket.ids.discard(pid)
+            bucket.dirty = True
+        self._rows.pop(pid, None)
+
+    def refresh(self, connect, force=False):
+        """
+        Carga completa o delta según los intervalos configurados. connect() es un context
+        manager que entrega una conexión (tasks.db_connection). Retorna filas leídas o None.
+        """
+        now = time.monotonic()
+        full = not self.loaded or now - self._last_full >= self._full_refresh_seconds
+        if not force and not full and now - self._last_refresh < self._refresh_seconds:
+            return None
+
+        with connect() as conn:
+            cur = conn.cursor()
+            try:
+                if full or self._watermark is None:
+                    cur.execute(f"SELECT {_COLUMNS} FROM properties")
+                else:
+                    # >= para no perder filas con el mismo timestamp; el upsert es idempotente
+                    cur.execute(f"SELECT {_COLUMNS} FROM properties WHERE timestamp >= %s", (self._watermark,))
+                rows = cur.fetchall()
+            finally:
+                cur.close()
+
+        with self._lock:
+            if full:
+                self._rows, self._bucket_of, self._buckets = {}, {}, {}
+                self._watermark = None
+            for r in rows:
+                self._upsert(r)
+            self._last_refresh = now
+            if full:
+                self._last_full = now
+                self.loaded = True
+        return len(rows)
+
+    def reload(self, connect, bucket=None, ids=()):
+        """
+        Relee de la BD las filas del bucket (comuna_key, bedrooms), las que el índice tenía en
+        él (para ubicar las que se fueron) y las de `ids`, sin usar el watermark. No lo
+        avanza: las filas de otros buckets con timestamp intermedio siguen entrando por delta.
+        """
+        wanted = set(ids)
+        rows = []
+        with connect() as conn:
+            cur = conn.cursor()
+            try:
+                if bucket is not None:
+                    comuna_key, bedrooms = bucket
+                    cur.execute(
+                        f"SELECT {_COLUMNS} FROM properties WHERE "
+                        + ("comuna_key IS NULL" if comuna_key is None else "comuna_key = %s")
+                        + " AND " + ("bedrooms IS NULL" if bedrooms is None else "bedrooms = %s"),
+                        tuple(v for v in bucket if v is not None),
+                    )
+                    rows = cur.fetchall()
+                    with self._lock:
+                        current = self._buckets.get(bucket)
+                        wanted |= set(current.ids) if current is not None else set()
+                wanted -= {r["id"] for r in rows}
+                if wanted:
+                    cur.execute(f"SELECT {_COLUMNS} FROM properties WHERE id = ANY(%s)", (list(wanted),))
+                    rows += cur.fetchall()
+            finally:
+                cur.close()
+
+        with self._lock:
+            for r in rows:
+                self._upsert(r, advance=False)
+            for pid in wanted - {r["id"] for r in rows}:
+                self._remove(pid)  # borrada de la BD
+        return len(rows)
+
+    # ---------- Consulta ----------
+    def get(self, property_id):
+        return self._rows.get(property_id)
+
+    def candidate_arrays(self, base):
+        """
+        Candidatos del mismo grupo con precio <= base e id distinto.
+        Retorna (records, lats, lons, prices) alineados.
+        """
+        empty = ([], np.empty(0), np.empty(0), np.empty(0))
+        key = self._bucket_of.get(base["id"])
+        if key is None:
+            return empty
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                return empty
+            if bucket.dirty:
+                bucket.build(self._rows)
+            hi = int(np.searchsorted(bucket.prices, base["price"], side="right"))
+            keep = np.flatnonzero(bucket.id_arr[:hi] != base["id"])
+            records = [bucket.records[i] for i in keep.tolist()]
+            return records, bucket.lats[keep], bucket.lons[keep], bucket.prices[keep]
+
+    def stats(self):
+        return {
+            "properties": len(self._rows),
+            "buckets": len(self._buckets),
+            "watermark": self._watermark.isoformat() if self._watermark is not None else None,
+        }
@@ -0,0 +1,100 @@
+"""
+Cache de resultados de recomendaciones en Redis.
+
+- recs:ver:{comuna_key}:{bedrooms}  versión del bucket; el mqtt_listener la reemplaza por
+  una nueva (después del commit) cada vez que una propiedad entra, sale o cambia en él.
+- recs:prop:{property_id}           {"comuna_key", "bedrooms", "version", "result"}
+- recs:precompute:{comuna_key}:{bedrooms}  marca de debounce: hay un precálculo del bucket
+  encolado (mqtt_listener/recs_precompute.py); la task la borra al empezar.
+
+El worker lee la versión ANTES de leer los candidatos y guarda el resultado con esa
+versión; el JobMaster solo lo usa si la versión del bucket sigue siendo la misma.
+
+Las versiones viven en el mismo Redis (allkeys-lru) y pueden desalojarse. Por eso nunca se
+derivan de un contador que reinicia en 0: cada versión es un epoch nuevo (new_version) y
+una clave que falta se vuelve a sembrar con uno. Así una entrada calculada antes del
+desalojo no vuelve a coincidir (el cache falla cerrado).
+"""
+
+import json
+import logging
+import os
+import time
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+RECS_CACHE_ENABLED = os.getenv("RECS_CACHE_ENABLED", "true").lower() == "true"
+RECS_CACHE_TTL = int(os.getenv("RECS_CACHE_TTL", "3600"))
+# Los precalculados (tasks.precompute_bucket) se recalculan al cambiar el bucket: duran más
+RECS_PRECOMPUTE_TTL = int(os.getenv("RECS_PRECOMPUTE_TTL", "86400"))
+
+_client = None
+
+
+def get_client():
+    """Cliente Redis del proceso; None si el cache está deshabilitado."""
+    global _client
+    if _client is None and RECS_CACHE_ENABLED:
+        _client = redis.from_url(REDIS_URL, socket_timeout=2)
+    return _client
+
+
+def version_key(comuna_key, bedrooms):
+    return f"recs:ver:{comuna_key or ''}:{bedrooms if bedrooms is not None else ''}"
+
+
+def precompute_key(comuna_key, bedrooms):
+    return f"recs:precompute:{comuna_key or ''}:{bedrooms if bedrooms is not None else ''}"
+
+
+def new_version():
+    """Versión nueva para un bucket: epoch en ns, distinta de cualquiera usada antes."""
+    return time.time_ns()
+
+
+def bucket_version(comuna_key, bedrooms):
+    """
+    Versión actual del bucket; None si Redis no está disponible. Si la clave no existe
+    (bucket nunca invalidado o desalojado por el LRU) se siembra con una versión nueva.
+    """
+    r = get_client()
+    if r is None:
+        return None
+    try:
+        seed = new_version()
+        # SET NX GET: retorna la versión existente, o None si quedó la sembrada
+        raw = r.set(version_key(comuna_key, bedrooms), seed, nx=True, get=True)
+        return int(raw) if raw is not None else seed
+    except Exception as e:
+        logger.warning("recs cache: no se pudo leer la versión: %s", e)
+        return None
+
+
+def store_result(property_id, comuna_key, bedrooms, version, result):
+    """Guarda el resultado asociado a la versión leída antes de calcularlo."""
+    r = get_client()
+    if r is None or version is None:
+        return
+    entry = {"comuna_key": comuna_key, "bedrooms": bedrooms, "version": version, "result": result}
+    try:
+        r.setex(f"recs:prop:{property_id}", RECS_CACHE_TTL, json.dumps(entry))
+    except Exception as e:
+        logger.warning("recs cache: no se pudo guardar el resultado: %s", e)
+
+
+def store_results(comuna_key, bedrooms, version, results):
+    """Como store_result para todo un bucket ({property_id: result}), en un solo pipeline."""
+    r = get_client()
+    if r is None or version is None or not results:
+        return
+    try:
+        pipe = r.pipeline(transaction=False)
+        for property_id, result in results.items():
+            entry = {"comuna_key": comuna_key, "bedrooms": bedrooms, "version": version, "result": result}
+            pipe.setex(f"recs:prop:{property_id}", RECS_PRECOMPUTE_TTL, json.dumps(entry))
+        pipe.execute()
+    except Exception as e:
+        logger.warning("recs cache: no se pudieron guardar los resultados del bucket: %s", e)
@@ -0,0 +1,82 @@
+"""
+Búsqueda de vecinos más cercanos en la BD para el worker de recomendaciones.
+
+- postgis: ORDER BY geog <-> punto (KNN sobre el índice GiST de migration_property_spatial.sql)
+- geohash: bloque 3x3 de celdas alrededor de la base, ampliando la celda hasta que el
+  k-ésimo vecino quede dentro del radio garantizado por el bloque.
+El modo se detecta por las columnas presentes (SPATIAL_MODE=auto) o se fuerza por env.
+"""
+
+import os
+
+from geohash import min_cell_size_m, neighbors
+
+SPATIAL_MODE = os.getenv("SPATIAL_MODE", "auto").lower()  # auto | postgis | geohash | off
+GEOHASH_PRECISIONS = (6, 5, 4, 3)
+
+CANDIDATE_COLUMNS = "id, name, price, bedrooms, bathrooms, m2, url, location, lat, lon"
+
+_detected = {}
+
+
+def detect_mode(cur, table="properties"):
+    """Retorna "postgis", "geohash" o None (sin ruta espacial)."""
+    if SPATIAL_MODE != "auto":
+        return None if SPATIAL_MODE == "off" else SPATIAL_MODE
+    if table not in _detected:
+        cur.execute("""
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_name = %s AND column_name IN ('geog', 'geohash')
+        """, (table,))
+        cols = {r["column_name"] for r in cur.fetchall()}
+        _detected[table] = "postgis" if "geog" in cols else ("geohash" if "geohash" in cols else None)
+    return _detected[table]
+
+
+def nearest_postgis(cur, base, k, table="properties"):
+    """Top-k por (distancia, precio) resuelto por la BD. Retorna [((row, None, lat, lon), dist)]."""
+    cur.execute(f"""
+        SELECT {CANDIDATE_COLUMNS},
+               ST_Distance(geog, ST_SetSRID(ST_MakePoint(%(lon)s, %(lat)s), 4326)::geography, false) AS distance_m
+        FROM {table}
+        WHERE comuna_key = %(comuna_key)s
+          AND bedrooms = %(bedrooms)s
+          AND price <= %(price)s
+          AND id <> %(id)s
+        ORDER BY geog <-> ST_SetSRID(ST_MakePoint(%(lon)s, %(lat)s), 4326)::geography, price
+        LIMIT %(k)s
+    """, {
+        "lat": base["lat"], "lon": base["lon"], "comuna_key": base["comuna_key"],
+        "bedrooms": base["bedrooms"], "price": base["price"], "id": base["id"], "k": k,
+    })
+    return [
+        ((r, None, r["lat"], r["lon"]), float(r["distance_m"]) if r["distance_m"] is not None else None)
+        for r in cur.fetchall()
+    ]
+
+
+def nearest_geohash(cur, base, k, rank, table="properties"):
+    """
+    Top-k usando prefijos de geohash. rank(lat, lon, candidates, k) ordena los candidatos.
+    Retorna None si ni la celda más gruesa garantiza el resultado (usar el bucket completo).
+    """
+    lat, lon = base["lat"], base["lon"]
+    for precision in GEOHASH_PRECISIONS:
+        cells = neighbors(lat, lon, precision)
+        like = " OR ".join(["geohash LIKE %s"] * len(cells))
+        cur.execute(f"""
+            SELECT {CANDIDATE_COLUMNS}
+            FROM {table}
+            WHERE comuna_key = %s
+              AND bedrooms = %s
+              AND price <= %s
+              AND id <> %s
+              AND ({like})
+        """, (base["comuna_key"], base["bedrooms"], base["price"], base["id"], *[c + "%" for c in cells]))
+        candidates = [(r, None, r["lat"], r["lon"]) for r in cur.fetchall()]
+        top = rank(lat, lon, candidates, k)
+        # fuera del bloque 3x3 todo está a más de un lado de celda de la base
+        if len(top) >= k and top[-1][1] is not None and top[-1][1] <= min_cell_size_m(precision, lat):
+            return top
+    return None
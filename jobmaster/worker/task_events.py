@@ -0,0 +1,116 @@
+"""
+Transiciones de estado empujadas por el worker (y liberación del single-flight y del dedup).
+
+Cada transición de una task escribe el hash task:{task_id} (status, progress, error,
+updated_at) y publica en task-events:{task_id}; el JobMaster lee el hash en
+GET /job/{id} y espera el canal en los endpoints de long-poll/SSE, sin consultar el
+result backend de Celery en cada poll. El resultado va aparte, en result:{task_id}
+(codec.py: msgpack + zstd), y se escribe antes que el estado "completed".
+"""
+
+import json
+import logging
+import os
+from datetime import datetime, timezone
+
+import redis
+from celery.signals import task_failure, task_postrun, task_prerun, task_retry, task_success
+
+import codec
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+TASK_EVENTS_TTL = 86400  # igual que los jobs del JobMaster
+
+_client = None
+
+# Borra la clave solo si sigue apuntando a esta task/job: recs:inflight:{property_id}
+# (single-flight del JobMaster) y las jobs:inflight:{user_id}:{property_id} (dedup)
+_RELEASE_INFLIGHT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end
+return 0
+"""
+
+
+def _get_client():
+    global _client
+    if _client is None:
+        _client = redis.from_url(REDIS_URL, socket_timeout=2)
+    return _client
+
+
+def push(task_id, status, result=None, **fields):
+    """Escribe la transición en task:{task_id} y la publica. Nunca interrumpe la task."""
+    if not task_id:
+        return
+    mapping = {"status": status, "updated_at": datetime.now(timezone.utc).isoformat()}
+    for k, v in fields.items():
+        if v is not None:
+            mapping[k] = v if isinstance(v, (str, int, float)) else json.dumps(v)
+    try:
+        pipe = _get_client().pipeline(transaction=False)
+        if result is not None:
+            pipe.setex(f"result:{task_id}", TASK_EVENTS_TTL, codec.encode(result))
+        pipe.hset(f"task:{task_id}", mapping=mapping)
+        pipe.expire(f"task:{task_id}", TASK_EVENTS_TTL)
+        pipe.publish(f"task-events:{task_id}", json.dumps({"status": status, "progress": fields.get("progress")}))
+        pipe.execute()
+    except Exception as e:
+        logger.warning("task_events: no se pudo publicar %s de %s: %s", status, task_id, e)
+
+
+def progress(task, value):
+    """Reemplazo de task.update_state(state="PROGRESS", ...) que no pasa por el result backend."""
+    push(task.request.id, "processing", progress=value)
+
+
+@task_prerun.connect
+def _on_prerun(task_id=None, **_):
+    push(task_id, "started", progress=0)
+
+
+@task_success.connect
+def _on_success(sender=None, result=None, **_):
+    push(sender.request.id, "completed", progress=100, result=result)
+
+
+@task_failure.connect
+def _on_failure(task_id=None, exception=None, **_):
+    push(task_id, "failed", error=str(exception))
+
+
+@task_retry.connect
+def _on_retry(request=None, reason=None, **_):
+    push(getattr(request, "id", None), "retry", error=str(reason))
+
+
+@task_postrun.connect
+def _release_inflight(task_id=None, task=None, args=None, **_):
+    if task is None or task.name != "tasks.generate_recommendations_simple" or not args or not task_id:
+        return
+    try:
+        _get_client().eval(_RELEASE_INFLIGHT, 1, f"recs:inflight:{args[0]}", task_id)
+    except Exception as e:
+        logger.warning("task_events: no se pudo liberar recs:inflight:%s: %s", args[0], e)
+    _release_dedup(task_id)
+
+
+def _release_dedup(task_id):
+    """
+    Borra las claves de dedup de los jobs que esperaban esta task (el job que la creó y los
+    adjuntos), registradas por el JobMaster en task-dedup:{task_id}. Así un job idéntico
+    enviado después de terminar crea un job nuevo en vez de recibir el anterior.
+    """
+    try:
+        client = _get_client()
+        owners = client.hgetall(f"task-dedup:{task_id}")
+        if not owners:
+            return
+        pipe = client.pipeline(transaction=False)
+        for key, job_id in owners.items():
+            pipe.eval(_RELEASE_INFLIGHT, 1, key, job_id)
+        pipe.delete(f"task-dedup:{task_id}")
+        pipe.execute()
+    except Exception as e:
+        logger.warning("task_events: no se pudo liberar el dedup de %s: %s", task_id, e)
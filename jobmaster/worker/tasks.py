@@ -1,9 +1,23 @@
 from celery import shared_task
+from celery.signals import worker_process_init, worker_process_shutdown
+from contextlib import contextmanager
 import psycopg2
-from psycopg2.extras import RealDictCursor
-import os, time, math, json
+from psycopg2.extras import Json, RealDictCursor, execute_values
+from psycopg2.pool import SimpleConnectionPool
+import os, time, math, json, logging
+from bisect import bisect_right
 from dotenv import load_dotenv
 
+import recs_cache
+import spatial
+import task_events
+
+# numpy se importa al primer uso (_load_numpy): el proceso padre, flower y los scripts
+# que solo importan tasks no pagan su carga
+np = None
+
+logger = logging.getLogger(__name__)
+
 load_dotenv()
 
 DB_NAME = os.getenv("DB_NAME")
@@ -12,9 +26,30 @@ DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_HOST = os.getenv("DB_HOST", "db")
 DB_PORT = int(os.getenv("DB_PORT", "5432"))
 
+# Motor de ranking: "numpy" (vectorizado) o "python" (puro, sin dependencias)
+RECOMMENDER_ENGINE = os.getenv("RECOMMENDER_ENGINE", "numpy").lower()
+# Índice en memoria por proceso (requiere numpy); si se desactiva, cada task consulta la BD
+PROPERTY_INDEX_ENABLED = os.getenv("PROPERTY_INDEX_ENABLED", "true").lower() == "true"
+TOP_K = 3
+EARTH_RADIUS_M = 6371000.0
+
+# Conexiones abiertas por proceso worker (el índice en memoria y las tasks son secuenciales)
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "2"))
+
+def _load_numpy():
+    """Importa numpy la primera vez; retorna el módulo o None si no está instalado."""
+    global np
+    if np is None:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:  # sin numpy se usa el ranking en Python puro
+            np = False
+    return np or None
+
 # ---------- DB ----------
-def get_connection():
-    return psycopg2.connect(
+def _connect_kwargs():
+    return dict(
         dbname=DB_NAME,
         user=DB_USER,
         password=DB_PASSWORD,
@@ -24,6 +59,40 @@ def get_connection():
         connect_timeout=10
     )
 
+def get_connection():
+    """Conexión nueva y propia (scripts/benchmarks); las tasks usan db_connection()."""
+    return psycopg2.connect(**_connect_kwargs())
+
+_db_pool = None
+
+def init_db_pool():
+    """Pool del proceso actual; se crea después del fork (worker_process_init) o al primer uso."""
+    global _db_pool
+    if _db_pool is None:
+        _db_pool = SimpleConnectionPool(1, DB_POOL_MAX, **_connect_kwargs())
+    return _db_pool
+
+def acquire_connection():
+    return init_db_pool().getconn()
+
+def release_connection(conn):
+    """Devuelve la conexión al pool cerrando la transacción de lectura; si se rompió, la descarta."""
+    broken = bool(conn.closed)
+    if not broken:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
+    init_db_pool().putconn(conn, close=broken)
+
+@contextmanager
+def db_connection():
+    conn = acquire_connection()
+    try:
+        yield conn
+    finally:
+        release_connection(conn)
+
 # ---------- Helpers de location ---------
 def _coerce_json(obj):
     """Si viene string JSON -> dict; si ya es dict, lo retorna."""
@@ -41,6 +110,9 @@ def _get_address(loc):
     """Extrae address desde location JSON."""
     loc = _coerce_json(loc)
     addr = loc.get("address")
+    # el listener guarda {"address": location}; location puede venir como dict
+    if isinstance(addr, dict):
+        addr = addr.get("address")
     if isinstance(addr, str):
         return addr.strip()
     return ""
@@ -65,6 +137,8 @@ def _get_lat_lon(loc):
     loc = _coerce_json(loc)
     lat = None
     lon = None
+    if isinstance(loc.get("address"), dict) and not any(k in loc for k in ("lat", "latitude", "coordinates")):
+        loc = loc["address"]
 
     # 1) lat/lon directos
     for k_lat, k_lon in (("lat", "lon"), ("latitude", "longitude")):
@@ -94,15 +168,227 @@ def _haversine(lat1, lon1, lat2, lon2):
     """Distancia en metros entre dos puntos (lat, lon) usando Haversine."""
     if None in (lat1, lon1, lat2, lon2):
         return None
-    R = 6371000.0
+    R = EARTH_RADIUS_M
     dphi = math.radians(lat2 - lat1)
     dlmb = math.radians(lon2 - lon1)
     a = (math.sin(dphi/2)**2 +
          math.cos(math.radians(lat1))*math.cos(math.radians(lat2))*math.sin(dlmb/2)**2)
     return 2 * R * math.asin(math.sqrt(a))
 
+def _haversine_np(lat1, lon1, lats, lons):
+    """Haversine vectorizado: distancia en metros desde (lat1, lon1) a cada punto de los arrays."""
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lats)
+    dphi = phi2 - phi1
+    dlmb = np.radians(lons - lon1)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+# ---------- Ranking de candidatos ----------
+def _prepare_candidates(rows, comuna_key):
+    """
+    Parsea location una sola vez por fila y filtra por "comuna".
+    Retorna tuplas (row, address, lat, lon).
+    """
+    out = []
+    for r in rows:
+        loc = _coerce_json(r.get("location"))
+        addr = _get_address(loc)
+        if _extract_comuna_key(addr) != comuna_key:
+            continue
+        lat, lon = _get_lat_lon(loc)
+        out.append((r, addr, lat, lon))
+    return out
+
+def _rank_python(base_lat, base_lon, candidates, k=TOP_K):
+    """Ranking original: ordena por (distancia, precio) con sorted(). Retorna [(candidato, dist)]."""
+    has_base = base_lat is not None and base_lon is not None
+    scored = []
+    for c in candidates:
+        r, _, lat, lon = c
+        dist = _haversine(base_lat, base_lon, lat, lon) if has_base else None
+        # si no hay coords, distancia = inf para que mande precio
+        d = dist if dist is not None else float("inf")
+        price_val = float(r["price"]) if r["price"] is not None else 1e18
+        scored.append((d, price_val, c, dist))
+    scored.sort(key=lambda t: (t[0], t[1]))
+    return [(c, dist) for _, _, c, dist in scored[:k]]
+
+def _rank_arrays(base_lat, base_lon, lats, lons, prices, k=TOP_K):
+    """
+    Top-k por (distancia, precio) sobre arrays numpy.
+    lats/lons usan NaN cuando no hay coordenadas; prices usa NaN si no hay precio.
+    Retorna (indices ordenados, distancias de esos indices con NaN si no aplica).
+    """
+    n = lats.shape[0]
+    if n == 0 or k <= 0:
+        return np.empty(0, dtype=np.intp), np.empty(0)
+
+    if base_lat is not None and base_lon is not None:
+        dist = _haversine_np(base_lat, base_lon, lats, lons)
+        d = np.where(np.isnan(dist), np.inf, dist)
+    else:
+        dist = np.full(n, np.nan)
+        d = np.full(n, np.inf)
+    p = np.where(np.isnan(prices), 1e18, prices)
+
+    k = min(k, n)
+    if k < n:
+        part = np.argpartition(d, k - 1)[:k]
+        kth = d[part].max()
+        if np.isinf(kth):
+            # todos los que tienen distancia + los sin coords de menor precio
+            finite = np.flatnonzero(np.isfinite(d))
+            no_coords = np.flatnonzero(~np.isfinite(d))
+            need = k - finite.size
+            if need < no_coords.size:
+                p_nc = p[no_coords]
+                kth_price = p_nc[np.argpartition(p_nc, need - 1)[:need]].max()
+                no_coords = no_coords[p_nc <= kth_price]
+            sel = np.concatenate([finite, no_coords])
+        else:
+            # incluye empates en el borde para respetar el desempate por precio
+            sel = np.flatnonzero(d <= kth)
+    else:
+        sel = np.arange(n)
+
+    order = sel[np.lexsort((p[sel], d[sel]))][:k]
+    return order, dist[order]
+
+def _rank_numpy(base_lat, base_lon, candidates, k=TOP_K):
+    """Carga coords/precios de los candidatos en arrays y aplica _rank_arrays. Retorna [(candidato, dist)]."""
+    n = len(candidates)
+    lats = np.fromiter((c[2] if c[2] is not None else np.nan for c in candidates), dtype=float, count=n)
+    lons = np.fromiter((c[3] if c[3] is not None else np.nan for c in candidates), dtype=float, count=n)
+    prices = np.fromiter(
+        (float(c[0]["price"]) if c[0]["price"] is not None else np.nan for c in candidates),
+        dtype=float, count=n,
+    )
+    order, dists = _rank_arrays(base_lat, base_lon, lats, lons, prices, k)
+    return [
+        (candidates[i], None if np.isnan(d) else float(d))
+        for i, d in zip(order.tolist(), dists.tolist())
+    ]
+
+def _rank_candidates(base_lat, base_lon, candidates, k=TOP_K):
+    """Elige el motor de ranking según RECOMMENDER_ENGINE y disponibilidad de numpy."""
+    if RECOMMENDER_ENGINE == "numpy" and _load_numpy() is not None:
+        return _rank_numpy(base_lat, base_lon, candidates, k), "numpy"
+    return _rank_python(base_lat, base_lon, candidates, k), "python"
+
+def _serialize_candidate(candidate, dist):
+    r, addr, _, _ = candidate
+    if addr is None:
+        # candidatos leídos desde columnas: el address solo se parsea para el top-k
+        addr = _get_address(r.get("location"))
+    return {
+        "property_id": str(r["id"]),
+        "name": r["name"],
+        "price": float(r["price"]) if r["price"] is not None else None,
+        "bedrooms": int(r["bedrooms"]) if r["bedrooms"] is not None else None,
+        "bathrooms": int(r["bathrooms"]) if r["bathrooms"] is not None else None,
+        "m2": float(r["m2"]) if r["m2"] is not None else None,
+        "url": r.get("url"),
+        "location_address": addr,
+        "distance_meters": round(dist, 2) if dist is not None else None
+    }
+
+def _build_result(out, property_id, t0, engine):
+    dt = time.perf_counter() - t0
+    return {
+        "recommendations": out,
+        "total_found": len(out),
+        "base_property_id": property_id,
+        "reason": "success" if out else "no_matches_found",
+        "processing_time": f"{dt:.2f}s",
+        "algorithm": "enunciado_e2_simple_filter",
+        "engine": engine
+    }
+
+# ---------- Índice en memoria ----------
+def _to_index_record(row):
+    """Fila de properties -> registro del índice (location parseado una vez al cargar)."""
+    loc = _coerce_json(row.get("location"))
+    addr = _get_address(loc)
+    if row.get("comuna_key") is not None:
+        comuna_key, lat, lon = row["comuna_key"], row.get("lat"), row.get("lon")
+    else:
+        # fila aún sin backfill (migration_property_geo.sql)
+        comuna_key = _extract_comuna_key(addr)
+        lat, lon = _get_lat_lon(loc)
+    return {
+        "id": int(row["id"]),
+        "name": row["name"],
+        "price": float(row["price"]) if row["price"] is not None else None,
+        "bedrooms": int(row["bedrooms"]) if row["bedrooms"] is not None else None,
+        "bathrooms": row["bathrooms"],
+        "m2": row["m2"],
+        "url": row.get("url"),
+        "address": addr,
+        "comuna_key": comuna_key,
+        "lat": lat,
+        "lon": lon,
+    }
+
+_property_index = None
+
+def get_property_index():
+    """Índice del proceso actual; None si está deshabilitado o no hay numpy."""
+    global _property_index
+    if _property_index is None and PROPERTY_INDEX_ENABLED and _load_numpy() is not None:
+        from property_index import PropertyIndex
+        _property_index = PropertyIndex(_to_index_record)
+    return _property_index
+
+# versión de bucket (recs_cache) ya reflejada en el índice de este proceso
+_index_versions = {}
+
+def _bucket_of(rec):
+    return (rec["comuna_key"], rec["bedrooms"]) if rec is not None else None
+
+def _recommend_from_index(index, property_id):
+    """
+    Top-k servido desde memoria. Retorna (out, base, version) o None si la base no está
+    en la BD (se usa el camino SQL). version es la del bucket en recs_cache (None = no
+    cachear).
+    """
+    index.refresh(db_connection)
+    base = index.get(property_id)
+    if base is None:
+        # propiedad recién ingresada (o con timestamp anterior al watermark): se lee por id
+        index.reload(db_connection, ids=[property_id])
+        base = index.get(property_id)
+        if base is None:
+            return None
+    bucket = _bucket_of(base)
+    version = recs_cache.bucket_version(*bucket)
+    if version is not None and _index_versions.get(bucket) != version:
+        # bucket invalidado por el listener: se relee completo DESPUÉS de leer la versión,
+        # así lo que se cachea con ella incluye al menos los cambios que la generaron
+        index.reload(db_connection, bucket=bucket, ids=[property_id])
+        base = index.get(property_id)
+        if base is None:
+            return None
+        if _bucket_of(base) != bucket:
+            version = None  # cambió de bucket entre lecturas: no se cachea este resultado
+        else:
+            _index_versions[bucket] = version
+    if base["price"] is None or base["bedrooms"] is None:
+        return [], base, version
+
+    records, lats, lons, prices = index.candidate_arrays(base)
+    order, dists = _rank_arrays(base["lat"], base["lon"], lats, lons, prices, TOP_K)
+    out = []
+    for i, d in zip(order.tolist(), dists.tolist()):
+        rec = records[i]
+        out.append(_serialize_candidate((rec, rec["address"], rec["lat"], rec["lon"]), None if np.isnan(d) else d))
+    return out, base, version
+
 # ---------- Algoritmo simple del enunciado ----------
-@shared_task(name="tasks.generate_recommendations_simple", bind=True, time_limit=60, soft_time_limit=45)
+# ignore_result: el resultado se guarda una sola vez, en result:{task_id} (task_events.py);
+# el result backend de Celery solo lo leen los jobs antiguos (_poll_backend del JobMaster)
+@shared_task(name="tasks.generate_recommendations_simple", bind=True, time_limit=60, soft_time_limit=45,
+             ignore_result=True)
 def generate_recommendations_simple(self, property_id: int):
     """
     Enunciado E2 (adaptado a tu esquema):
@@ -113,14 +399,25 @@ def generate_recommendations_simple(self, property_id: int):
     4) Retornar top 3.
     """
     t0 = time.perf_counter()
-    self.update_state(state="PROGRESS", meta={"progress": 5})
 
-    conn = get_connection()
+    index = get_property_index()
+    if index is not None:
+        hit = _recommend_from_index(index, property_id)
+        if hit is not None:
+            out, base, version = hit
+            result = _build_result(out, property_id, t0, "index")
+            recs_cache.store_result(property_id, base["comuna_key"], base["bedrooms"], version, result)
+            return result
+
+    task_events.progress(self, 5)
+
+    conn = acquire_connection()
     cur = conn.cursor()
     try:
         # Paso 1: propiedad base (usa tu esquema real)
         cur.execute("""
-            SELECT id, name, price, bedrooms, bathrooms, m2, url, location, timestamp
+            SELECT id, name, price, bedrooms, bathrooms, m2, url, location, timestamp,
+                   comuna_key, lat, lon
             FROM properties
             WHERE id = %s
             ORDER BY timestamp DESC
@@ -130,77 +427,195 @@ def generate_recommendations_simple(self, property_id: int):
         if not base:
             return {"recommendations": [], "total_found": 0, "reason": "base_property_not_found"}
 
-        base_addr = _get_address(base.get("location"))
-        base_comuna_key = _extract_comuna_key(base_addr)
-        base_lat, base_lon = _get_lat_lon(base.get("location"))
+        task_events.progress(self, 20)
 
-        self.update_state(state="PROGRESS", meta={"progress": 20})
+        if base.get("comuna_key") is not None:
+            base_comuna_key = base["comuna_key"]
+        else:
+            base_comuna_key = _extract_comuna_key(_get_address(base.get("location")))
+        # versión del bucket leída antes que los candidatos (ver recs_cache)
+        version = recs_cache.bucket_version(base_comuna_key, base["bedrooms"])
 
-        # Paso 2: candidatos (filtramos en SQL por price/bedrooms; "comuna" se filtra en Python por address)
-        # Limit para no traer TODO si la tabla es grande
-        cur.execute("""
-            SELECT id, name, price, bedrooms, bathrooms, m2, url, location, timestamp
-            FROM properties
-            WHERE bedrooms = %s
-              AND price <= %s
-              AND id <> %s
-            ORDER BY timestamp DESC
-            LIMIT 1000
-        """, (base["bedrooms"], base["price"], base["id"]))
-        rows = cur.fetchall()
-
-        # Filtrado por "comuna" aproximada
-        candidates = []
-        for r in rows:
-            addr = _get_address(r.get("location"))
-            if _extract_comuna_key(addr) == base_comuna_key:
-                candidates.append(r)
-
-        self.update_state(state="PROGRESS", meta={"progress": 60})
-
-        # Paso 3: ordenar por distancia y precio
-        def _sort_key(r):
-            lat, lon = _get_lat_lon(r.get("location"))
-            dist = _haversine(base_lat, base_lon, lat, lon) if (base_lat is not None and base_lon is not None) else None
-            # si no hay coords, distancia = inf para que mande precio
-            d = dist if dist is not None else float("inf")
-            price_val = float(r["price"]) if r["price"] is not None else 1e18
-            return (d, price_val)
-
-        top = sorted(candidates, key=_sort_key)[:3]
+        top = None
+        if base.get("comuna_key") is not None:
+            # Paso 2: candidatos filtrados en SQL por comuna/dormitorios/precio
+            # (idx_properties_comuna_bedrooms_price, migration_property_geo.sql)
+            base_lat, base_lon = base.get("lat"), base.get("lon")
+            if base_lat is not None and base_lon is not None and base["price"] is not None:
+                # Vecinos más cercanos resueltos por la BD (PostGIS KNN o geohash)
+                mode = spatial.detect_mode(cur)
+                if mode == "postgis":
+                    top, engine = spatial.nearest_postgis(cur, base, TOP_K), "postgis"
+                elif mode == "geohash":
+                    top = spatial.nearest_geohash(cur, base, TOP_K, lambda la, lo, c, k: _rank_candidates(la, lo, c, k)[0])
+                    engine = "geohash"
+            if top is None:
+                cur.execute("""
+                    SELECT id, name, price, bedrooms, bathrooms, m2, url, location, lat, lon
+                    FROM properties
+                    WHERE comuna_key = %s
+                      AND bedrooms = %s
+                      AND price <= %s
+                      AND id <> %s
+                """, (base["comuna_key"], base["bedrooms"], base["price"], base["id"]))
+                candidates = [(r, None, r["lat"], r["lon"]) for r in cur.fetchall()]
+        else:
+            # Base aún sin backfill: "comuna" derivada del address y filtrada en Python
+            base_lat, base_lon = _get_lat_lon(base.get("location"))
+            # Limit para no traer TODO si la tabla es grande
+            cur.execute("""
+                SELECT id, name, price, bedrooms, bathrooms, m2, url, location, timestamp
+                FROM properties
+                WHERE bedrooms = %s
+                  AND price <= %s
+                  AND id <> %s
+                ORDER BY timestamp DESC
+                LIMIT 1000
+            """, (base["bedrooms"], base["price"], base["id"]))
+            # location se parsea una sola vez por fila
+            candidates = _prepare_candidates(cur.fetchall(), base_comuna_key)
+
+        task_events.progress(self, 60)
+
+        # Paso 3: ordenar por distancia y precio (top-k vectorizado si hay numpy)
+        if top is None:
+            top, engine = _rank_candidates(base_lat, base_lon, candidates, TOP_K)
 
         # Paso 4: salida
-        out = []
-        for r in top:
-            lat, lon = _get_lat_lon(r.get("location"))
-            dist = _haversine(base_lat, base_lon, lat, lon) if (base_lat is not None and base_lon is not None and lat is not None and lon is not None) else None
-            out.append({
-                "property_id": str(r["id"]),
-                "name": r["name"],
-                "price": float(r["price"]) if r["price"] is not None else None,
-                "bedrooms": int(r["bedrooms"]) if r["bedrooms"] is not None else None,
-                "bathrooms": int(r["bathrooms"]) if r["bathrooms"] is not None else None,
-                "m2": float(r["m2"]) if r["m2"] is not None else None,
-                "url": r.get("url"),
-                "location_address": _get_address(r.get("location")),
-                "distance_meters": round(dist, 2) if dist is not None else None
-            })
-
-        dt = time.perf_counter() - t0
-        self.update_state(state="PROGRESS", meta={"progress": 100})
-
-        return {
-            "recommendations": out,
-            "total_found": len(out),
-            "base_property_id": property_id,
-            "reason": "success" if out else "no_matches_found",
-            "processing_time": f"{dt:.2f}s",
-            "algorithm": "enunciado_e2_simple_filter"
-        }
+        out = [_serialize_candidate(c, dist) for c, dist in top]
+
+        task_events.progress(self, 100)
+
+        result = _build_result(out, property_id, t0, engine)
+        recs_cache.store_result(property_id, base_comuna_key, base["bedrooms"], version, result)
+        return result
 
     finally:
         cur.close()
-        conn.close()
+        release_connection(conn)
+
+# ---------- Precálculo por bucket ----------
+_PRECOMPUTE_UPSERT = """
+    INSERT INTO property_recommendations (property_id, comuna_key, bedrooms, bucket_version, result, computed_at)
+    VALUES %s
+    ON CONFLICT (property_id) DO UPDATE SET
+        comuna_key = EXCLUDED.comuna_key,
+        bedrooms = EXCLUDED.bedrooms,
+        bucket_version = EXCLUDED.bucket_version,
+        result = EXCLUDED.result,
+        computed_at = EXCLUDED.computed_at
+"""
+
+def _rank_bucket(rows):
+    """
+    Top-k de cada propiedad de un bucket. rows viene ordenado por precio, así los
+    candidatos de cada base (precio <= el suyo) son un prefijo. Retorna ({id: out}, engine).
+    """
+    candidates = [(r, None, r["lat"], r["lon"]) for r in rows]
+    prices = [float(r["price"]) for r in rows]
+    out = {}
+    if RECOMMENDER_ENGINE == "numpy" and _load_numpy() is not None:
+        lats = np.array([r["lat"] if r["lat"] is not None else np.nan for r in rows], dtype=float)
+        lons = np.array([r["lon"] if r["lon"] is not None else np.nan for r in rows], dtype=float)
+        price_arr = np.array(prices, dtype=float)
+        ids = np.array([r["id"] for r in rows], dtype=np.int64)
+        for r, price in zip(rows, prices):
+            hi = bisect_right(prices, price)
+            keep = np.flatnonzero(ids[:hi] != r["id"])
+            order, dists = _rank_arrays(r["lat"], r["lon"], lats[keep], lons[keep], price_arr[keep], TOP_K)
+            out[r["id"]] = [
+                _serialize_candidate(candidates[keep[j]], None if np.isnan(d) else d)
+                for j, d in zip(order.tolist(), dists.tolist())
+            ]
+        return out, "numpy"
+    for r, price in zip(rows, prices):
+        pool = [c for c in candidates[:bisect_right(prices, price)] if c[0]["id"] != r["id"]]
+        out[r["id"]] = [_serialize_candidate(c, dist) for c, dist in _rank_python(r["lat"], r["lon"], pool, TOP_K)]
+    return out, "python"
+
+@shared_task(name="tasks.precompute_bucket", bind=True, time_limit=300, soft_time_limit=240,
+             ignore_result=True)
+def precompute_bucket(self, comuna_key: str, bedrooms: int):
+    """
+    Recalcula el top-k de todas las propiedades de (comuna_key, bedrooms) con una sola
+    consulta, lo guarda en property_recommendations y deja cada resultado en recs_cache
+    para que el JobMaster lo sirva sin encolar. La encola el mqtt_listener (cola recs.bulk)
+    tras ingresar propiedades en el bucket.
+    """
+    t0 = time.perf_counter()
+    r = recs_cache.get_client()
+    if r is not None:
+        try:
+            # desde aquí, un ingreso nuevo en el bucket vuelve a encolar el precálculo
+            r.delete(recs_cache.precompute_key(comuna_key, bedrooms))
+        except Exception as e:
+            logger.warning("precompute: no se pudo liberar el debounce de %s/%s: %s", comuna_key, bedrooms, e)
+    # versión leída antes que las propiedades, igual que en generate_recommendations_simple
+    version = recs_cache.bucket_version(comuna_key, bedrooms)
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT id, name, price, bedrooms, bathrooms, m2, url, location, lat, lon
+                FROM properties
+                WHERE comuna_key = %s
+                  AND bedrooms = %s
+                  AND price IS NOT NULL
+                ORDER BY price, id
+            """, (comuna_key, bedrooms))
+            ranked, engine = _rank_bucket(cur.fetchall())
+            results = {pid: _build_result(out, pid, t0, "precomputed") for pid, out in ranked.items()}
+            try:
+                execute_values(cur, _PRECOMPUTE_UPSERT, [
+                    (pid, comuna_key, bedrooms, version, Json(res)) for pid, res in results.items()
+                ], template="(%s, %s, %s, %s, %s, NOW())", page_size=500)
+                # propiedades que salieron del bucket (cambiaron de comuna/dormitorios o de precio a NULL)
+                cur.execute("""
+                    DELETE FROM property_recommendations
+                    WHERE comuna_key = %s AND bedrooms = %s AND NOT (property_id = ANY(%s))
+                """, (comuna_key, bedrooms, list(results)))
+                conn.commit()
+            except psycopg2.errors.UndefinedTable:
+                # sin migration_property_recommendations.sql: solo se llena el cache
+                conn.rollback()
+                logger.warning("precompute: falta la tabla property_recommendations")
+        finally:
+            cur.close()
+
+    recs_cache.store_results(comuna_key, bedrooms, version, results)
+    return {
+        "comuna_key": comuna_key,
+        "bedrooms": bedrooms,
+        "properties": len(results),
+        "engine": engine,
+        "processing_time": f"{time.perf_counter() - t0:.2f}s"
+    }
+
+# ---------- Inicialización por proceso ----------
+@worker_process_init.connect
+def _init_worker_process(**_):
+    """
+    Cada hijo del pool (prefork) abre su pool de conexiones y carga el índice en memoria
+    una vez al nacer, en vez de pagarlo en la primera task.
+    """
+    t0 = time.perf_counter()
+    try:
+        init_db_pool()
+        index = get_property_index()
+        if index is not None:
+            index.refresh(db_connection)
+        logger.info("Proceso listo en %.2fs", time.perf_counter() - t0, extra={"pid": os.getpid()})
+    except Exception as e:
+        # no impide arrancar: la primera task reintentará la carga
+        logger.warning("Warm-up del proceso falló: %s", e, extra={"pid": os.getpid()})
+
+@worker_process_shutdown.connect
+def _shutdown_worker_process(**_):
+    global _db_pool
+    if _db_pool is not None:
+        _db_pool.closeall()
+        _db_pool = None
 
 # ---------- Wrapper compatible con tu JobMaster ----------
 @shared_task(name="tasks.generate_recommendations", bind=True, time_limit=90, soft_time_limit=60)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark local de generación de boletas (boletas/segundo).
+
+- render: generate_pdf en loop con los estilos del módulo, y el mismo loop
+  reconstruyendo los estilos en cada boleta (como antes) para comparar.
+- batch (--upload): lambda_handler con un evento {"purchases": [...]} de extremo a
+  extremo, subiendo a S3 (requiere credenciales y S3_BUCKET).
+
+Uso: python bench_receipts.py [--count 200] [--batch-size 50] [--upload]
+"""
+
+import argparse
+import copy
+import json
+import time
+
+import handler
+from test_local import test_event
+
+
+def make_purchases(n):
+    purchases = []
+    for i in range(n):
+        item = copy.deepcopy({k: test_event[k] for k in ("purchase_data", "user_data", "property_data")})
+        item["purchase_data"]["request_id"] = f"bench-{i:06d}"
+        purchases.append(item)
+    return purchases
+
+
+def bench_render(purchases, rebuild_styles):
+    t = time.perf_counter()
+    for item in purchases:
+        if rebuild_styles:
+            handler.STYLES = handler._build_styles()
+        handler.generate_pdf(item["purchase_data"], item["user_data"], item["property_data"], "G6")
+    return len(purchases) / (time.perf_counter() - t)
+
+
+def bench_batch(purchases, batch_size):
+    t = time.perf_counter()
+    ok = 0
+    for i in range(0, len(purchases), batch_size):
+        res = handler.lambda_handler({"purchases": purchases[i:i + batch_size], "group_id": "G6"}, None)
+        ok += json.loads(res["body"]).get("generated", 0)
+    elapsed = time.perf_counter() - t
+    return ok / elapsed, ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Boletas por segundo")
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--upload", action="store_true", help="Incluye la subida real a S3 (modo batch)")
+    args = parser.parse_args()
+
+    purchases = make_purchases(args.count)
+    handler.print = lambda *a, **k: None  # los logs por boleta distorsionan la medición
+
+    print(f"🧪 Boletas: {args.count}")
+    print("=" * 60)
+    styles = handler.STYLES
+    print(f"   render, estilos por boleta (antes): {bench_render(purchases, True):8.1f} boletas/s")
+    handler.STYLES = styles
+    print(f"   render, estilos del módulo        : {bench_render(purchases, False):8.1f} boletas/s")
+    if args.upload:
+        rate, ok = bench_batch(purchases, args.batch_size)
+        print(f"   batch de {args.batch_size} + S3 ({ok} ok)       : {rate:8.1f} boletas/s")
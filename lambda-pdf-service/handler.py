@@ -1,20 +1,85 @@
 import json
 import os
 import boto3
+from botocore.config import Config
 import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from urllib.parse import quote
 from reportlab.lib.pagesizes import letter
 from reportlab.lib import colors
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER
 
+import receipt_keys
+
+# Subidas simultáneas a S3 en modo batch (el render es CPU y va en el hilo principal)
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', '8'))
+# Máximo de boletas por invocación batch (acotado por el timeout de la Lambda)
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', '100'))
+S3_BUCKET = os.getenv('S3_BUCKET', 'g6-arquisis-receipts-dev')
+# Directorio para usar local_s3 en vez de S3 (pruebas locales)
+S3_LOCAL_DIR = os.getenv('S3_LOCAL_DIR')
+
+
+def _build_styles():
+    """Estilos de la boleta; se construyen una vez al importar el módulo (cold start)."""
+    styles = getSampleStyleSheet()
+    return {
+        'title': ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=18,
+            spaceAfter=30,
+            alignment=TA_CENTER,
+            textColor=colors.darkblue
+        ),
+        'header': ParagraphStyle(
+            'CustomHeader',
+            parent=styles['Heading2'],
+            fontSize=14,
+            spaceAfter=12,
+            textColor=colors.darkgreen
+        ),
+        'normal': ParagraphStyle(
+            'CustomNormal',
+            parent=styles['Normal'],
+            fontSize=11,
+            spaceAfter=6
+        ),
+    }
+
+
+STYLES = _build_styles()
+
+# Cliente S3 reutilizado entre invocaciones del mismo contenedor y entre hilos de subida
+_s3_client = None
+_s3_lock = threading.Lock()
+
+
+def get_s3_client():
+    global _s3_client
+    with _s3_lock:
+        if _s3_client is None and S3_LOCAL_DIR:
+            from local_s3 import LocalS3Client
+            _s3_client = LocalS3Client(S3_LOCAL_DIR)
+        elif _s3_client is None:
+            _s3_client = boto3.client(
+                's3', region_name='us-east-1',
+                config=Config(max_pool_connections=max(UPLOAD_WORKERS, 10))
+            )
+        return _s3_client
+
 
 def lambda_handler(event, context):
     """
-    Función Lambda para generar boletas PDF y subirlas a S3
+    Función Lambda para generar boletas PDF y subirlas a S3.
+    Acepta una compra ({purchase_data, user_data, property_data, group_id}) o un lote
+    ({"purchases": [...], "group_id": ...}); ver batch_handler.
     """
+    if isinstance(event.get('purchases'), list):
+        return batch_handler(event, context)
     try:
         # Extraer datos del evento
         purchase_data = event.get('purchase_data', {})
@@ -29,25 +94,32 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'request_id es requerido'})
             }
 
-        # Generar PDF
-        pdf_buffer = generate_pdf(purchase_data, user_data, property_data, group_id)
-
-        # Verificar que el buffer tenga contenido
-        pdf_buffer.seek(0)
-        pdf_size = len(pdf_buffer.read())
-        pdf_buffer.seek(0)
-        print(f"PDF generado: {pdf_size} bytes")
+        # Key direccionada por contenido: si la boleta ya existe no se vuelve a generar
+        key = receipt_keys.receipt_key(event)
+        cached = _head(get_s3_client(), key)
+        if isinstance(cached, Exception):
+            # HEAD rechazado (403, 503 SlowDown...): reintentable, no es un error del render
+            return {
+                'statusCode': 503,
+                'body': json.dumps({'error': f'head: {cached}'})
+            }
+        if cached:
+            s3_url = receipt_keys.public_url(S3_BUCKET, key)
+        else:
+            # Generar PDF
+            pdf_buffer = generate_pdf(purchase_data, user_data, property_data, group_id)
 
-        # Subir a S3
-        s3_url = upload_to_s3(pdf_buffer, purchase_data['request_id'])
-        print(f"PDF subido a S3: {s3_url}")
+            # Subir a S3
+            s3_url = upload_to_s3(pdf_buffer, key)
+            print(f"PDF subido a S3: {s3_url}")
 
         return {
             'statusCode': 200,
             'body': json.dumps({
                 'success': True,
                 'pdf_url': s3_url,
-                'request_id': purchase_data['request_id']
+                'request_id': purchase_data['request_id'],
+                'cached': cached
             })
         }
 
@@ -59,6 +131,83 @@ def lambda_handler(event, context):
         }
 
 
+def _head(s3_client, key):
+    """True/False si la boleta existe en S3, o la excepción si el HEAD falló (no 404)."""
+    try:
+        return receipt_keys.exists(s3_client, S3_BUCKET, key)
+    except Exception as e:
+        return e
+
+
+def batch_handler(event, context):
+    """
+    Modo batch: {"purchases": [{purchase_data, user_data, property_data}, ...], "group_id"}.
+    Primero consulta (HEAD, en paralelo) cuáles ya existen en S3; el resto lo renderiza una
+    tras otra y sube cada una en un pool de hilos apenas está lista (la subida de una se
+    solapa con el render de la siguiente). Un ítem que falla no interrumpe el resto;
+    retorna un resultado por ítem en el mismo orden.
+    """
+    purchases = event['purchases']
+    if len(purchases) > MAX_BATCH_SIZE:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': f'máximo {MAX_BATCH_SIZE} boletas por invocación'})
+        }
+    default_group = event.get('group_id', 'G6')
+
+    results = [None] * len(purchases)
+    uploads = {}
+    s3_client = get_s3_client()
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool:
+        keys = {}
+        for i, item in enumerate(purchases):
+            if (item.get('purchase_data') or {}).get('request_id'):
+                keys[i] = receipt_keys.receipt_key({'group_id': default_group, **item})
+        existing = dict(zip(keys, pool.map(lambda k: _head(s3_client, k), keys.values())))
+
+        for i, item in enumerate(purchases):
+            purchase_data = item.get('purchase_data') or {}
+            request_id = purchase_data.get('request_id')
+            if not request_id:
+                results[i] = {'request_id': None, 'success': False, 'error': 'request_id es requerido'}
+                continue
+            if isinstance(existing[i], Exception):
+                results[i] = {'request_id': request_id, 'success': False, 'error': f'head: {existing[i]}'}
+                continue
+            if existing[i]:
+                results[i] = {'request_id': request_id, 'success': True, 'cached': True,
+                              'pdf_url': receipt_keys.public_url(S3_BUCKET, keys[i])}
+                continue
+            try:
+                pdf_buffer = generate_pdf(
+                    purchase_data, item.get('user_data') or {}, item.get('property_data') or {},
+                    item.get('group_id', default_group)
+                )
+            except Exception as e:
+                results[i] = {'request_id': request_id, 'success': False, 'error': f'render: {e}'}
+                continue
+            uploads[i] = (request_id, pool.submit(upload_to_s3, pdf_buffer, keys[i]))
+
+        for i, (request_id, future) in uploads.items():
+            try:
+                results[i] = {'request_id': request_id, 'success': True, 'cached': False,
+                              'pdf_url': future.result()}
+            except Exception as e:
+                results[i] = {'request_id': request_id, 'success': False, 'error': f'upload: {e}'}
+
+    ok = sum(1 for r in results if r['success'])
+    print(f"📦 Batch: {ok}/{len(results)} boletas generadas")
+    return {
+        'statusCode': 200 if ok == len(results) else 207,
+        'body': json.dumps({
+            'success': ok == len(results),
+            'generated': ok,
+            'failed': len(results) - ok,
+            'results': results
+        })
+    }
+
+
 def generate_pdf(purchase_data, user_data, property_data, group_id):
     """
     Genera el PDF de la boleta usando reportlab
@@ -67,32 +216,11 @@ def generate_pdf(purchase_data, user_data, property_data, group_id):
 
     # Crear documento PDF
     doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
 
-    # Estilos personalizados
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        textColor=colors.darkblue
-    )
-
-    header_style = ParagraphStyle(
-        'CustomHeader',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceAfter=12,
-        textColor=colors.darkgreen
-    )
-
-    normal_style = ParagraphStyle(
-        'CustomNormal',
-        parent=styles['Normal'],
-        fontSize=11,
-        spaceAfter=6
-    )
+    # Estilos personalizados (módulo)
+    title_style = STYLES['title']
+    header_style = STYLES['header']
+    normal_style = STYLES['normal']
 
     # Contenido del PDF
     story = []
@@ -165,29 +293,25 @@ def generate_pdf(purchase_data, user_data, property_data, group_id):
     # Resetear posición del buffer al inicio para leer el contenido
     buffer.seek(0)
 
-    # Verificar que el PDF sea válido
-    pdf_data = buffer.getvalue()
-    if len(pdf_data) == 0:
+    # Verificar que el PDF sea válido (sin copiar el contenido)
+    pdf_size = buffer.getbuffer().nbytes
+    if pdf_size == 0:
         raise ValueError("PDF generado está vacío")
 
-    if not pdf_data.startswith(b'%PDF'):
-        raise ValueError(f"PDF generado no es válido. Primeros bytes: {pdf_data[:20]}")
+    if bytes(buffer.getbuffer()[:4]) != b'%PDF':
+        raise ValueError(f"PDF generado no es válido. Primeros bytes: {bytes(buffer.getbuffer()[:20])}")
 
-    print(f"✅ PDF generado exitosamente. Tamaño: {len(pdf_data)} bytes")
+    print(f"✅ PDF generado exitosamente. Tamaño: {pdf_size} bytes")
 
     return buffer
 
 
-def upload_to_s3(pdf_buffer, request_id):
+def upload_to_s3(pdf_buffer, filename):
     """
-    Sube el PDF a S3 y retorna la URL pública
+    Sube el PDF a S3 en la key dada (receipt_keys.receipt_key) y retorna la URL pública
     """
-    s3_client = boto3.client('s3', region_name='us-east-1')
-    bucket_name = os.getenv('S3_BUCKET', 'g6-arquisis-receipts-dev')
-
-    # Nombre del archivo
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"receipts/boleta_{request_id}_{timestamp}.pdf"
+    s3_client = get_s3_client()
+    bucket_name = S3_BUCKET
 
     # Leer el contenido del buffer
     pdf_buffer.seek(0)
@@ -223,8 +347,7 @@ def upload_to_s3(pdf_buffer, request_id):
         raise
 
     # Generar URL pública
-    encoded_key = quote(filename, safe='/')
-    s3_url = f"https://{bucket_name}.s3.amazonaws.com/{encoded_key}"
+    s3_url = receipt_keys.public_url(bucket_name, filename)
 
     print(f"🔗 URL pública: {s3_url}")
 
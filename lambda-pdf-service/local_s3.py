@@ -0,0 +1,108 @@
+"""
+Reemplazo local de S3 sobre el sistema de archivos, para pruebas sin AWS.
+
+Implementa el subconjunto del cliente de boto3 que usan las boletas (put_object,
+head_object, get_object, copy_object, delete_object, list_objects_v2) con los mismos
+nombres de parámetros y la misma forma de respuesta; los objetos quedan en
+{root}/{bucket}/{key} y la metadata (ContentType, etc.) en un .meta.json al lado.
+Un objeto inexistente lanza ClientError con código 404 / NoSuchKey, como S3.
+
+get_s3_client() lo usa cuando S3_LOCAL_DIR está definido:
+    S3_LOCAL_DIR=/tmp/s3 python test_local.py
+"""
+
+import hashlib
+import io
+import json
+import os
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+
+_META_SUFFIX = ".meta.json"
+_META_FIELDS = ("ContentType", "ContentDisposition", "CacheControl", "Metadata")
+
+
+class LocalS3Client:
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, bucket, key):
+        path = os.path.normpath(os.path.join(self.root, bucket, key))
+        if not path.startswith(os.path.normpath(os.path.join(self.root, bucket)) + os.sep):
+            raise ValueError(f"key inválida: {key}")
+        return path
+
+    @staticmethod
+    def _not_found(operation, key):
+        code = "404" if operation == "HeadObject" else "NoSuchKey"
+        return ClientError({"Error": {"Code": code, "Message": f"Not Found: {key}"}}, operation)
+
+    def _stat(self, bucket, key, operation):
+        path = self._path(bucket, key)
+        if not os.path.isfile(path):
+            raise self._not_found(operation, key)
+        meta = {}
+        if os.path.exists(path + _META_SUFFIX):
+            with open(path + _META_SUFFIX) as f:
+                meta = json.load(f)
+        st = os.stat(path)
+        return path, {
+            "ContentLength": st.st_size,
+            "LastModified": datetime.fromtimestamp(st.st_mtime, tz=timezone.utc),
+            "ETag": meta.get("ETag", ""),
+            **{k: meta[k] for k in _META_FIELDS if k in meta},
+        }
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        data = Body if isinstance(Body, (bytes, bytearray)) else Body.read()
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with open(path + _META_SUFFIX, "w") as f:
+            json.dump({"ETag": etag, **{k: kwargs[k] for k in _META_FIELDS if k in kwargs}}, f)
+        return {"ETag": etag}
+
+    def head_object(self, Bucket, Key):
+        return self._stat(Bucket, Key, "HeadObject")[1]
+
+    def get_object(self, Bucket, Key):
+        path, info = self._stat(Bucket, Key, "GetObject")
+        with open(path, "rb") as f:
+            return {**info, "Body": io.BytesIO(f.read())}
+
+    def copy_object(self, Bucket, Key, CopySource, **kwargs):
+        src = self.get_object(CopySource["Bucket"], CopySource["Key"])
+        if kwargs.get("MetadataDirective") != "REPLACE":
+            kwargs = {k: src[k] for k in _META_FIELDS if k in src}
+        return {"CopyObjectResult": self.put_object(Bucket, Key, src["Body"], **kwargs)}
+
+    def delete_object(self, Bucket, Key):
+        path = self._path(Bucket, Key)
+        for p in (path, path + _META_SUFFIX):
+            if os.path.exists(p):
+                os.remove(p)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix="", ContinuationToken=None, MaxKeys=1000, **kwargs):
+        base = os.path.join(self.root, Bucket)
+        keys = []
+        for dirpath, _, files in os.walk(base):
+            for name in files:
+                if name.endswith(_META_SUFFIX) or name.endswith(".tmp"):
+                    continue
+                key = os.path.relpath(os.path.join(dirpath, name), base).replace(os.sep, "/")
+                if key.startswith(Prefix) and (ContinuationToken is None or key > ContinuationToken):
+                    keys.append(key)
+        keys.sort()
+        page = keys[:MaxKeys]
+        response = {"KeyCount": len(page), "IsTruncated": len(keys) > MaxKeys}
+        if page:
+            response["Contents"] = [{"Key": k, **self._stat(Bucket, k, "ListObjectsV2")[1]} for k in page]
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = page[-1]
+        return response
@@ -0,0 +1,116 @@
+"""
+Keys de las boletas en S3, direccionadas por contenido.
+
+La key es el sha256 del evento de la Lambda (purchase_data, user_data, property_data,
+group_id) serializado de forma canónica: la misma compra con los mismos datos siempre
+cae en el mismo objeto, así que basta un HEAD para saber si ya existe (antes se listaba
+el prefijo receipts/boleta_{request_id}_ y se elegía el último por LastModified) y una
+boleta idéntica nunca se vuelve a generar. Si cambia cualquier dato de la boleta cambia
+la key y se genera una nueva.
+
+KEY_VERSION se incrementa cuando cambia el diseño del PDF, para no reutilizar boletas
+renderizadas con la plantilla anterior.
+
+build_event / event_payload arman el evento desde la fila de la compra. Todos los que
+invocan la Lambda (API, mqtt_listener, migrate_receipt_keys.py) lo arman aquí: si cada uno
+normalizara los NULL a su manera, la misma compra caería en keys distintas y se volvería a
+renderizar.
+Debe ser idéntico en lambda-pdf-service/, api/ y mqtt_listener/ (cada servicio se despliega
+por separado): quien invoca la Lambda calcula la misma key para consultar o guardar la boleta.
+scripts/check_shared_modules.py lo verifica en CI.
+"""
+
+import hashlib
+import json
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from urllib.parse import quote
+
+KEY_VERSION = "v1"
+KEY_PREFIX = "receipts/"
+_EVENT_FIELDS = ("purchase_data", "user_data", "property_data", "group_id")
+
+
+def _or(value, default):
+    return default if value is None else value
+
+
+def build_event(row, group_id):
+    """
+    Fila de la compra (purchase_requests + properties + users, con user_name, user_email y
+    user_phone) -> evento de la Lambda. Los NULL toman el mismo valor por defecto siempre.
+    """
+    return {
+        "purchase_data": {
+            "request_id": str(row["request_id"]),
+            "amount": _or(row.get("amount"), 0.0),
+            "status": _or(row.get("status"), ""),
+            "created_at": _or(row.get("created_at"), ""),
+            "authorization_code": row.get("authorization_code")
+        },
+        "user_data": {
+            "name": _or(row.get("user_name"), ""),
+            "email": _or(row.get("user_email"), ""),
+            "phone": _or(row.get("user_phone"), "")
+        },
+        "property_data": {
+            "name": _or(row.get("name"), ""),
+            "price": _or(row.get("price"), 0.0),
+            "currency": _or(row.get("currency"), "CLP"),
+            "url": row["url"],
+            "location": row.get("location"),
+            "bedrooms": row.get("bedrooms"),
+            "bathrooms": row.get("bathrooms"),
+            "m2": row.get("m2")
+        },
+        "group_id": group_id
+    }
+
+
+def json_default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat() + "Z"
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
+
+
+def event_payload(row, group_id):
+    """JSON del evento tal como se envía a la Lambda; su key es receipt_key(json.loads(...))."""
+    return json.dumps(build_event(row, group_id), default=json_default)
+
+
+def canonical(event):
+    """Bytes que identifican la boleta: solo los campos que se dibujan, claves ordenadas."""
+    data = {field: event.get(field) for field in _EVENT_FIELDS}
+    return json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str).encode()
+
+
+def receipt_key(event):
+    """
+    receipts/v1/{sha256}.pdf. event debe ser el evento tal como lo recibe la Lambda
+    (después de json.loads); quien invoca calcula la key sobre json.loads(payload).
+    """
+    digest = hashlib.sha256(KEY_VERSION.encode() + b"\0" + canonical(event)).hexdigest()
+    return f"{KEY_PREFIX}{KEY_VERSION}/{digest}.pdf"
+
+
+def public_url(bucket, key):
+    return f"https://{bucket}.s3.amazonaws.com/{quote(key, safe='/')}"
+
+
+def exists(s3_client, bucket, key):
+    """HEAD del objeto. False solo si S3 responde que no existe; otros errores se propagan."""
+    try:
+        s3_client.head_object(Bucket=bucket, Key=key)
+        return True
+    except Exception as e:
+        code = str(getattr(e, "response", {}).get("Error", {}).get("Code", ""))
+        if code in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
@@ -0,0 +1,221 @@
+"""
+Pruebas de las keys direccionadas por contenido y del cache de boletas en S3, usando
+local_s3 en vez de S3 (no necesitan AWS).
+Uso: pytest lambda-pdf-service/test_receipts_s3.py
+"""
+
+import copy
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+import handler
+import receipt_keys
+from local_s3 import LocalS3Client
+
+BUCKET = "receipts-test"
+
+EVENT = {
+    "purchase_data": {
+        "request_id": "req-1",
+        "amount": 150000,
+        "status": "ACCEPTED",
+        "created_at": "2024-11-03T10:30:00Z",
+        "authorization_code": "ABC123",
+    },
+    "user_data": {"name": "Juan Pérez", "email": "juan@example.com", "phone": "+56912345678"},
+    "property_data": {
+        "name": "Casa en Las Condes",
+        "price": 1500000,
+        "currency": "CLP",
+        "url": "https://example.com/property/1",
+        "location": {"address": "Av. Apoquindo 1234, Las Condes"},
+        "bedrooms": 3,
+        "bathrooms": 2,
+        "m2": 120,
+    },
+    "group_id": "G6",
+}
+
+
+def _event(request_id="req-1", **purchase):
+    event = copy.deepcopy(EVENT)
+    event["purchase_data"].update(request_id=request_id, **purchase)
+    return event
+
+
+@pytest.fixture
+def s3(tmp_path, monkeypatch):
+    client = LocalS3Client(str(tmp_path))
+    monkeypatch.setattr(handler, "_s3_client", client)
+    monkeypatch.setattr(handler, "S3_BUCKET", BUCKET)
+    return client
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """Cuenta los render por request_id (sin cambiar el PDF generado)."""
+    calls = []
+    original = handler.generate_pdf
+
+    def counting(purchase_data, *args):
+        calls.append(purchase_data["request_id"])
+        return original(purchase_data, *args)
+
+    monkeypatch.setattr(handler, "generate_pdf", counting)
+    return calls
+
+
+# ---------- Key ----------
+def test_receipt_key_is_stable_and_content_addressed():
+    key = receipt_keys.receipt_key(EVENT)
+    assert key == receipt_keys.receipt_key(copy.deepcopy(EVENT))
+    assert key.startswith(f"{receipt_keys.KEY_PREFIX}{receipt_keys.KEY_VERSION}/") and key.endswith(".pdf")
+    # solo cuentan los campos que se dibujan
+    assert receipt_keys.receipt_key({**EVENT, "purchases_hint": 1}) == key
+    assert receipt_keys.receipt_key(_event(amount=150001)) != key
+
+
+def test_receipt_key_survives_the_json_round_trip():
+    # quien invoca la Lambda calcula la key sobre json.loads(payload)
+    assert receipt_keys.receipt_key(json.loads(json.dumps(EVENT))) == receipt_keys.receipt_key(EVENT)
+
+
+def test_build_event_normalises_nulls_like_defaults():
+    row = {"request_id": "req-1", "url": "https://example.com/property/1", "status": "ACCEPTED"}
+    nulls = {**row, "amount": None, "user_name": None, "user_phone": None, "name": None, "price": None,
+             "currency": None}
+    defaults = {**row, "amount": 0.0, "user_name": "", "user_phone": "", "name": "", "price": 0.0,
+                "currency": "CLP"}
+    key = lambda r: receipt_keys.receipt_key(json.loads(receipt_keys.event_payload(r, "G6")))  # noqa: E731
+    assert key(nulls) == key(defaults) == key(row)
+
+
+# ---------- HEAD ----------
+def test_exists_head_miss_then_hit(s3):
+    key = receipt_keys.receipt_key(EVENT)
+    assert receipt_keys.exists(s3, BUCKET, key) is False
+    s3.put_object(Bucket=BUCKET, Key=key, Body=b"%PDF-1.4")
+    assert receipt_keys.exists(s3, BUCKET, key) is True
+
+
+def test_exists_propagates_errors_other_than_not_found():
+    class Forbidden:
+        def head_object(self, Bucket, Key):
+            raise ClientError({"Error": {"Code": "403", "Message": "Forbidden"}}, "HeadObject")
+
+    with pytest.raises(ClientError):
+        receipt_keys.exists(Forbidden(), BUCKET, "receipts/v1/x.pdf")
+
+
+# ---------- handler ----------
+def test_handler_renders_once_then_serves_from_cache(s3, renders):
+    first = handler.lambda_handler(copy.deepcopy(EVENT), None)
+    body = json.loads(first["body"])
+    key = receipt_keys.receipt_key(EVENT)
+    assert first["statusCode"] == 200 and body["cached"] is False
+    assert body["pdf_url"] == receipt_keys.public_url(BUCKET, key)
+    stored = s3.get_object(Bucket=BUCKET, Key=key)
+    assert stored["Body"].read().startswith(b"%PDF") and stored["ContentType"] == "application/pdf"
+
+    second = handler.lambda_handler(copy.deepcopy(EVENT), None)
+    assert json.loads(second["body"])["cached"] is True
+    assert json.loads(second["body"])["pdf_url"] == body["pdf_url"]
+    assert renders == ["req-1"]
+
+
+def test_handler_requires_request_id(s3, renders):
+    response = handler.lambda_handler(_event(request_id=None), None)
+    assert response["statusCode"] == 400
+    assert renders == []
+
+
+# ---------- batch_handler ----------
+def _batch(*events):
+    return {"purchases": [{k: v for k, v in e.items() if k != "group_id"} for e in events], "group_id": "G6"}
+
+
+def test_batch_renders_missing_and_reuses_existing(s3, renders):
+    handler.lambda_handler(_event("req-1"), None)
+    renders.clear()
+
+    response = handler.lambda_handler(_batch(_event("req-1"), _event("req-2")), None)
+    body = json.loads(response["body"])
+    assert response["statusCode"] == 200 and body["generated"] == 2 and body["failed"] == 0
+    assert [r["cached"] for r in body["results"]] == [True, False]
+    assert renders == ["req-2"]
+    assert receipt_keys.exists(s3, BUCKET, receipt_keys.receipt_key(_event("req-2")))
+
+    again = json.loads(handler.lambda_handler(_batch(_event("req-1"), _event("req-2")), None)["body"])
+    assert [r["cached"] for r in again["results"]] == [True, True]
+    assert renders == ["req-2"]
+
+
+def test_batch_partial_failure_returns_207(s3, renders, monkeypatch):
+    original = handler.generate_pdf
+
+    def failing(purchase_data, *args):
+        if purchase_data["request_id"] == "req-bad":
+            raise ValueError("plantilla rota")
+        return original(purchase_data, *args)
+
+    monkeypatch.setattr(handler, "generate_pdf", failing)
+    response = handler.lambda_handler(_batch(_event("req-ok"), _event("req-bad"), _event(request_id=None)), None)
+    body = json.loads(response["body"])
+
+    assert response["statusCode"] == 207
+    assert body["success"] is False and body["generated"] == 1 and body["failed"] == 2
+    ok, bad, missing = body["results"]
+    assert ok["success"] is True and ok["request_id"] == "req-ok"
+    assert bad["success"] is False and bad["error"].startswith("render:")
+    assert missing == {"request_id": None, "success": False, "error": "request_id es requerido"}
+    # lo que falló no quedó en S3: un reintento lo vuelve a renderizar
+    assert not receipt_keys.exists(s3, BUCKET, receipt_keys.receipt_key(_event("req-bad")))
+    assert receipt_keys.exists(s3, BUCKET, receipt_keys.receipt_key(_event("req-ok")))
+
+
+def test_batch_upload_failure_is_reported_per_item(s3, monkeypatch):
+    original = s3.put_object
+
+    def put_object(Bucket, Key, Body, **kwargs):
+        if Key == receipt_keys.receipt_key(_event("req-2")):
+            raise ClientError({"Error": {"Code": "500", "Message": "boom"}}, "PutObject")
+        return original(Bucket, Key, Body, **kwargs)
+
+    monkeypatch.setattr(s3, "put_object", put_object)
+    response = handler.lambda_handler(_batch(_event("req-1"), _event("req-2")), None)
+    body = json.loads(response["body"])
+    assert response["statusCode"] == 207
+    assert body["results"][0]["success"] is True
+    assert body["results"][1]["success"] is False and body["results"][1]["error"].startswith("upload:")
+
+
+def test_batch_head_failure_is_reported_per_item(s3, renders, monkeypatch):
+    original = s3.head_object
+    throttled = receipt_keys.receipt_key(_event("req-2"))
+
+    def head_object(Bucket, Key):
+        if Key == throttled:
+            raise ClientError({"Error": {"Code": "503", "Message": "SlowDown"}}, "HeadObject")
+        return original(Bucket=Bucket, Key=Key)
+
+    monkeypatch.setattr(s3, "head_object", head_object)
+    response = handler.lambda_handler(_batch(_event("req-1"), _event("req-2"), _event("req-3")), None)
+    body = json.loads(response["body"])
+    assert response["statusCode"] == 207 and body["generated"] == 2 and body["failed"] == 1
+    assert body["results"][1]["success"] is False and body["results"][1]["error"].startswith("head:")
+    # el resto del lote se renderizó y subió igual
+    assert renders == ["req-1", "req-3"]
+    assert receipt_keys.exists(s3, BUCKET, receipt_keys.receipt_key(_event("req-3")))
+
+
+def test_handler_head_failure_is_retryable(s3, renders, monkeypatch):
+    def head_object(Bucket, Key):
+        raise ClientError({"Error": {"Code": "503", "Message": "SlowDown"}}, "HeadObject")
+
+    monkeypatch.setattr(s3, "head_object", head_object)
+    response = handler.lambda_handler(copy.deepcopy(EVENT), None)
+    assert response["statusCode"] == 503
+    assert json.loads(response["body"])["error"].startswith("head:")
+    assert renders == []
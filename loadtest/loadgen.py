@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Generador de carga de la API contra docker-compose.loadtest.yml.
+
+Preparación: pide tokens a los stand-ins (POST /token), crea los usuarios (GET /me) con
+saldo (POST /wallet/deposit), marca uno como administrador y publica --properties
+propiedades en properties/info (las ingiere el mqtt_listener, con muchos cupos para que
+la prueba no se quede sin visitas).
+
+Carga: --users hilos, cada uno con su token, eligen una acción según --mix hasta cumplir
+--duration segundos:
+  browse   GET /properties (página al azar) + GET /properties/{id}
+  visit    POST /visits/request (el validador de los stand-ins responde por MQTT)
+  webpay   POST /webpay/create + POST /webpay/commit (stub de WebPay)
+  history  GET /my-properties + GET /wallet
+  admin    GET /admin/auctions/offers + /admin/auctions/proposals + /admin/selections
+Además --ws clientes quedan suscritos a /ws/purchases contando los eventos recibidos.
+
+Reporte: por endpoint (ruta con parámetros colapsados) cantidad, errores, req/s y
+p50/p95/p99; conexiones a la BD por application_name muestreadas de pg_stat_activity
+cada segundo (máximo y promedio). Con --json se guarda el reporte para comparar corridas.
+
+Uso: python loadgen.py --users 50 --duration 120 --mix browse=60,visit=10,webpay=10,history=15,admin=5
+"""
+
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import paho.mqtt.client as mqtt
+import psycopg2
+import requests
+import websocket
+
+COMUNAS = ["Providencia", "Las Condes", "Ñuñoa", "Santiago", "Vitacura", "La Reina", "Macul"]
+DEFAULT_MIX = "browse=60,visit=10,webpay=10,history=15,admin=5"
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint, status, ms):
+        with self.lock:
+            self.latencies[endpoint].append(ms)
+            self.statuses[endpoint][status] += 1
+            if status >= 400 or status == 0:
+                self.errors[endpoint] += 1
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+class Client:
+    """Sesión HTTP de un usuario; cada request queda registrado bajo su endpoint."""
+
+    def __init__(self, base_url, token, stats):
+        self.base_url = base_url
+        self.stats = stats
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def call(self, method, endpoint, path=None, **kwargs):
+        t = time.perf_counter()
+        try:
+            r = self.session.request(method, self.base_url + (path or endpoint), timeout=30, **kwargs)
+            status = r.status_code
+        except requests.RequestException:
+            r, status = None, 0
+        self.stats.record(f"{method} {endpoint}", status, (time.perf_counter() - t) * 1000)
+        return r
+
+
+# ---------- Preparación ----------
+def get_token(standins_url, sub):
+    r = requests.post(f"{standins_url}/token", json={
+        "sub": sub, "email": f"{sub.split('|')[1]}@loadtest.local", "name": sub,
+    }, timeout=10)
+    r.raise_for_status()
+    return r.json()["access_token"]
+
+
+def setup_user(base_url, token, deposit):
+    s = requests.Session()
+    s.headers["Authorization"] = f"Bearer {token}"
+    s.get(f"{base_url}/me", timeout=30).raise_for_status()
+    if deposit:
+        s.post(f"{base_url}/wallet/deposit", json={"amount": deposit}, timeout=30).raise_for_status()
+
+
+def seed_properties(args, db, run_id):
+    """Publica las propiedades en properties/info y espera a que el listener las guarde."""
+    urls = [f"https://loadtest.local/{run_id}/propiedad/{i}" for i in range(args.properties)]
+    client = mqtt.Client(client_id=f"loadgen-{run_id}")
+    client.connect(args.broker, args.mqtt_port, 60)
+    client.loop_start()
+    for i, url in enumerate(urls):
+        client.publish(args.info_topic, json.dumps({
+            "url": url,
+            "name": f"Departamento {i} en {COMUNAS[i % len(COMUNAS)]}",
+            "price": random.randrange(2000, 30000) * 10,
+            "currency": "UF" if i % 5 == 0 else "CLP",
+            "bedrooms": f"{1 + i % 4} dormitorios",
+            "bathrooms": f"{1 + i % 3} baños",
+            "m2": f"{40 + i % 120} m²",
+            "location": f"Calle {i}, {COMUNAS[i % len(COMUNAS)]}",
+            "img": f"https://loadtest.local/img/{i}.jpg",
+            "is_project": False,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "visit_slots": 1_000_000,
+        }), qos=1).wait_for_publish()
+    client.loop_stop()
+    client.disconnect()
+
+    cur = db.cursor()
+    deadline = time.time() + 60
+    while True:
+        cur.execute("SELECT id, url, price FROM properties WHERE url LIKE %s",
+                    (f"https://loadtest.local/{run_id}/%",))
+        rows = cur.fetchall()
+        if len(rows) >= len(urls) or time.time() > deadline:
+            break
+        time.sleep(1)
+    cur.close()
+    if not rows:
+        raise SystemExit("❌ El mqtt_listener no guardó ninguna propiedad (¿está corriendo?)")
+    return [{"id": r[0], "url": r[1], "price": float(r[2])} for r in rows]
+
+
+# ---------- Acciones ----------
+def browse(c, props, rng):
+    c.call("GET", "/properties", params={"page": rng.randint(1, 10), "limit": 25})
+    c.call("GET", "/properties/{id}", f"/properties/{rng.choice(props)['id']}")
+
+
+def visit(c, props, rng):
+    c.call("POST", "/visits/request", json={"url": rng.choice(props)["url"]})
+
+
+def webpay(c, props, rng):
+    prop = rng.choice(props)
+    r = c.call("POST", "/webpay/create", json={"amount": round(prop["price"] * 0.10, 2), "url": prop["url"]})
+    if r is not None and r.ok and r.json().get("token"):
+        c.call("POST", "/webpay/commit", json={"token": r.json()["token"], "url": prop["url"]})
+
+
+def history(c, props, rng):
+    c.call("GET", "/my-properties", params={"limit": 50})
+    c.call("GET", "/wallet")
+
+
+def admin(c, props, rng):
+    c.call("GET", "/admin/auctions/offers")
+    c.call("GET", "/admin/auctions/proposals")
+    c.call("GET", "/admin/selections")
+
+
+ACTIONS = {"browse": browse, "visit": visit, "webpay": webpay, "history": history, "admin": admin}
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ACTIONS:
+            raise SystemExit(f"❌ Acción desconocida en --mix: {name} (válidas: {', '.join(ACTIONS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def run_user(c, admin_client, props, mix, deadline, seed):
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    while time.time() < deadline:
+        action = rng.choices(names, weights)[0]
+        ACTIONS[action](admin_client if action == "admin" else c, props, rng)
+
+
+# ---------- WebSocket y BD ----------
+def ws_subscriber(ws_url, deadline, counts, lock):
+    try:
+        ws = websocket.create_connection(ws_url, timeout=10)
+    except Exception:
+        with lock:
+            counts["connect_errors"] += 1
+        return
+    ws.settimeout(1)
+    try:
+        while time.time() < deadline:
+            try:
+                event = json.loads(ws.recv()).get("event", "?")
+            except websocket.WebSocketTimeoutException:
+                continue
+            except Exception:
+                with lock:
+                    counts["disconnects"] += 1
+                return
+            with lock:
+                counts[event] += 1
+    finally:
+        ws.close()
+
+
+def sample_connections(dsn, stop, samples):
+    conn = psycopg2.connect(dsn, application_name="loadgen")
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        while not stop.wait(1):
+            cur.execute("""
+                SELECT COALESCE(NULLIF(application_name, ''), '(sin nombre)'), state, COUNT(*)
+                FROM pg_stat_activity
+                WHERE datname = current_database() AND pid <> pg_backend_pid()
+                GROUP BY 1, 2
+            """)
+            samples.append(cur.fetchall())
+    finally:
+        cur.close()
+        conn.close()
+
+
+def summarize_connections(samples):
+    apps = {app for sample in samples for app, _, _ in sample}
+    per_app = defaultdict(list)
+    totals, active = [], []
+    for sample in samples:
+        by_app = defaultdict(int)
+        for app, state, n in sample:
+            by_app[app] += n
+        for app in apps:
+            per_app[app].append(by_app.get(app, 0))
+        totals.append(sum(by_app.values()))
+        active.append(sum(n for _, state, n in sample if state == "active"))
+    return {
+        "total": {"max": max(totals, default=0), "avg": round(statistics.mean(totals), 1) if totals else 0},
+        "active": {"max": max(active, default=0), "avg": round(statistics.mean(active), 1) if active else 0},
+        "by_application": {app: {"max": max(v), "avg": round(statistics.mean(v), 1)}
+                           for app, v in sorted(per_app.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga mixta contra la API (docker-compose.loadtest.yml)")
+    parser.add_argument("--api", default="http://localhost:8000")
+    parser.add_argument("--standins", default="http://localhost:8080")
+    parser.add_argument("--broker", default="localhost")
+    parser.add_argument("--mqtt-port", type=int, default=1883)
+    parser.add_argument("--info-topic", default="properties/info")
+    parser.add_argument("--db", default="host=localhost port=55432 dbname=loadtest user=loadtest password=loadtest",
+                        help="DSN de PostgreSQL (admin, propiedades sembradas y pg_stat_activity)")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=int, default=60, help="Segundos de carga")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Pesos por acción: browse=60,visit=10,...")
+    parser.add_argument("--ws", type=int, default=10, help="Clientes suscritos a /ws/purchases")
+    parser.add_argument("--properties", type=int, default=200, help="Propiedades a sembrar")
+    parser.add_argument("--deposit", type=float, default=1e9, help="Saldo inicial de cada usuario")
+    parser.add_argument("--json", help="Guarda el reporte en este archivo")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    run_id = uuid.uuid4().hex[:8]
+    db = psycopg2.connect(args.db, application_name="loadgen")
+    db.autocommit = True
+    stats = Stats()
+
+    print(f"🧪 Preparando corrida {run_id}: {args.users} usuarios, {args.properties} propiedades")
+    subs = [f"loadtest|{run_id}-u{i}" for i in range(args.users)]
+    admin_sub = f"loadtest|{run_id}-admin"
+    with ThreadPoolExecutor(max_workers=min(32, args.users + 1)) as pool:
+        tokens = list(pool.map(lambda s: get_token(args.standins, s), subs + [admin_sub]))
+        list(pool.map(lambda t: setup_user(args.api, t, args.deposit), tokens))
+    cur = db.cursor()
+    cur.execute("UPDATE users SET is_admin = TRUE WHERE user_id = %s", (admin_sub,))
+    cur.close()
+    props = seed_properties(args, db, run_id)
+    print(f"   {len(props)} propiedades listas")
+
+    clients = [Client(args.api, t, stats) for t in tokens[:-1]]
+    admin_client = Client(args.api, tokens[-1], stats)
+
+    stop = threading.Event()
+    samples = []
+    sampler = threading.Thread(target=sample_connections, args=(args.db, stop, samples), daemon=True)
+    sampler.start()
+
+    ws_url = args.api.replace("http", "ws", 1) + "/ws/purchases"
+    ws_counts, ws_lock = defaultdict(int), threading.Lock()
+
+    print(f"🚀 Carga por {args.duration}s · mix {args.mix} · {args.ws} WS")
+    start = time.time()
+    deadline = start + args.duration
+    with ThreadPoolExecutor(max_workers=args.users + args.ws) as pool:
+        futures = [pool.submit(ws_subscriber, ws_url, deadline, ws_counts, ws_lock) for _ in range(args.ws)]
+        futures += [pool.submit(run_user, c, admin_client, props, mix, deadline, i)
+                    for i, c in enumerate(clients)]
+        for f in futures:
+            f.result()
+    elapsed = time.time() - start
+    stop.set()
+    sampler.join()
+    db.close()
+
+    report = {"run_id": run_id, "users": args.users, "duration_s": round(elapsed, 1), "mix": mix,
+              "endpoints": {}, "db_connections": summarize_connections(samples),
+              "ws_events": dict(ws_counts)}
+    print("\n" + "=" * 96)
+    print(f"{'endpoint':36s} {'n':>7s} {'err':>5s} {'req/s':>8s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s}")
+    print("-" * 96)
+    total = 0
+    for endpoint in sorted(stats.latencies):
+        values = sorted(stats.latencies[endpoint])
+        total += len(values)
+        row = {
+            "count": len(values), "errors": stats.errors[endpoint],
+            "rps": round(len(values) / elapsed, 2),
+            "p50_ms": round(percentile(values, 50), 2),
+            "p95_ms": round(percentile(values, 95), 2),
+            "p99_ms": round(percentile(values, 99), 2),
+            "status": dict(stats.statuses[endpoint]),
+        }
+        report["endpoints"][endpoint] = row
+        print(f"{endpoint:36s} {row['count']:7d} {row['errors']:5d} {row['rps']:8.1f} "
+              f"{row['p50_ms']:9.1f} {row['p95_ms']:9.1f} {row['p99_ms']:9.1f}")
+    print("-" * 96)
+    print(f"{'total':36s} {total:7d} {sum(stats.errors.values()):5d} {total / elapsed:8.1f}")
+
+    conns = report["db_connections"]
+    print(f"\n🗄️  Conexiones a la BD: máx {conns['total']['max']} (prom {conns['total']['avg']}), "
+          f"activas máx {conns['active']['max']} (prom {conns['active']['avg']})")
+    for app, v in conns["by_application"].items():
+        print(f"   {app:28s} máx {v['max']:4d}  prom {v['avg']:6.1f}")
+    print(f"\n📡 Eventos WS: {dict(ws_counts) or 'ninguno'}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Reporte en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Reemplazos locales de los servicios externos para las pruebas de carga
+(docker-compose.loadtest.yml). Un solo proceso, HTTP en STANDINS_PORT:
+
+- Emisor de JWT en lugar de Auth0: GET /.well-known/jwks.json con la llave pública RSA
+  generada al arrancar, y POST /token {"sub", "email", "name"} que firma un access token
+  RS256 con el audience e issuer que espera api/auth.py (AUTH0_JWKS_URL / AUTH0_ISSUER).
+- Stub de WebPay Plus (la API REST que usa el SDK, WEBPAY_API_URL en la API):
+  POST .../transactions, PUT .../transactions/{token} (commit), GET .../transactions/{token}.
+  WEBPAY_REJECT_RATE de los commits se rechazan (response_code -1).
+- Stub del JobMaster (WORKER_SERVICE_URL en la API): POST /job y POST /jobs/batch responden
+  un job_id sin encolar nada; las recomendaciones se miden con jobmaster/worker/loadgen.py.
+- Validador MQTT (el "otro lado" del broker del curso): escucha properties/requests y, para
+  las solicitudes de GROUP_ID, publica properties/validation ACCEPTED (o REJECTED con
+  VALIDATION_REJECT_RATE) después de VALIDATION_DELAY_SECONDS.
+
+El SMTP lo reemplaza Mailpit y el broker Mosquitto (ver docker-compose.loadtest.yml).
+"""
+
+import base64
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import paho.mqtt.client as mqtt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwt
+
+PORT = int(os.getenv("STANDINS_PORT", "8080"))
+PUBLIC_URL = os.getenv("STANDINS_PUBLIC_URL", f"http://localhost:{PORT}")
+AUDIENCE = os.getenv("AUTH0_AUDIENCE", "https://api.g6-arquisis.com")
+ISSUER = os.getenv("AUTH0_ISSUER", f"{PUBLIC_URL}/")
+TOKEN_TTL = int(os.getenv("TOKEN_TTL_SECONDS", "86400"))
+NAMESPACE = "https://api.g6.tech/claims"
+
+WEBPAY_PATH = "/rswebpaytransaction/api/webpay/v1.2/transactions"
+WEBPAY_REJECT_RATE = float(os.getenv("WEBPAY_REJECT_RATE", "0"))
+
+BROKER = os.getenv("BROKER", "mosquitto")
+MQTT_PORT = int(os.getenv("MQTT_PORT", "1883"))
+REQUESTS_TOPIC = os.getenv("REQUESTS_TOPIC", "properties/requests")
+VALIDATION_TOPIC = os.getenv("VALIDATION_TOPIC", "properties/validation")
+GROUP_ID = os.getenv("GROUP_ID", "gX")
+# Grupos cuyas solicitudes se validan: el nuestro y el de las reservas del admin (api/main.py)
+VALIDATE_GROUPS = {GROUP_ID, *os.getenv("VALIDATE_EXTRA_GROUPS", "6").split(",")}
+VALIDATION_DELAY = float(os.getenv("VALIDATION_DELAY_SECONDS", "0.5"))
+VALIDATION_REJECT_RATE = float(os.getenv("VALIDATION_REJECT_RATE", "0.1"))
+
+KID = "loadtest"
+_private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+PRIVATE_PEM = _private_key.private_bytes(
+    serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+).decode()
+
+
+def _b64uint(value):
+    raw = value.to_bytes((value.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+_numbers = _private_key.public_key().public_numbers()
+JWKS = {"keys": [{
+    "kty": "RSA", "kid": KID, "use": "sig", "alg": "RS256",
+    "n": _b64uint(_numbers.n), "e": _b64uint(_numbers.e),
+}]}
+
+
+def issue_token(sub, email="", name=""):
+    now = int(time.time())
+    claims = {
+        "sub": sub, "aud": AUDIENCE, "iss": ISSUER, "iat": now, "exp": now + TOKEN_TTL,
+        "name": name or sub, "email": email, f"{NAMESPACE}/email": email,
+    }
+    return jwt.encode(claims, PRIVATE_PEM, algorithm="RS256", headers={"kid": KID})
+
+
+# ---------- WebPay ----------
+_transactions = {}
+_tx_lock = threading.Lock()
+
+
+def webpay_create(body):
+    token = uuid.uuid4().hex
+    with _tx_lock:
+        _transactions[token] = {**body, "status": "INITIALIZED"}
+    return {"token": token, "url": f"{PUBLIC_URL}/webpay/pay"}
+
+
+def _webpay_view(token, tx):
+    approved = tx["status"] == "AUTHORIZED"
+    now = datetime.now(timezone.utc)
+    return {
+        "vci": "TSY" if approved else "TSN",
+        "amount": tx["amount"],
+        "status": tx["status"],
+        "buy_order": tx["buy_order"],
+        "session_id": tx["session_id"],
+        "card_detail": {"card_number": "6623"},
+        "accounting_date": now.strftime("%m%d"),
+        "transaction_date": now.isoformat(),
+        "authorization_code": f"{random.randrange(10 ** 6):06d}" if approved else "000000",
+        "payment_type_code": "VN",
+        "response_code": 0 if approved else -1,
+        "installments_number": 0,
+    }
+
+
+def webpay_commit(token):
+    with _tx_lock:
+        tx = _transactions.get(token)
+        if tx is None:
+            return None
+        if tx["status"] == "INITIALIZED":
+            tx["status"] = "FAILED" if random.random() < WEBPAY_REJECT_RATE else "AUTHORIZED"
+        return _webpay_view(token, tx)
+
+
+def webpay_status(token):
+    with _tx_lock:
+        tx = _transactions.get(token)
+        return _webpay_view(token, tx) if tx else None
+
+
+# ---------- HTTP ----------
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass  # una línea por request distorsiona la prueba
+
+    def _json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path == "/.well-known/jwks.json":
+            return self._json(200, JWKS)
+        if self.path == "/health":
+            return self._json(200, {"ok": True, "transactions": len(_transactions)})
+        if self.path.startswith(WEBPAY_PATH + "/"):
+            view = webpay_status(self.path.rsplit("/", 1)[1])
+            return self._json(200, view) if view else self._json(404, {"error_message": "token not found"})
+        self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path == "/token":
+            body = self._body()
+            if not body.get("sub"):
+                return self._json(400, {"error": "sub es requerido"})
+            token = issue_token(body["sub"], body.get("email", ""), body.get("name", ""))
+            return self._json(200, {"access_token": token, "token_type": "Bearer", "expires_in": TOKEN_TTL})
+        if self.path == WEBPAY_PATH:
+            return self._json(200, webpay_create(self._body()))
+        if self.path == "/job":
+            self._body()
+            return self._json(200, {"job_id": uuid.uuid4().hex, "status": "queued"})
+        if self.path == "/jobs/batch":
+            jobs = self._body().get("jobs", [])
+            return self._json(200, {"job_ids": [uuid.uuid4().hex for _ in jobs]})
+        self._json(404, {"error": "not found"})
+
+    def do_PUT(self):
+        if self.path.startswith(WEBPAY_PATH + "/"):
+            self._body()
+            view = webpay_commit(self.path.rsplit("/", 1)[1])
+            return self._json(200, view) if view else self._json(404, {"error_message": "token not found"})
+        self._json(404, {"error": "not found"})
+
+
+# ---------- Validador MQTT ----------
+def start_validator():
+    client = mqtt.Client(client_id=f"standins-validator-{uuid.uuid4().hex[:6]}")
+    stats = {"received": 0, "validated": 0}
+
+    def validate(request_id):
+        status = "REJECTED" if random.random() < VALIDATION_REJECT_RATE else "ACCEPTED"
+        client.publish(VALIDATION_TOPIC, json.dumps({
+            "request_id": request_id,
+            "group_id": GROUP_ID,
+            "status": status,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "reason": "" if status == "ACCEPTED" else "loadtest",
+        }), qos=1)
+        stats["validated"] += 1
+
+    def on_connect(c, userdata, flags, rc):
+        print(f"🔌 Validador conectado a {BROKER}:{MQTT_PORT} (rc={rc})")
+        c.subscribe(REQUESTS_TOPIC, qos=1)
+
+    def on_message(c, userdata, msg):
+        try:
+            data = json.loads(msg.payload)
+        except ValueError:
+            return
+        stats["received"] += 1
+        if str(data.get("group_id")) in VALIDATE_GROUPS and data.get("request_id"):
+            threading.Timer(VALIDATION_DELAY, validate, args=(data["request_id"],)).start()
+
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect_async(BROKER, MQTT_PORT, keepalive=60)
+    client.loop_start()
+    return stats
+
+
+if __name__ == "__main__":
+    validator_stats = start_validator()
+    server = ThreadingHTTPServer(("0.0.0.0", PORT), Handler)
+    print(f"🧪 Stand-ins en :{PORT} (JWKS, /token, WebPay, JobMaster) · issuer={ISSUER} · audience={AUDIENCE}")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        while True:
+            time.sleep(30)
+            print(f"📊 transacciones WebPay={len(_transactions)} solicitudes MQTT={validator_stats['received']} "
+                  f"validadas={validator_stats['validated']}")
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,63 @@
+-- Migración: índices compuestos / parciales según la forma real de las consultas
+-- Descripción: init.sql y migration_admin_features.sql solo tienen índices de una columna
+-- (idx_pr_url, idx_pr_status, idx_pr_admin_reservation, ...), pero las consultas
+-- frecuentes filtran por combinaciones. Cada índice indica la consulta que cubre.
+-- Verificación: python scripts/check_query_plans.py (falla si alguna consulta frecuente
+-- vuelve a un Seq Scan). En una BD con tráfico se puede crear cada índice con
+-- CREATE INDEX CONCURRENTLY (fuera de una transacción) para no bloquear escrituras.
+
+-- Cupos disponibles en GET /properties y GET /properties/{id}:
+--   WHERE url = p.url AND status = 'ACCEPTED' AND (group_id IS NULL OR group_id <> $1)
+-- Parcial por status y con group_id en el índice: el COUNT se resuelve con un index-only scan.
+CREATE INDEX IF NOT EXISTS idx_pr_accepted_url_group
+    ON purchase_requests(url, group_id)
+    WHERE status = 'ACCEPTED';
+
+-- Reservas del admin aún disponibles (cupos, is_special_selection, compra de reserva):
+--   WHERE url = $1 AND is_admin_reservation AND status = 'ACCEPTED'
+--     AND purchased_by_user_id IS NULL [AND user_id = $2] ORDER BY created_at
+CREATE INDEX IF NOT EXISTS idx_pr_admin_available_url
+    ON purchase_requests(url, created_at)
+    WHERE is_admin_reservation = TRUE AND status = 'ACCEPTED' AND purchased_by_user_id IS NULL;
+
+-- Selecciones del admin (GET /admin/selections):
+--   WHERE user_id = $1 AND is_admin_reservation = TRUE ORDER BY created_at DESC
+CREATE INDEX IF NOT EXISTS idx_pr_admin_user_created
+    ON purchase_requests(user_id, created_at DESC)
+    WHERE is_admin_reservation = TRUE;
+
+-- Ofertas y propuestas activas (GET /admin/auctions/offers, /admin/auctions/proposals):
+--   WHERE operation = $1 AND status = 'active' AND origin_group_id ... ORDER BY created_at DESC
+-- origin_group_id va en INCLUDE para filtrar sin visitar la tabla.
+CREATE INDEX IF NOT EXISTS idx_auctions_op_status_created
+    ON auctions(operation, status, created_at DESC)
+    INCLUDE (origin_group_id);
+
+-- Nuestras ofertas (subconsulta de /admin/auctions/proposals):
+--   WHERE origin_group_id = $1 AND operation = 'offer'
+CREATE INDEX IF NOT EXISTS idx_auctions_origin_op
+    ON auctions(origin_group_id, operation)
+    INCLUDE (auction_id);
+
+-- Aceptar / rechazar propuestas: WHERE proposal_id = $1 [AND origin_group_id ...]
+CREATE INDEX IF NOT EXISTS idx_auctions_proposal
+    ON auctions(proposal_id);
+
+-- GET /wallet/transactions: WHERE user_id = $1 ORDER BY created_at DESC
+CREATE INDEX IF NOT EXISTS idx_transactions_user_created
+    ON transactions(user_id, created_at DESC);
+
+-- Listado de propiedades: ORDER BY timestamp DESC LIMIT n OFFSET m
+CREATE INDEX IF NOT EXISTS idx_properties_timestamp
+    ON properties(timestamp DESC);
+
+-- Índices que quedan cubiertos por el prefijo de uno compuesto (o que el planner no usa:
+-- un booleano casi siempre FALSE) y solo encarecen las escrituras
+DROP INDEX IF EXISTS idx_transactions_user_id;      -- idx_transactions_user_created
+DROP INDEX IF EXISTS idx_pr_user;                   -- idx_pr_user_created (migration_my_properties_index.sql)
+DROP INDEX IF EXISTS idx_pr_admin_reservation;      -- índices parciales de arriba
+
+ANALYZE purchase_requests;
+ANALYZE auctions;
+ANALYZE transactions;
+ANALYZE properties;
@@ -0,0 +1,11 @@
+-- Migración: índice para el historial del usuario (/my-properties)
+-- Descripción: /my-properties pagina por cursor con
+--   WHERE user_id = $1 AND (created_at, request_id) < ($2, $3)
+--   ORDER BY created_at DESC, request_id DESC LIMIT n
+-- Con este índice cada página es un recorrido del índice desde el cursor, sin ordenar
+-- todas las solicitudes del usuario. idx_pr_user queda cubierto por el prefijo user_id.
+
+CREATE INDEX IF NOT EXISTS idx_pr_user_created
+    ON purchase_requests(user_id, created_at DESC, request_id DESC);
+
+COMMENT ON INDEX idx_pr_user_created IS 'Paginación por cursor de /my-properties';
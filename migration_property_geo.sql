@@ -0,0 +1,17 @@
+-- Migración: columnas precalculadas de ubicación para recomendaciones
+-- Descripción: comuna_key, lat y lon se calculan al ingresar la propiedad (mqtt_listener)
+-- para que el worker filtre por comuna en SQL en vez de parsear location en Python.
+-- Las filas existentes se completan con: python mqtt_listener/backfill_property_geo.py
+
+ALTER TABLE properties
+ADD COLUMN IF NOT EXISTS comuna_key TEXT,
+ADD COLUMN IF NOT EXISTS lat DOUBLE PRECISION,
+ADD COLUMN IF NOT EXISTS lon DOUBLE PRECISION;
+
+-- Índice para la consulta de candidatos: misma comuna, mismos dormitorios, precio <= base
+CREATE INDEX IF NOT EXISTS idx_properties_comuna_bedrooms_price
+    ON properties(comuna_key, bedrooms, price);
+
+COMMENT ON COLUMN properties.comuna_key IS 'Último segmento del address en minúsculas (heurística de comuna)';
+COMMENT ON COLUMN properties.lat IS 'Latitud extraída de location al ingresar';
+COMMENT ON COLUMN properties.lon IS 'Longitud extraída de location al ingresar';
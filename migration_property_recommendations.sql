@@ -0,0 +1,20 @@
+-- Migración: recomendaciones precalculadas por propiedad
+-- Descripción: el worker (tasks.precompute_bucket) recalcula en lote el top-3 de cada
+-- propiedad de un bucket (comuna_key, bedrooms) cuando el mqtt_listener ingresa o
+-- actualiza propiedades en él; la API las sirve con una búsqueda por clave primaria.
+-- Carga inicial: python jobmaster/worker/precompute_all.py
+
+CREATE TABLE IF NOT EXISTS property_recommendations (
+    property_id INTEGER PRIMARY KEY REFERENCES properties(id) ON DELETE CASCADE,
+    comuna_key TEXT NOT NULL,
+    bedrooms INT NOT NULL,
+    bucket_version BIGINT,                 -- recs:ver:{comuna_key}:{bedrooms} leída antes de calcular
+    result JSONB NOT NULL,                 -- mismo formato que el resultado de generate_recommendations_simple
+    computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Limpieza de las propiedades que salieron del bucket al recalcularlo
+CREATE INDEX IF NOT EXISTS idx_property_recommendations_bucket
+    ON property_recommendations(comuna_key, bedrooms);
+
+COMMENT ON TABLE property_recommendations IS 'Top-3 precalculado por propiedad (tasks.precompute_bucket)';
@@ -0,0 +1,36 @@
+-- Migración: índice espacial para recomendaciones ordenadas por distancia
+-- Requiere migration_property_geo.sql (columnas comuna_key, lat, lon).
+-- Si PostGIS está disponible se agrega geog (geography) con índice GiST para KNN (<->);
+-- si no, el worker usa el prefijo de geohash (siempre se crea).
+-- Las filas existentes se completan con: python mqtt_listener/backfill_property_geo.py --all
+
+ALTER TABLE properties ADD COLUMN IF NOT EXISTS geohash TEXT;
+
+-- text_pattern_ops permite usar el índice con geohash LIKE 'prefijo%'
+CREATE INDEX IF NOT EXISTS idx_properties_comuna_bedrooms_geohash
+    ON properties(comuna_key, bedrooms, geohash text_pattern_ops);
+
+COMMENT ON COLUMN properties.geohash IS 'Geohash (precisión 9) de lat/lon, calculado al ingresar';
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'postgis') THEN
+        CREATE EXTENSION IF NOT EXISTS postgis;
+        -- btree_gist permite (comuna_key, bedrooms) como prefijo de igualdad en el índice KNN
+        CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+        EXECUTE $sql$
+            ALTER TABLE properties ADD COLUMN IF NOT EXISTS geog geography(Point, 4326)
+                GENERATED ALWAYS AS (
+                    CASE WHEN lat IS NOT NULL AND lon IS NOT NULL
+                         THEN ST_SetSRID(ST_MakePoint(lon, lat), 4326)::geography
+                    END
+                ) STORED
+        $sql$;
+        EXECUTE 'CREATE INDEX IF NOT EXISTS idx_properties_knn_geog
+                     ON properties USING GIST (comuna_key, bedrooms, geog)';
+    ELSE
+        RAISE NOTICE 'PostGIS no disponible: el worker usará el fallback por geohash';
+    END IF;
+END
+$$;
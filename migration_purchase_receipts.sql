@@ -0,0 +1,27 @@
+-- Migración: boleta PDF guardada en purchase_requests
+-- Descripción: el mqtt_listener genera la boleta (Lambda + S3) apenas la compra queda
+-- ACCEPTED y guarda aquí su URL y key; GET /purchases/{id}/receipt solo lee la fila en vez
+-- de listar S3 e invocar la Lambda en cada solicitud.
+-- Compras ya aceptadas: python mqtt_listener/backfill_receipts.py
+-- receipt_status (PENDING | READY | FAILED) permite responder 202 mientras la Lambda
+-- corre en modo asíncrono y que el cliente consulte GET /purchases/{id}/receipt/status.
+-- receipt_key es receipts/v1/{sha256 de los datos de la boleta} (receipt_keys.py) y se guarda
+-- al encolar la Lambda. Boletas con el formato antiguo: python mqtt_listener/migrate_receipt_keys.py
+
+ALTER TABLE purchase_requests
+ADD COLUMN IF NOT EXISTS receipt_url TEXT,
+ADD COLUMN IF NOT EXISTS receipt_key TEXT,
+ADD COLUMN IF NOT EXISTS receipt_generated_at TIMESTAMP,
+ADD COLUMN IF NOT EXISTS receipt_status TEXT,
+ADD COLUMN IF NOT EXISTS receipt_requested_at TIMESTAMP;
+
+-- Pendientes de boleta para el backfill (se vacía a medida que se generan)
+CREATE INDEX IF NOT EXISTS idx_pr_receipt_pending
+    ON purchase_requests(created_at)
+    WHERE status = 'ACCEPTED' AND receipt_url IS NULL AND user_id IS NOT NULL;
+
+COMMENT ON COLUMN purchase_requests.receipt_url IS 'URL pública de la boleta PDF en S3';
+COMMENT ON COLUMN purchase_requests.receipt_key IS 'Key del objeto de la boleta en S3 (direccionada por contenido, se guarda al encolar la Lambda)';
+COMMENT ON COLUMN purchase_requests.receipt_generated_at IS 'Momento en que se generó la boleta';
+COMMENT ON COLUMN purchase_requests.receipt_status IS 'PENDING | READY | FAILED (NULL = nunca solicitada)';
+COMMENT ON COLUMN purchase_requests.receipt_requested_at IS 'Inicio de la generación en curso (PENDING)';
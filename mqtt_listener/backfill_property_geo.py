@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Backfill de comuna_key, lat, lon y geohash para propiedades existentes
+(ver migration_property_geo.sql y migration_property_spatial.sql).
+Uso: python backfill_property_geo.py [--batch-size 1000] [--all]
+
+Por defecto solo procesa filas con comuna_key NULL; --all recalcula todas.
+"""
+
+import argparse
+import os
+
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+from dotenv import load_dotenv
+
+from geo import derive_geo
+
+load_dotenv()
+
+DB_NAME = os.getenv("DB_NAME")
+DB_USER = os.getenv("DB_USER")
+DB_PASSWORD = os.getenv("DB_PASSWORD")
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = int(os.getenv("DB_PORT", "5432"))
+
+
+def backfill(batch_size: int, recompute_all: bool):
+    conn = psycopg2.connect(
+        dbname=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        host=DB_HOST,
+        port=DB_PORT,
+        cursor_factory=RealDictCursor
+    )
+    cur = conn.cursor()
+    last_id = 0
+    total = 0
+    try:
+        while True:
+            # Paginación por id (keyset) para no cargar toda la tabla
+            cur.execute(f"""
+                SELECT id, location
+                FROM properties
+                WHERE id > %s {'' if recompute_all else 'AND comuna_key IS NULL'}
+                ORDER BY id
+                LIMIT %s
+            """, (last_id, batch_size))
+            rows = cur.fetchall()
+            if not rows:
+                break
+
+            values = [(r["id"], *derive_geo(r["location"])) for r in rows]
+            execute_values(cur, """
+                UPDATE properties AS p
+                   SET comuna_key = v.comuna_key, lat = v.lat, lon = v.lon, geohash = v.geohash
+                  FROM (VALUES %s) AS v (id, comuna_key, lat, lon, geohash)
+                 WHERE p.id = v.id
+            """, values, template="(%s, %s, %s::double precision, %s::double precision, %s)")
+            conn.commit()
+
+            last_id = rows[-1]["id"]
+            total += len(rows)
+            print(f"✅ {total} propiedades actualizadas (último id={last_id})")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+    print(f"🏁 Backfill terminado: {total} propiedades")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill de comuna_key/lat/lon/geohash en properties")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--all", action="store_true", help="Recalcular todas las filas")
+    args = parser.parse_args()
+    backfill(args.batch_size, args.all)
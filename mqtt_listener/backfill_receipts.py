@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Backfill de boletas PDF para compras ACCEPTED sin receipt_url
+(ver migration_purchase_receipts.sql y receipts.py).
+Uso: python backfill_receipts.py [--batch-size 200] [--workers 8] [--limit N] [--dry-run]
+
+Recorre las compras pendientes por created_at (keyset) y genera cada boleta en un pool
+de hilos con la misma función que usa el listener; es reanudable porque solo toma
+filas que aún no tienen boleta.
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import receipts
+
+
+def pending_batches(batch_size, limit):
+    pool = receipts._get_db_pool()
+    conn = pool.getconn()
+    cur = conn.cursor()
+    last = None
+    seen = 0
+    try:
+        while limit is None or seen < limit:
+            size = batch_size if limit is None else min(batch_size, limit - seen)
+            cur.execute(f"""
+                SELECT request_id, created_at
+                FROM purchase_requests
+                WHERE status = 'ACCEPTED' AND receipt_url IS NULL AND user_id IS NOT NULL
+                  {'' if last is None else 'AND (created_at, request_id) > (%s, %s)'}
+                ORDER BY created_at, request_id
+                LIMIT %s
+            """, (*(last or ()), size))
+            rows = cur.fetchall()
+            conn.rollback()
+            if not rows:
+                break
+            last = (rows[-1]["created_at"], rows[-1]["request_id"])
+            seen += len(rows)
+            yield [str(r["request_id"]) for r in rows]
+    finally:
+        cur.close()
+        pool.putconn(conn)
+
+
+def _generate(request_id):
+    try:
+        return receipts.generate(request_id) is not None
+    except Exception as e:
+        print(f"⚠️ {request_id}: {e}")
+        return False
+
+
+def backfill(batch_size, workers, limit, dry_run):
+    if not dry_run and receipts.boto3 is None:
+        raise SystemExit("❌ boto3 no está instalado")
+    t0 = time.perf_counter()
+    done = failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for ids in pending_batches(batch_size, limit):
+            if dry_run:
+                done += len(ids)
+                continue
+            for ok in pool.map(_generate, ids):
+                if ok:
+                    done += 1
+                else:
+                    failed += 1
+            print(f"✅ {done} boletas generadas, {failed} fallidas ({time.perf_counter() - t0:.1f}s)")
+    verb = "pendientes" if dry_run else "generadas"
+    print(f"🏁 Backfill terminado: {done} boletas {verb}, {failed} fallidas en {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera las boletas PDF faltantes de compras aceptadas")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=8, help="Invocaciones simultáneas a la Lambda")
+    parser.add_argument("--limit", type=int, help="Máximo de compras a procesar")
+    parser.add_argument("--dry-run", action="store_true", help="Solo cuenta las compras pendientes")
+    args = parser.parse_args()
+    # el pool de conexiones de receipts debe alcanzar para los hilos + el cursor del recorrido
+    receipts.RECEIPTS_WORKERS = args.workers + 1
+    backfill(args.batch_size, args.workers, args.limit, args.dry_run)
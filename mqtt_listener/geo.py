@@ -0,0 +1,105 @@
+"""
+Helpers para derivar comuna_key, lat y lon desde el location de una propiedad.
+Misma heurística que usa el worker de recomendaciones (jobmaster/worker/tasks.py).
+"""
+
+import json
+
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9
+
+
+def coerce_location(loc):
+    """Si viene string JSON -> dict; si ya es dict, lo retorna."""
+    if isinstance(loc, dict):
+        return loc
+    if loc is None:
+        return {}
+    try:
+        parsed = json.loads(loc)
+        return parsed if isinstance(parsed, dict) else {}
+    except Exception:
+        return {}
+
+
+def location_address(loc):
+    """Address desde location; acepta {'address': str} o {'address': {'address': str, ...}}."""
+    loc = coerce_location(loc)
+    addr = loc.get("address")
+    if isinstance(addr, dict):
+        addr = addr.get("address")
+    return addr.strip() if isinstance(addr, str) else ""
+
+
+def extract_comuna_key(address):
+    """
+    Heurística simple: toma el último segmento después de la última coma.
+    E.g. "Los Tres Antonios 300, Ñuñoa, Metro Ñuñoa, Ñuñoa" -> "ñuñoa"
+    """
+    if not address:
+        return ""
+    parts = [p.strip().lower() for p in address.split(",") if p.strip()]
+    return parts[-1] if parts else address.strip().lower()
+
+
+def extract_lat_lon(loc):
+    """
+    Busca lat/lon en location (o dentro de location['address'] si es dict).
+    Acepta lat/lon, latitude/longitude o GeoJSON coordinates [lon, lat].
+    Retorna (lat, lon) o (None, None)
+    """
+    loc = coerce_location(loc)
+    for src in (loc, loc.get("address")):
+        if not isinstance(src, dict):
+            continue
+        for k_lat, k_lon in (("lat", "lon"), ("latitude", "longitude")):
+            if src.get(k_lat) is not None and src.get(k_lon) is not None:
+                try:
+                    return float(src[k_lat]), float(src[k_lon])
+                except (TypeError, ValueError):
+                    pass
+        coords = src.get("coordinates")
+        if isinstance(coords, (list, tuple)) and len(coords) >= 2:
+            try:
+                return float(coords[1]), float(coords[0])
+            except (TypeError, ValueError):
+                pass
+    return None, None
+
+
+def geohash_encode(lat, lon, precision=GEOHASH_PRECISION):
+    """Geohash estándar (mismo encoder que jobmaster/worker/geohash.py)."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    out = []
+    bit, ch, even = 0, 0, True
+    while len(out) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                ch = (ch << 1) | 1
+                lon_lo = mid
+            else:
+                ch <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch <<= 1
+                lat_hi = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            out.append(_GEOHASH_BASE32[ch])
+            bit, ch = 0, 0
+    return "".join(out)
+
+
+def derive_geo(loc):
+    """Retorna (comuna_key, lat, lon, geohash) listos para las columnas de properties."""
+    lat, lon = extract_lat_lon(loc)
+    geohash = geohash_encode(lat, lon) if lat is not None and lon is not None else None
+    return extract_comuna_key(location_address(loc)), lat, lon, geohash
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Migra las boletas ya generadas (receipts/boleta_{request_id}_{timestamp}.pdf) a las keys
+direccionadas por contenido de receipt_keys.py (receipts/v1/{sha256}.pdf).
+Uso: python migrate_receipt_keys.py [--batch-size 200] [--workers 8] [--limit N]
+                                    [--delete-legacy] [--dry-run]
+
+Por cada compra ACCEPTED calcula la key nueva a partir de sus datos actuales (el mismo
+payload que recibe la Lambda). Si el objeto nuevo no existe, copia en S3 la boleta antigua
+(la de purchase_requests.receipt_key o, si no está guardada, la más reciente del prefijo),
+sin volver a renderizarla; luego guarda receipt_url / receipt_key en la fila. La copia
+solo vale si la boleta antigua es posterior al último cambio de la compra, la propiedad y
+el usuario (purchase_requests.updated_at, properties.timestamp, users.updated_at, en UTC):
+si no, su contenido ya no corresponde a la key nueva y se vuelve a renderizar con la
+Lambda. Las compras sin boleta antigua se saltan (las genera backfill_receipts.py).
+Es reanudable: las filas cuyo receipt_key ya es la key nueva no se vuelven a tocar.
+
+Con --delete-legacy la boleta antigua se borra recién después del commit de su fila, para
+que la BD nunca apunte a un objeto ya borrado.
+"""
+
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timezone
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import receipt_keys
+import receipts
+
+LEGACY_PREFIX = "receipts/boleta_"
+
+BATCH_QUERY = """
+    SELECT pr.request_id, pr.url, pr.status, pr.created_at, pr.amount,
+           pr.authorization_code, pr.receipt_key AS current_receipt_key, p.*,
+           u.name as user_name, u.email as user_email, u.phone as user_phone,
+           GREATEST(pr.updated_at, p.timestamp, u.updated_at) AS data_changed_at
+    FROM purchase_requests pr
+    LEFT JOIN properties p ON pr.url = p.url
+    LEFT JOIN users u ON pr.user_id = u.user_id
+    WHERE pr.status = 'ACCEPTED' AND pr.user_id IS NOT NULL
+      {after}
+    ORDER BY pr.created_at, pr.request_id
+    LIMIT %s
+"""
+
+
+def batches(batch_size, limit):
+    pool = receipts._get_db_pool()
+    conn = pool.getconn()
+    cur = conn.cursor()
+    last = None
+    seen = 0
+    try:
+        while limit is None or seen < limit:
+            size = batch_size if limit is None else min(batch_size, limit - seen)
+            after = "" if last is None else "AND (pr.created_at, pr.request_id) > (%s, %s)"
+            cur.execute(BATCH_QUERY.format(after=after), (*(last or ()), size))
+            rows = cur.fetchall()
+            conn.rollback()
+            if not rows:
+                break
+            last = (rows[-1]["created_at"], rows[-1]["request_id"])
+            seen += len(rows)
+            yield rows
+    finally:
+        cur.close()
+        pool.putconn(conn)
+
+
+def legacy_object(s3, request_id, current_key):
+    """(key, LastModified) de la boleta antigua de la compra, o None si no hay."""
+    bucket = receipts.S3_RECEIPTS_BUCKET
+    if current_key and current_key.startswith(LEGACY_PREFIX):
+        try:
+            return current_key, s3.head_object(Bucket=bucket, Key=current_key)["LastModified"]
+        except Exception as e:
+            code = str(getattr(e, "response", {}).get("Error", {}).get("Code", ""))
+            if code not in ("404", "NoSuchKey", "NotFound"):
+                raise
+    response = s3.list_objects_v2(Bucket=bucket, Prefix=f"{LEGACY_PREFIX}{request_id}_")
+    contents = response.get("Contents") or []
+    if not contents:
+        return None
+    latest = max(contents, key=lambda x: x["LastModified"])
+    return latest["Key"], latest["LastModified"]
+
+
+def _stale(rendered_at, changed_at):
+    """True si la compra, la propiedad o el usuario cambiaron después de renderizar la boleta."""
+    if changed_at is None:
+        return False
+    if changed_at.tzinfo is None:
+        changed_at = changed_at.replace(tzinfo=timezone.utc)
+    return changed_at > rendered_at
+
+
+def render(payload):
+    """Renderiza la boleta con la Lambda (la sube a la key del payload). Lanza si falla."""
+    response = receipts._get_lambda().invoke(
+        FunctionName=receipts.LAMBDA_PDF_FUNCTION,
+        InvocationType="RequestResponse",
+        Payload=payload
+    )
+    result = json.loads(response["Payload"].read())
+    if result.get("statusCode") != 200:
+        raise RuntimeError(f"la Lambda respondió {result.get('statusCode')}: {result.get('body')}")
+
+
+def migrate_one(r, dry_run):
+    """
+    (request_id, key nueva, acción, key antigua): migrated | rendered | exists | missing | done.
+    La key antigua solo viene en migrated/rendered (es la que --delete-legacy puede borrar).
+    """
+    request_id = str(r["request_id"])
+    payload = receipt_keys.event_payload(r, receipts.GROUP_ID)
+    new_key = receipt_keys.receipt_key(json.loads(payload))
+    if r["current_receipt_key"] == new_key:
+        return request_id, new_key, "done", None
+
+    s3 = receipts._get_s3()
+    bucket = receipts.S3_RECEIPTS_BUCKET
+    if receipt_keys.exists(s3, bucket, new_key):
+        return request_id, new_key, "exists", None
+    legacy = legacy_object(s3, request_id, r["current_receipt_key"])
+    if legacy is None:
+        return request_id, new_key, "missing", None
+    old_key, rendered_at = legacy
+    if _stale(rendered_at, r.get("data_changed_at")):
+        # la boleta antigua muestra datos anteriores: copiarla dejaría contenido que no
+        # corresponde a la key
+        if not dry_run:
+            render(payload)
+        return request_id, new_key, "rendered", old_key
+    if not dry_run:
+        s3.copy_object(
+            Bucket=bucket, Key=new_key,
+            CopySource={"Bucket": bucket, "Key": old_key},
+            MetadataDirective="COPY"
+        )
+    return request_id, new_key, "migrated", old_key
+
+
+def delete_legacy_objects(keys):
+    """Borra las boletas antiguas (llamar después del commit de sus filas)."""
+    s3 = receipts._get_s3()
+    failed = 0
+    for key in keys:
+        try:
+            s3.delete_object(Bucket=receipts.S3_RECEIPTS_BUCKET, Key=key)
+        except Exception as e:
+            failed += 1
+            print(f"⚠️ No se pudo borrar {key}: {e}")
+    return failed
+
+
+def save_keys(updates):
+    pool = receipts._get_db_pool()
+    conn = pool.getconn()
+    cur = conn.cursor()
+    try:
+        for request_id, key in updates:
+            cur.execute("""
+                UPDATE purchase_requests
+                   SET receipt_url = %s, receipt_key = %s, receipt_status = 'READY',
+                       receipt_generated_at = COALESCE(receipt_generated_at, CURRENT_TIMESTAMP)
+                 WHERE request_id = %s
+            """, (receipt_keys.public_url(receipts.S3_RECEIPTS_BUCKET, key), key, request_id))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        pool.putconn(conn)
+
+
+def migrate(batch_size, workers, limit, delete_legacy, dry_run):
+    if receipts.boto3 is None:
+        raise SystemExit("❌ boto3 no está instalado")
+    t0 = time.perf_counter()
+    counts = {"migrated": 0, "rendered": 0, "exists": 0, "missing": 0, "done": 0, "failed": 0,
+              "legacy_deleted": 0}
+
+    def run(r):
+        try:
+            return migrate_one(r, dry_run)
+        except Exception as e:
+            print(f"⚠️ {r['request_id']}: {e}")
+            return str(r["request_id"]), None, "failed", None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for rows in batches(batch_size, limit):
+            updates = []
+            legacy = []
+            for request_id, key, action, old_key in pool.map(run, rows):
+                counts[action] += 1
+                if action in ("migrated", "rendered", "exists"):
+                    updates.append((request_id, key))
+                if old_key is not None:
+                    legacy.append(old_key)
+            if updates and not dry_run:
+                save_keys(updates)
+                # solo después del commit: si algo falla antes, la fila sigue apuntando a un
+                # objeto que existe
+                if delete_legacy and legacy:
+                    counts["legacy_deleted"] += len(legacy) - delete_legacy_objects(legacy)
+            print(f"✅ {counts} ({time.perf_counter() - t0:.1f}s)")
+    print(f"🏁 Migración terminada{' (dry-run)' if dry_run else ''}: {counts} en {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migra boletas existentes a keys direccionadas por contenido")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=8, help="Operaciones simultáneas en S3")
+    parser.add_argument("--limit", type=int, help="Máximo de compras a procesar")
+    parser.add_argument("--delete-legacy", action="store_true", help="Borra el objeto antiguo después de guardar la key nueva en la BD")
+    parser.add_argument("--dry-run", action="store_true", help="Solo informa qué se migraría")
+    args = parser.parse_args()
+    receipts.RECEIPTS_WORKERS = args.workers + 1
+    migrate(args.batch_size, args.workers, args.limit, args.delete_legacy, args.dry_run)
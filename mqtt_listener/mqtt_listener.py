@@ -9,9 +9,21 @@ from psycopg2.extras import RealDictCursor
 import paho.mqtt.client as mqtt
 from dotenv import load_dotenv
 from email_service import EmailService
+from geo import derive_geo
+import recs_cache
+import recs_precompute
+import receipts
+import log_config
 
 load_dotenv()
 
+# JSON a stdout a través de una cola (ver log_config.py). Cada mensaje del broker genera un
+# evento mqtt.message: se muestrean, el volumen es el de todo el canal del curso.
+logger = log_config.setup(
+    "mqtt_listener",
+    sample_rates={"mqtt.message": 0.01, "property.upsert": 0.05, "email.sent": 0.1},
+)
+
 # Inicializar servicio de email
 email_service = EmailService()
 
@@ -48,10 +60,10 @@ for attempt in range(max_retries):
             cursor_factory=RealDictCursor,    # <— importante
         )
         cur = conn.cursor()
-        print("✅ Conectado a PostgreSQL!")
+        logger.info("Conectado a PostgreSQL")
         break
     except OperationalError:
-        print(f"⚠️ PostgreSQL no listo, reintentando en {retry_delay}s... (Intento {attempt+1}/{max_retries})")
+        logger.warning("PostgreSQL no listo, reintentando en %ss (intento %s/%s)", retry_delay, attempt + 1, max_retries)
         time.sleep(retry_delay)
 else:
     raise Exception("❌ No se pudo conectar a PostgreSQL después de varios intentos")
@@ -80,7 +92,7 @@ def handle_properties_info(cur, data):
     """UPSERT en properties por URL + log a event_log."""
     url = data.get("url")
     if not url:
-        print("⚠️ PROPERTY_INFO sin url; se ignora.")
+        logger.warning("PROPERTY_INFO sin url; se ignora", extra={"event": "property.invalid"})
         return
 
     name       = data.get("name")
@@ -95,13 +107,22 @@ def handle_properties_info(cur, data):
     ts         = data.get("timestamp")  # ISO 8601 preferido
     initial_slots = data.get("visit_slots", 3)
 
+    # Columnas precalculadas para recomendaciones (comuna_key, lat, lon, geohash)
+    location_json = {"address": location} if isinstance(location, (str, dict)) else None
+    comuna_key, lat, lon, geohash = derive_geo(location_json)
+
     # Log del evento
     log_event(cur, INFO_TOPIC, "PROPERTY_INFO", data, url=url)
 
     # Verificar si la propiedad ya existe
-    cur.execute("SELECT visit_slots FROM properties WHERE url = %s", (url,))
+    cur.execute("SELECT visit_slots, comuna_key, bedrooms FROM properties WHERE url = %s", (url,))
     existing_property = cur.fetchone()
 
+    # Invalida el cache de recomendaciones del bucket nuevo y, si cambió, del anterior
+    recs_cache.mark_bucket(comuna_key, bedrooms)
+    if existing_property:
+        recs_cache.mark_bucket(existing_property["comuna_key"], existing_property["bedrooms"])
+
     if existing_property:
         # Propiedad duplicada: aumentar visit_slots en 1
         cur.execute("""
@@ -116,27 +137,35 @@ def handle_properties_info(cur, data):
                 img        = %s,
                 is_project = %s,
                 timestamp  = COALESCE(%s, NOW()),
+                comuna_key = %s,
+                lat        = %s,
+                lon        = %s,
+                geohash    = %s,
                 visit_slots = visit_slots + 1
             WHERE url = %s
         """, (
             name, price, currency, bedrooms, bathrooms, m2,
-            json.dumps({"address": location}) if isinstance(location, (str, dict)) else None,
-            img, is_project, ts, url
+            json.dumps(location_json) if location_json is not None else None,
+            img, is_project, ts, comuna_key, lat, lon, geohash, url
         ))
-        print(f"🏠 UPDATE properties (duplicada): {url} - visit_slots aumentado en 1")
+        logger.info("Propiedad duplicada: visit_slots + 1", extra={"event": "property.upsert", "url": url, "new": False})
     else:
         # Propiedad nueva: insertar con visit_slots iniciales
         cur.execute("""
             INSERT INTO properties
-                (name, price, currency, bedrooms, bathrooms, m2, location, img, url, is_project, timestamp, visit_slots)
+                (name, price, currency, bedrooms, bathrooms, m2, location, img, url, is_project, timestamp, visit_slots,
+                 comuna_key, lat, lon, geohash)
             VALUES
-                (%s,   %s,    %s,       %s,       %s,        %s, %s::jsonb, %s,  %s,  %s,         COALESCE(%s, NOW()), %s)
+                (%s,   %s,    %s,       %s,       %s,        %s, %s::jsonb, %s,  %s,  %s,         COALESCE(%s, NOW()), %s,
+                 %s,         %s,  %s,  %s)
         """, (
             name, price, currency, bedrooms, bathrooms, m2,
-            json.dumps({"address": location}) if isinstance(location, (str, dict)) else None,
-            img, url, is_project, ts, initial_slots
+            json.dumps(location_json) if location_json is not None else None,
+            img, url, is_project, ts, initial_slots,
+            comuna_key, lat, lon, geohash
         ))
-        print(f"🏠 INSERT properties (nueva): {url} - visit_slots inicial: {initial_slots}")
+        logger.info("Propiedad nueva", extra={"event": "property.upsert", "url": url, "new": True,
+                                              "visit_slots": initial_slots})
 
 def handle_properties_requests(cur, data):
     req_id = data.get("request_id")
@@ -183,7 +212,8 @@ def handle_properties_validation(cur, data):
             w = cur.fetchone(); balance = float(w["balance"]) if w else 0.0
 
             if balance < amount:
-                print(f"⚠️ Saldo insuficiente para request_id={req_id}. Balance={balance}, Required={amount}")
+                logger.warning("Saldo insuficiente", extra={"event": "wallet.insufficient", "request_id": str(req_id),
+                                                            "balance": balance, "required": amount})
                 cur.execute("UPDATE purchase_requests SET status='ERROR', updated_at=CURRENT_TIMESTAMP WHERE request_id=%s", (req_id,))
                 cur.execute("UPDATE properties SET visit_slots = visit_slots + 1 WHERE url = %s", (url,))
                 return
@@ -209,9 +239,13 @@ def handle_properties_validation(cur, data):
                         property_url=url,
                         amount=amount
                     )
-                    print(f"📧 Email de pago aceptado enviado a {user_data['email']}")
                 except Exception as e:
-                    print(f"⚠️ Error al enviar email de pago aceptado: {e}")
+                    logger.warning("Error al enviar email de pago aceptado: %s", e,
+                                   extra={"event": "email.failed", "request_id": str(req_id)})
+
+        # Boleta PDF pre-generada tras el commit (receipts.py)
+        if user_id:
+            receipts.mark(cur, req_id)
     elif str(status).upper() in ("REJECTED","ERROR"):
         cur.execute("UPDATE properties SET visit_slots = visit_slots + 1 WHERE url = %s", (pr["url"],))
         
@@ -228,9 +262,9 @@ def handle_properties_validation(cur, data):
                         property_url=pr["url"],
                         reason=data.get("reason")
                     )
-                    print(f"📧 Email de rechazo enviado a {user_data['email']}")
                 except Exception as e:
-                    print(f"⚠️ Error al enviar email de rechazo: {e}")
+                    logger.warning("Error al enviar email de rechazo: %s", e,
+                                   extra={"event": "email.failed", "request_id": str(req_id)})
 
 def handle_properties_auctions(cur, data):
     """Manejar mensajes de properties/auctions (subastas)"""
@@ -241,11 +275,11 @@ def handle_properties_auctions(cur, data):
     
     # Validar campos requeridos
     if not auction_id:
-        print(f"⚠️ Mensaje de subasta sin auction_id, se ignora: {data}")
+        logger.warning("Mensaje de subasta sin auction_id; se ignora", extra={"event": "auction.invalid"})
         return
     
     if not url:
-        print(f"⚠️ Mensaje de subasta sin url, se ignora: auction_id={auction_id}")
+        logger.warning("Mensaje de subasta sin url; se ignora", extra={"event": "auction.invalid", "auction_id": auction_id})
         return
     
     log_event(cur, AUCTIONS_TOPIC, "AUCTION_RECEIVED", data, url=url)
@@ -293,23 +327,26 @@ def handle_properties_auctions(cur, data):
                 operation,
                 origin_group_id
             ))
-        print(f"📦 Oferta de subasta recibida: auction_id={auction_id}, group_id={group_id}, url={url}")
+        logger.info("Oferta de subasta recibida", extra={"event": "auction.received", "auction_id": auction_id,
+                                                         "group_id": group_id, "url": url})
 
 # ---------- MQTT ----------
 def on_connect(client, userdata, flags, rc):
     if rc == 0:
-        print("✅ Conectado al broker MQTT!")
-        for t in [INFO_TOPIC, REQUESTS_TOPIC, VALIDATION_TOPIC, AUCTIONS_TOPIC]:
+        topics = [INFO_TOPIC, REQUESTS_TOPIC, VALIDATION_TOPIC, AUCTIONS_TOPIC]
+        for t in topics:
             client.subscribe(t)
-            print(f"→ Suscrito a {t}")
+        logger.info("Conectado al broker MQTT", extra={"topics": topics})
     else:
-        print(f"❌ Error al conectar al broker, código {rc}")
+        logger.error("Error al conectar al broker, código %s", rc)
 
 def on_message(client, userdata, msg):
     try:
         payload = msg.payload.decode('utf-8')
         data = json.loads(payload)
-        print(f"📩 [{msg.topic}] {json.dumps(data, indent=2)}")
+        # sin el payload completo: se ve en event_log
+        logger.info("Mensaje recibido", extra={"event": "mqtt.message", "topic": msg.topic,
+                                               "bytes": len(msg.payload)})
 
         if msg.topic == INFO_TOPIC:
             handle_properties_info(cur, data)
@@ -321,13 +358,17 @@ def on_message(client, userdata, msg):
             handle_properties_auctions(cur, data)
 
         conn.commit()
-        print("✅ Evento procesado y guardado")
+        # invalida el cache y encola el precálculo de los buckets tocados
+        recs_precompute.schedule(recs_cache.flush())
+        receipts.flush()
     except Exception as e:
         conn.rollback()
-        print(f"⚠️ Error procesando mensaje: {e}")
+        recs_cache.discard()
+        receipts.discard()
+        logger.warning("Error procesando mensaje: %s", e, extra={"event": "mqtt.message_failed", "topic": msg.topic})
 
 # --- MQTT client ---
-print(f"🔌 MQTT → host={BROKER} port={PORT} user_set={'yes' if MQTT_USER else 'no'}")
+logger.info("MQTT", extra={"host": BROKER, "port": PORT, "user_set": bool(MQTT_USER)})
 
 client = mqtt.Client(
     protocol=mqtt.MQTTv311,
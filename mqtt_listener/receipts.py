@@ -0,0 +1,202 @@
+"""
+Pre-generación de boletas PDF (lambda-pdf-service) para compras ACCEPTED.
+
+handle_properties_validation marca las compras que quedaron aceptadas y on_message las
+envía, DESPUÉS del commit, a un pool de hilos que invoca la Lambda y guarda receipt_url /
+receipt_key en purchase_requests (migration_purchase_receipts.sql). Así la API responde
+GET /purchases/{id}/receipt con una lectura de la BD. El payload lo arma
+receipt_keys.event_payload, igual que en la API (generate_pdf_with_lambda). Sin boto3 o
+con RECEIPTS_PREGENERATE=false no se genera nada aquí y la API genera la boleta a demanda
+como antes.
+La key del objeto en S3 depende solo de los datos de la boleta (receipt_keys.py); se guarda
+en receipt_key antes de invocar la Lambda para que la API pueda consultarla con un HEAD.
+"""
+
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlparse
+
+from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
+
+import receipt_keys
+
+try:
+    import boto3
+    from botocore.config import Config
+except ImportError:
+    boto3 = None
+
+logger = logging.getLogger(__name__)
+
+RECEIPTS_PREGENERATE = os.getenv("RECEIPTS_PREGENERATE", "true").lower() == "true"
+RECEIPTS_WORKERS = int(os.getenv("RECEIPTS_WORKERS", "4"))
+LAMBDA_PDF_FUNCTION = os.getenv("LAMBDA_PDF_FUNCTION", "g6-arquisis-pdf-service-dev-generateReceipt")
+S3_RECEIPTS_BUCKET = os.getenv("S3_RECEIPTS_BUCKET", "g6-arquisis-receipts-dev")
+GROUP_ID = os.getenv("GROUP_ID", "gX")
+
+# Mismas columnas que lee get_purchase_receipt en la API
+RECEIPT_QUERY = """
+    SELECT pr.request_id, pr.url, pr.status, pr.created_at, pr.amount,
+           pr.authorization_code, p.*,
+           u.name as user_name, u.email as user_email, u.phone as user_phone
+    FROM purchase_requests pr
+    LEFT JOIN properties p ON pr.url = p.url
+    LEFT JOIN users u ON pr.user_id = u.user_id
+    WHERE pr.request_id = %s AND pr.status = 'ACCEPTED' AND pr.receipt_url IS NULL
+"""
+
+_pending = []
+_lock = threading.Lock()
+_executor = None
+_db_pool = None
+_lambda_client = None
+_s3_client = None
+
+
+def enabled():
+    return RECEIPTS_PREGENERATE and boto3 is not None
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=RECEIPTS_WORKERS, thread_name_prefix="receipts")
+        return _executor
+
+
+def _get_db_pool():
+    # conexiones propias: la del listener es del hilo de MQTT
+    global _db_pool
+    with _lock:
+        if _db_pool is None:
+            _db_pool = ThreadedConnectionPool(
+                1, RECEIPTS_WORKERS,
+                dbname=os.getenv("DB_NAME"),
+                user=os.getenv("DB_USER"),
+                password=os.getenv("DB_PASSWORD"),
+                host=os.getenv("DB_HOST", "localhost"),
+                port=int(os.getenv("DB_PORT", "5432")),
+                cursor_factory=RealDictCursor,
+                connect_timeout=10,
+            )
+        return _db_pool
+
+
+def _get_lambda():
+    global _lambda_client
+    with _lock:
+        if _lambda_client is None:
+            _lambda_client = boto3.session.Session().client(
+                "lambda", config=Config(max_pool_connections=RECEIPTS_WORKERS, read_timeout=60)
+            )
+        return _lambda_client
+
+
+def _get_s3():
+    global _s3_client
+    with _lock:
+        if _s3_client is None:
+            _s3_client = boto3.session.Session().client(
+                "s3", config=Config(max_pool_connections=RECEIPTS_WORKERS)
+            )
+        return _s3_client
+
+
+def key_from_url(pdf_url):
+    """https://{bucket}.s3.amazonaws.com/receipts/boleta_... -> receipts/boleta_..."""
+    return unquote(urlparse(pdf_url).path.lstrip("/"))
+
+
+def generate(request_id):
+    """
+    Genera la boleta de una compra ACCEPTED sin boleta y guarda su URL.
+    Retorna la URL, o None si no corresponde (ya tiene, no existe) o la Lambda falló.
+    """
+    pool = _get_db_pool()
+    conn = pool.getconn()
+    cur = conn.cursor()
+    try:
+        cur.execute(RECEIPT_QUERY, (str(request_id),))
+        r = cur.fetchone()
+        if not r:
+            conn.rollback()
+            return None
+
+        payload = receipt_keys.event_payload(r, GROUP_ID)
+        cur.execute(
+            "UPDATE purchase_requests SET receipt_key = %s WHERE request_id = %s AND receipt_url IS NULL",
+            (receipt_keys.receipt_key(json.loads(payload)), str(request_id))
+        )
+        conn.commit()  # no dejar la transacción abierta mientras corre la Lambda
+
+        response = _get_lambda().invoke(
+            FunctionName=LAMBDA_PDF_FUNCTION,
+            InvocationType="RequestResponse",
+            Payload=payload
+        )
+        result = json.loads(response["Payload"].read())
+        if result.get("statusCode") != 200:
+            logger.warning("Lambda de boletas falló: %s", result, extra={"event": "receipt.failed", "request_id": request_id})
+            return None
+        pdf_url = json.loads(result["body"]).get("pdf_url")
+        if not pdf_url:
+            return None
+
+        cur.execute("""
+            UPDATE purchase_requests
+               SET receipt_url = %s, receipt_key = %s, receipt_status = 'READY',
+                   receipt_generated_at = CURRENT_TIMESTAMP
+             WHERE request_id = %s AND receipt_url IS NULL
+        """, (pdf_url, key_from_url(pdf_url), str(request_id)))
+        conn.commit()
+        return pdf_url
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        pool.putconn(conn)
+
+
+def _generate_logged(request_id):
+    try:
+        url = generate(request_id)
+        if url:
+            logger.info("Boleta generada", extra={"event": "receipt.generated", "request_id": request_id})
+    except Exception as e:
+        logger.warning("No se pudo generar la boleta: %s", e, extra={"event": "receipt.failed", "request_id": request_id})
+
+
+def mark(cur, request_id):
+    """
+    Dentro de la transacción del mensaje: deja la boleta PENDING (la API responde 202 en vez
+    de generarla de nuevo) y la anota para flush().
+    """
+    if not enabled():
+        return
+    cur.execute("""
+        UPDATE purchase_requests SET receipt_status = 'PENDING', receipt_requested_at = CURRENT_TIMESTAMP
+        WHERE request_id = %s AND receipt_url IS NULL
+    """, (str(request_id),))
+    _pending.append(str(request_id))
+
+
+def discard():
+    """Rollback: la compra no quedó aceptada."""
+    _pending.clear()
+
+
+def flush():
+    """Encola la generación de las compras marcadas (llamar después de conn.commit())."""
+    if not _pending:
+        return
+    ids = list(_pending)
+    _pending.clear()
+    executor = _get_executor()
+    for request_id in ids:
+        executor.submit(_generate_logged, request_id)
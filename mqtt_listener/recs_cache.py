@@ -0,0 +1,75 @@
+"""
+Invalidación del cache de recomendaciones (jobmaster/worker/recs_cache.py).
+
+handle_properties_info marca los buckets (comuna_key, bedrooms) que tocó y on_message
+reemplaza sus versiones en Redis por versiones nuevas DESPUÉS del commit, para que un
+worker que lea la versión nueva ya vea los datos nuevos. No se usa INCR: si el LRU
+desalojó la clave, INCR la reiniciaría en 1 y volverían a valer entradas viejas.
+flush() retorna los buckets renovados, y on_message se los pasa a recs_precompute.py para
+que encole su recálculo. Si REDIS_URL no está definido o falta el paquete
+redis, no se invalida nada (los resultados expiran por TTL en el worker).
+"""
+
+import logging
+import os
+import time
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+_client = None
+_pending = set()
+
+
+def _get_client():
+    global _client
+    if _client is None and redis is not None and REDIS_URL:
+        _client = redis.from_url(REDIS_URL, socket_timeout=2)
+    return _client
+
+
+def version_key(comuna_key, bedrooms):
+    # mismo formato que recs_cache.version_key del worker
+    return f"recs:ver:{comuna_key or ''}:{bedrooms if bedrooms is not None else ''}"
+
+
+def new_version():
+    # mismo criterio que recs_cache.new_version del worker: epoch en ns, nunca repetido
+    return time.time_ns()
+
+
+def mark_bucket(comuna_key, bedrooms):
+    _pending.add((comuna_key, bedrooms))
+
+
+def discard():
+    """Rollback: los cambios no se aplicaron, no hay nada que invalidar."""
+    _pending.clear()
+
+
+def flush():
+    """
+    Renueva la versión de los buckets marcados (llamar después de conn.commit()).
+    Retorna la lista de buckets (comuna_key, bedrooms) afectados.
+    """
+    if not _pending:
+        return []
+    buckets = list(_pending)
+    _pending.clear()
+    r = _get_client()
+    if r is None:
+        return buckets
+    try:
+        pipe = r.pipeline(transaction=False)
+        for b in buckets:
+            pipe.set(version_key(*b), new_version())
+        pipe.execute()
+    except Exception as e:
+        logger.warning("No se pudo invalidar el cache de recomendaciones: %s", e, extra={"event": "recs.invalidate_failed"})
+    return buckets
@@ -0,0 +1,70 @@
+"""
+Precálculo de recomendaciones al ingresar propiedades (jobmaster/worker/tasks.py,
+tasks.precompute_bucket).
+
+Por cada bucket (comuna_key, bedrooms) que tocó un mensaje se encola, a lo más una vez
+por ventana de PRECOMPUTE_DEBOUNCE_SECONDS, una task en la cola recs.bulk con ese mismo
+retraso: una ráfaga de ingresos al mismo bucket se resuelve con un solo recálculo. La
+marca de debounce es recs:precompute:{comuna_key}:{bedrooms} (SET NX); la task la borra
+al empezar. Requiere REDIS_URL y el paquete celery; sin ellos no se encola nada y las
+recomendaciones se calculan a demanda como antes.
+"""
+
+import logging
+import os
+
+try:
+    from celery import Celery
+except ImportError:
+    Celery = None
+
+import recs_cache
+
+logger = logging.getLogger(__name__)
+
+PRECOMPUTE_ENABLED = os.getenv("RECS_PRECOMPUTE_ENABLED", "true").lower() == "true"
+PRECOMPUTE_DEBOUNCE_SECONDS = int(os.getenv("PRECOMPUTE_DEBOUNCE_SECONDS", "10"))
+
+# Deben coincidir con jobmaster/worker/celery_app.py
+BULK_QUEUE = "recs.bulk"
+PRIORITY_STEPS = list(range(10))
+
+_app = None
+
+
+def _get_app():
+    global _app
+    if _app is None and Celery is not None and recs_cache.REDIS_URL:
+        _app = Celery("recs_precompute", broker=recs_cache.REDIS_URL)
+        _app.conf.broker_transport_options = {
+            "priority_steps": PRIORITY_STEPS, "sep": ":", "queue_order_strategy": "priority"
+        }
+    return _app
+
+
+def precompute_key(comuna_key, bedrooms):
+    # mismo formato que recs_cache.precompute_key del worker
+    return f"recs:precompute:{comuna_key or ''}:{bedrooms if bedrooms is not None else ''}"
+
+
+def schedule(buckets):
+    """Encola el recálculo de los buckets que no tengan uno ya pendiente."""
+    # sin comuna o dormitorios una propiedad nunca es candidata ni tiene recomendaciones
+    buckets = [b for b in buckets if b[0] and b[1] is not None]
+    if not PRECOMPUTE_ENABLED or not buckets:
+        return
+    r, app = recs_cache._get_client(), _get_app()
+    if r is None or app is None:
+        return
+    try:
+        pipe = r.pipeline(transaction=False)
+        for b in buckets:
+            # la marca dura más que la ventana por si la cola está atrasada
+            pipe.set(precompute_key(*b), 1, nx=True, ex=PRECOMPUTE_DEBOUNCE_SECONDS * 30)
+        for (comuna_key, bedrooms), fresh in zip(buckets, pipe.execute()):
+            if fresh:
+                app.send_task("tasks.precompute_bucket", args=[comuna_key, bedrooms],
+                              queue=BULK_QUEUE, priority=PRIORITY_STEPS[-1],
+                              countdown=PRECOMPUTE_DEBOUNCE_SECONDS)
+    except Exception as e:
+        logger.warning("No se pudo encolar el precálculo de recomendaciones: %s", e, extra={"event": "recs.precompute_failed"})
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+Benchmark de las consultas SQL frecuentes de api/main.py a escala, con comparación
+contra una línea base guardada.
+
+1. Crea el schema bench_q con copias de las tablas de public (CREATE TABLE ... LIKE
+   INCLUDING ALL: mismas columnas e índices, ver migration_composite_indexes.sql) y las
+   llena con datos sintéticos en SQL (generate_series) según --scale: 10k, 100k o 1m
+   propiedades y solicitudes de compra (más usuarios, subastas y descuentos en
+   proporción). Si el schema ya tiene esa escala se reutiliza (--reseed para rehacerlo).
+2. Corre cada consulta de QUERIES con search_path = bench_q: --warmup corridas sin
+   medir y --runs medidas con parámetros variados (semilla fija). Guarda p50/p95/p99 y
+   el EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) de una ejecución.
+3. Compara con scripts/query_baselines/{scale}.json y marca regresión si el p95 o los
+   bloques leídos (shared hit + read) suben más de --tolerance, o si aparece un Seq Scan
+   que la línea base no tenía. Sale con código 1 si hay regresiones.
+
+Las consultas son copias de las de api/main.py (list_properties, get_auction_offers,
+get_auction_proposals, my_properties, purchase_admin_reservation): al cambiar una allí,
+actualizarla aquí y volver a guardar la línea base.
+
+Uso: python scripts/bench_queries.py --scale 100k [--runs 50] [--save-baseline]
+     python scripts/bench_queries.py --scale 1m --output resultados.json --cleanup
+Requiere la BD con init.sql y las migraciones aplicadas (DB_* como la API).
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+import psycopg2
+from dotenv import load_dotenv
+from psycopg2.extras import RealDictCursor
+
+load_dotenv()
+
+SCHEMA = "bench_q"
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+TABLES = ("properties", "users", "purchase_requests", "auctions", "admin_discounts", "transactions")
+GROUP_ID = os.getenv("GROUP_ID", "gX")
+ADMIN_ID = "bench|admin"
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "query_baselines")
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1", "postgres", "db")
+
+LIST_PROPERTIES_SQL = """
+    SELECT
+        p.id, p.name, p.price, p.currency, p.bedrooms, p.bathrooms, p.m2, p.location,
+        p.img, p.url, p.is_project, p.visit_slots,
+        GREATEST(
+            p.visit_slots
+            - COALESCE((
+                SELECT COUNT(*)
+                FROM purchase_requests pr
+                WHERE pr.url = p.url
+                AND pr.status = 'ACCEPTED'
+                AND (pr.group_id IS NULL OR pr.group_id <> %s)
+            ), 0)
+            - COALESCE((
+                SELECT COUNT(*)
+                FROM purchase_requests pr2
+                WHERE pr2.url = p.url
+                AND pr2.status = 'ACCEPTED'
+                AND pr2.is_admin_reservation = TRUE
+                AND pr2.purchased_by_user_id IS NULL
+            ), 0),
+            0
+        ) AS available_slots,
+        p.timestamp AS last_updated,
+        CASE
+            WHEN EXISTS (
+                SELECT 1 FROM purchase_requests pr
+                WHERE pr.url = p.url
+                AND pr.is_admin_reservation = TRUE
+                AND pr.status = 'ACCEPTED'
+                AND pr.purchased_by_user_id IS NULL
+            ) THEN TRUE
+            ELSE FALSE
+        END AS is_special_selection,
+        ad.discount_percent AS admin_discount_percent
+    FROM properties p
+    LEFT JOIN admin_discounts ad ON ad.property_url = p.url AND ad.active = TRUE
+    WHERE 1=1
+"""
+
+# nombre -> (consulta, función (rng, n) -> parámetros)
+QUERIES = {
+    "list_properties": (
+        LIST_PROPERTIES_SQL + " ORDER BY p.timestamp DESC LIMIT %s OFFSET %s",
+        lambda rng, n: (GROUP_ID, 25, 25 * rng.randrange(20)),
+    ),
+    "list_properties_price": (
+        LIST_PROPERTIES_SQL + " AND p.price <= %s ORDER BY p.timestamp DESC LIMIT %s OFFSET %s",
+        lambda rng, n: (GROUP_ID, rng.choice((80_000_000, 150_000_000, 300_000_000)), 25, 0),
+    ),
+    "get_auction_offers": (
+        """
+        SELECT a.auction_id, a.proposal_id, a.url, a.timestamp, a.quantity,
+               a.group_id, a.operation, a.status,
+               p.*
+        FROM auctions a
+        LEFT JOIN properties p ON a.url = p.url
+        WHERE (a.origin_group_id IS NULL OR a.origin_group_id != %s)
+        AND a.operation = 'offer'
+        AND a.status = 'active'
+        ORDER BY a.created_at DESC
+        """,
+        lambda rng, n: (GROUP_ID,),
+    ),
+    "get_auction_proposals": (
+        """
+        SELECT a.auction_id, a.proposal_id, a.url, a.timestamp, a.quantity,
+               a.group_id, a.operation, a.status,
+               p.*
+        FROM auctions a
+        LEFT JOIN properties p ON a.url = p.url
+        WHERE a.operation = 'proposal'
+        AND a.status = 'active'
+        AND a.auction_id IN (
+            SELECT auction_id
+            FROM auctions
+            WHERE origin_group_id = %s
+            AND operation = 'offer'
+        )
+        ORDER BY a.created_at DESC
+        """,
+        lambda rng, n: (GROUP_ID,),
+    ),
+    "my_properties": (
+        """
+        SELECT pr.request_id, pr.url AS request_url, pr.status, pr.created_at, pr.amount,
+               pr.status = 'ACCEPTED' AS has_receipt,
+               p.id AS p_id, p.name AS p_name, p.price AS p_price, p.currency AS p_currency,
+               p.bedrooms AS p_bedrooms, p.bathrooms AS p_bathrooms, p.m2 AS p_m2,
+               p.location AS p_location, p.img AS p_img, p.url AS p_url,
+               p.is_project AS p_is_project, p.timestamp AS p_timestamp,
+               p.visit_slots AS p_visit_slots
+        FROM purchase_requests pr
+        LEFT JOIN properties p ON pr.url = p.url
+        WHERE pr.user_id = %s
+        ORDER BY pr.created_at DESC, pr.request_id DESC
+        LIMIT %s
+        """,
+        lambda rng, n: (f"bench|u{rng.randrange(_users(n))}", 51),
+    ),
+    "purchase_admin_reservation": (
+        """
+        SELECT pr.request_id, pr.url, pr.status, p.price
+        FROM purchase_requests pr
+        LEFT JOIN properties p ON pr.url = p.url
+        WHERE pr.url = %s
+        AND pr.is_admin_reservation = TRUE
+        AND pr.status = 'ACCEPTED'
+        AND pr.purchased_by_user_id IS NULL
+        ORDER BY pr.created_at ASC
+        LIMIT 1
+        """,
+        lambda rng, n: (f"https://bench.local/p/{rng.randrange(1, n + 1)}",),
+    ),
+}
+
+
+def _users(n):
+    return max(n // 50, 10)
+
+
+# ---------- Datos sintéticos ----------
+def seed(cur, n):
+    users = _users(n)
+    print(f"🌱 Sembrando {SCHEMA}: {n} propiedades, {n} solicitudes, {users} usuarios...")
+    t0 = time.perf_counter()
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    for table in TABLES:
+        # INCLUDING ALL copia índices y defaults; las FK no se copian (no hacen falta aquí)
+        cur.execute(f"CREATE TABLE {SCHEMA}.{table} (LIKE public.{table} INCLUDING ALL)")
+
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.properties
+            (id, name, price, currency, bedrooms, bathrooms, m2, location, img, url,
+             is_project, timestamp, visit_slots)
+        SELECT i, 'Departamento ' || i, 30000000 + (i * 7919) %% 400000000, 'CLP',
+               1 + i %% 5, 1 + i %% 3, 30 + i %% 200,
+               jsonb_build_object('address', 'Calle ' || i || ', Comuna ' || (i %% 50)),
+               'https://bench.local/img/' || i || '.webp', 'https://bench.local/p/' || i,
+               i %% 10 = 0, NOW() - make_interval(mins => i), 1 + i %% 10
+        FROM generate_series(1, %s) AS i
+    """, (n,))
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.users (user_id, name, email)
+        SELECT 'bench|u' || i, 'Usuario ' || i, 'u' || i || '@bench.local'
+        FROM generate_series(0, %s - 1) AS i
+        UNION ALL SELECT %s, 'Admin', 'admin@bench.local'
+    """, (users, ADMIN_ID))
+    # 70% nuestras (con user_id), 30% de otros grupos; ~2% reservas del admin
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.purchase_requests
+            (request_id, user_id, group_id, url, status, amount, created_at,
+             is_admin_reservation, purchased_by_user_id)
+        SELECT gen_random_uuid(),
+               CASE WHEN i %% 50 = 0 THEN %s WHEN i %% 10 < 7 THEN 'bench|u' || (i %% %s) END,
+               CASE WHEN i %% 50 = 0 OR i %% 10 < 7 THEN %s ELSE 'g' || (i %% 20) END,
+               'https://bench.local/p/' || (1 + (i * 7919) %% %s),
+               (CASE WHEN i %% 20 < 14 THEN 'ACCEPTED' WHEN i %% 20 < 16 THEN 'PENDING'
+                     WHEN i %% 20 < 19 THEN 'REJECTED' ELSE 'ERROR' END)::request_status,
+               1000 + i %% 100000, NOW() - make_interval(secs => i * 7),
+               i %% 50 = 0,
+               CASE WHEN i %% 50 = 0 AND i %% 100 = 0 THEN 'bench|u' || (i %% %s) END
+        FROM generate_series(1, %s) AS i
+    """, (ADMIN_ID, users, GROUP_ID, n, users, n))
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.auctions
+            (auction_id, proposal_id, url, timestamp, quantity, group_id, operation,
+             origin_group_id, status, created_at)
+        SELECT gen_random_uuid(), CASE WHEN i %% 5 >= 3 THEN 'prop-' || i ELSE '' END,
+               'https://bench.local/p/' || (1 + (i * 104729) %% %s),
+               NOW() - make_interval(mins => i), 1, i %% 20,
+               CASE WHEN i %% 5 < 3 THEN 'offer' ELSE 'proposal' END,
+               CASE WHEN i %% 5 = 0 THEN %s ELSE 'g' || (i %% 20) END,
+               CASE WHEN i %% 10 < 7 THEN 'active' ELSE 'accepted' END,
+               NOW() - make_interval(mins => i)
+        FROM generate_series(1, %s) AS i
+    """, (n, GROUP_ID, max(n // 20, 100)))
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.admin_discounts (property_url, discount_percent, active)
+        SELECT 'https://bench.local/p/' || i, 0.05, i %% 3 <> 0
+        FROM generate_series(1, %s, 100) AS i
+    """, (n,))
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.transactions (id, user_id, type, amount, description, created_at)
+        SELECT 'tx_' || i, 'bench|u' || (i %% %s),
+               CASE WHEN i %% 4 = 0 THEN 'deposit' ELSE 'purchase' END,
+               1000 + i %% 5000, 'bench', NOW() - make_interval(secs => i * 11)
+        FROM generate_series(1, %s) AS i
+    """, (users, n))
+    cur.execute(f"COMMENT ON SCHEMA {SCHEMA} IS %s", (f"bench_queries scale={n}",))
+    for table in TABLES:
+        cur.execute(f"ANALYZE {SCHEMA}.{table}")
+    print(f"   listo en {time.perf_counter() - t0:.1f}s")
+
+
+def seeded_scale(cur):
+    cur.execute("SELECT obj_description(oid, 'pg_namespace') AS d FROM pg_namespace WHERE nspname = %s", (SCHEMA,))
+    row = cur.fetchone()
+    if row and row["d"] and row["d"].startswith("bench_queries scale="):
+        return int(row["d"].split("=", 1)[1])
+    return None
+
+
+# ---------- Medición ----------
+def _walk(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk(child)
+
+
+def explain(cur, sql, params):
+    cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params)
+    result = list(cur.fetchone().values())[0]
+    if isinstance(result, str):
+        result = json.loads(result)
+    top = result[0]
+    plan = top["Plan"]
+    nodes = list(_walk(plan))
+    return {
+        "execution_ms": top.get("Execution Time"),
+        "planning_ms": top.get("Planning Time"),
+        "shared_hit": plan.get("Shared Hit Blocks", 0),
+        "shared_read": plan.get("Shared Read Blocks", 0),
+        "seq_scans": sorted({x["Relation Name"] for x in nodes if x["Node Type"] == "Seq Scan"}),
+        "indexes": sorted({x["Index Name"] for x in nodes if x.get("Index Name")}),
+        "plan": result,
+    }
+
+
+def pct(sorted_values, p):
+    k = (len(sorted_values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def run_query(cur, name, n, runs, warmup, rng):
+    sql, make_params = QUERIES[name]
+    for _ in range(warmup):
+        cur.execute(sql, make_params(rng, n))
+        cur.fetchall()
+    times = []
+    for _ in range(runs):
+        params = make_params(rng, n)
+        t = time.perf_counter()
+        cur.execute(sql, params)
+        cur.fetchall()
+        times.append((time.perf_counter() - t) * 1000)
+    times.sort()
+    return {
+        "runs": runs,
+        "p50_ms": round(pct(times, 50), 3),
+        "p95_ms": round(pct(times, 95), 3),
+        "p99_ms": round(pct(times, 99), 3),
+        "mean_ms": round(statistics.fmean(times), 3),
+        "max_ms": round(times[-1], 3),
+        "explain": explain(cur, sql, make_params(rng, n)),
+    }
+
+
+# ---------- Comparación ----------
+def compare(results, baseline, tolerance):
+    regressions = []
+    print(f"\n📊 Comparación con la línea base ({baseline['created_at']}, tolerancia {tolerance:.0%})")
+    for name, cur_r in results["queries"].items():
+        base = baseline["queries"].get(name)
+        if not base:
+            print(f"   {name:28s} sin línea base")
+            continue
+        problems = []
+        p95_ratio = cur_r["p95_ms"] / max(base["p95_ms"], 0.001)
+        if p95_ratio > 1 + tolerance:
+            problems.append(f"p95 {base['p95_ms']:.2f} -> {cur_r['p95_ms']:.2f} ms")
+        blocks = cur_r["explain"]["shared_hit"] + cur_r["explain"]["shared_read"]
+        base_blocks = base["explain"]["shared_hit"] + base["explain"]["shared_read"]
+        if base_blocks and blocks / base_blocks > 1 + tolerance:
+            problems.append(f"bloques {base_blocks} -> {blocks}")
+        new_seq = set(cur_r["explain"]["seq_scans"]) - set(base["explain"]["seq_scans"])
+        if new_seq:
+            problems.append(f"Seq Scan nuevo en {', '.join(sorted(new_seq))}")
+        mark = "✗" if problems else "✓"
+        print(f"   {mark} {name:28s} p95 x{p95_ratio:.2f}  {'; '.join(problems)}")
+        if problems:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de consultas SQL de la API a escala")
+    parser.add_argument("--scale", choices=SCALES, default="10k")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--queries", nargs="*", choices=QUERIES, help="Subconjunto de consultas")
+    parser.add_argument("--reseed", action="store_true", help="Vuelve a sembrar aunque ya exista la escala")
+    parser.add_argument("--baseline", help="Archivo de línea base (default: scripts/query_baselines/{scale}.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="Guarda los resultados como línea base")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Aumento permitido (0.25 = 25%%)")
+    parser.add_argument("--output", help="Guarda los resultados (con los planes) en este archivo")
+    parser.add_argument("--cleanup", action="store_true", help="Borra el schema bench_q al terminar")
+    parser.add_argument("--yes", action="store_true", help="Permite sembrar en un DB_HOST que no es local")
+    args = parser.parse_args()
+
+    host = os.getenv("DB_HOST", "localhost")
+    if host not in LOCAL_HOSTS and not args.yes:
+        raise SystemExit(f"❌ DB_HOST={host} no parece local; usar --yes para sembrar datos ahí igualmente")
+
+    n = SCALES[args.scale]
+    conn = psycopg2.connect(
+        dbname=os.getenv("DB_NAME"), user=os.getenv("DB_USER"), password=os.getenv("DB_PASSWORD"),
+        host=host, port=os.getenv("DB_PORT", "5432"), cursor_factory=RealDictCursor,
+    )
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        if args.reseed or seeded_scale(cur) != n:
+            seed(cur, n)
+        cur.execute(f"SET search_path = {SCHEMA}, public")
+        cur.execute("SELECT version() AS v")
+        pg_version = cur.fetchone()["v"]
+
+        rng = random.Random(42)
+        results = {
+            "scale": args.scale,
+            "rows": n,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "postgres": pg_version,
+            "queries": {},
+        }
+        print(f"\n🧪 Consultas a escala {args.scale} ({args.runs} corridas, {args.warmup} de calentamiento)")
+        print("=" * 96)
+        for name in args.queries or QUERIES:
+            r = run_query(cur, name, n, args.runs, args.warmup, rng)
+            results["queries"][name] = r
+            e = r["explain"]
+            print(f"   {name:28s} p50 {r['p50_ms']:8.2f}  p95 {r['p95_ms']:8.2f}  p99 {r['p99_ms']:8.2f} ms"
+                  f"  bloques {e['shared_hit'] + e['shared_read']:7d}"
+                  f"  {'Seq Scan: ' + ','.join(e['seq_scans']) if e['seq_scans'] else ','.join(e['indexes'])}")
+    finally:
+        if args.cleanup:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cur.close()
+        conn.close()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, default=str)
+        print(f"\n💾 Resultados en {args.output}")
+
+    baseline_path = args.baseline or os.path.join(BASELINE_DIR, f"{args.scale}.json")
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, "w") as f:
+            json.dump(results, f, indent=2, default=str)
+        print(f"💾 Línea base guardada en {baseline_path}")
+        return 0
+    if not os.path.exists(baseline_path):
+        print(f"\nℹ Sin línea base en {baseline_path} (guardarla con --save-baseline)")
+        return 0
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if baseline.get("rows") != n:
+        print(f"\n⚠ La línea base es de otra escala ({baseline.get('scale')}); no se compara")
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n✗ {len(regressions)} consultas con regresión: {', '.join(regressions)}")
+        return 1
+    print("\n✓ Sin regresiones")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
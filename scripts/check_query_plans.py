@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Regresión de planes de las consultas frecuentes (ver migration_composite_indexes.sql).
+
+Corre EXPLAIN (FORMAT JSON) de cada consulta de HOT_QUERIES y falla (exit 1) si alguna
+hace Seq Scan sobre una de sus tablas. Por defecto planifica con enable_seqscan = off:
+así el resultado no depende del tamaño de la BD (con pocas filas el planner prefiere un
+Seq Scan aunque exista el índice) y un Seq Scan solo aparece cuando ningún índice sirve
+para la consulta. Con --realistic se usa el planner tal cual (útil en una copia de
+producción). También informa el índice usado y avisa si no es el esperado.
+
+Las consultas son copias de las de api/main.py: al cambiar una consulta allí, actualizarla
+aquí (y su índice en una migración).
+
+Uso: python scripts/check_query_plans.py [--realistic] [--verbose]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GROUP_ID = os.getenv("GROUP_ID", "gX")
+USER_ID = "check-plans|user"
+URL = "https://example.com/propiedad"
+
+# name, consulta, parámetros, tablas que no deben recorrerse completas, índice esperado
+HOT_QUERIES = [
+    {
+        "name": "cupos aceptados de otros grupos (GET /properties)",
+        "sql": """
+            SELECT COUNT(*) FROM purchase_requests pr
+            WHERE pr.url = %s AND pr.status = 'ACCEPTED'
+              AND (pr.group_id IS NULL OR pr.group_id <> %s)
+        """,
+        "params": (URL, GROUP_ID),
+        "tables": ("purchase_requests",),
+        "expect": "idx_pr_accepted_url_group",
+    },
+    {
+        "name": "reservas del admin disponibles (cupos / is_special_selection)",
+        "sql": """
+            SELECT 1 FROM purchase_requests pr
+            WHERE pr.url = %s AND pr.is_admin_reservation = TRUE
+              AND pr.status = 'ACCEPTED' AND pr.purchased_by_user_id IS NULL
+        """,
+        "params": (URL,),
+        "tables": ("purchase_requests",),
+        "expect": "idx_pr_admin_available_url",
+    },
+    {
+        "name": "reserva del admin más antigua (compra de reserva)",
+        "sql": """
+            SELECT pr.request_id FROM purchase_requests pr
+            WHERE pr.url = %s AND pr.is_admin_reservation = TRUE
+              AND pr.status = 'ACCEPTED' AND pr.purchased_by_user_id IS NULL
+            ORDER BY pr.created_at ASC LIMIT 1
+        """,
+        "params": (URL,),
+        "tables": ("purchase_requests",),
+        "expect": "idx_pr_admin_available_url",
+    },
+    {
+        "name": "selecciones del admin (GET /admin/selections)",
+        "sql": """
+            SELECT pr.request_id FROM purchase_requests pr
+            WHERE pr.user_id = %s AND pr.is_admin_reservation = TRUE
+            ORDER BY pr.created_at DESC
+        """,
+        "params": (USER_ID,),
+        "tables": ("purchase_requests",),
+        "expect": "idx_pr_admin_user_created",
+    },
+    {
+        "name": "historial del usuario (GET /my-properties)",
+        "sql": """
+            SELECT pr.request_id FROM purchase_requests pr
+            WHERE pr.user_id = %s
+            ORDER BY pr.created_at DESC, pr.request_id DESC LIMIT 51
+        """,
+        "params": (USER_ID,),
+        "tables": ("purchase_requests",),
+        "expect": "idx_pr_user_created",
+    },
+    {
+        "name": "ofertas activas de otros grupos (GET /admin/auctions/offers)",
+        "sql": """
+            SELECT a.auction_id FROM auctions a
+            WHERE (a.origin_group_id IS NULL OR a.origin_group_id != %s)
+              AND a.operation = 'offer' AND a.status = 'active'
+            ORDER BY a.created_at DESC
+        """,
+        "params": (GROUP_ID,),
+        "tables": ("auctions",),
+        "expect": "idx_auctions_op_status_created",
+    },
+    {
+        "name": "propuestas a nuestras ofertas (GET /admin/auctions/proposals)",
+        "sql": """
+            SELECT a.auction_id FROM auctions a
+            WHERE a.operation = 'proposal' AND a.status = 'active'
+              AND a.auction_id IN (
+                  SELECT auction_id FROM auctions
+                  WHERE origin_group_id = %s AND operation = 'offer'
+              )
+            ORDER BY a.created_at DESC
+        """,
+        "params": (GROUP_ID,),
+        "tables": ("auctions",),
+        "expect": None,
+    },
+    {
+        "name": "propuesta por proposal_id (aceptar / rechazar)",
+        "sql": """
+            SELECT a.auction_id FROM auctions a
+            WHERE a.proposal_id = %s AND a.origin_group_id = %s
+              AND a.operation = 'proposal' AND a.status = 'active'
+        """,
+        "params": ("proposal-1", GROUP_ID),
+        "tables": ("auctions",),
+        "expect": "idx_auctions_proposal",
+    },
+    {
+        "name": "movimientos de la billetera (GET /wallet/transactions)",
+        "sql": """
+            SELECT id, type, amount, description, created_at FROM transactions
+            WHERE user_id = %s ORDER BY created_at DESC
+        """,
+        "params": (USER_ID,),
+        "tables": ("transactions",),
+        "expect": "idx_transactions_user_created",
+    },
+    {
+        "name": "listado de propiedades (GET /properties)",
+        "sql": """
+            SELECT p.id FROM properties p
+            ORDER BY p.timestamp DESC LIMIT 25 OFFSET 0
+        """,
+        "params": (),
+        "tables": ("properties",),
+        "expect": "idx_properties_timestamp",
+    },
+]
+
+
+def walk(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from walk(child)
+
+
+def check(cur, query, realistic):
+    cur.execute("BEGIN")
+    try:
+        if not realistic:
+            cur.execute("SET LOCAL enable_seqscan = off")
+        cur.execute("EXPLAIN (FORMAT JSON) " + query["sql"], query["params"])
+        plan = cur.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+    finally:
+        cur.execute("ROLLBACK")
+    nodes = list(walk(plan[0]["Plan"]))
+    seq_scans = sorted({n["Relation Name"] for n in nodes
+                        if n["Node Type"] == "Seq Scan" and n.get("Relation Name") in query["tables"]})
+    indexes = sorted({n["Index Name"] for n in nodes if n.get("Index Name")})
+    return seq_scans, indexes, plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Falla si una consulta frecuente hace Seq Scan")
+    parser.add_argument("--realistic", action="store_true", help="No deshabilita enable_seqscan")
+    parser.add_argument("--verbose", action="store_true", help="Muestra el plan de las consultas que fallan")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(
+        dbname=os.getenv("DB_NAME"), user=os.getenv("DB_USER"), password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST", "localhost"), port=os.getenv("DB_PORT", "5432"),
+    )
+    conn.autocommit = True
+    cur = conn.cursor()
+    failed = 0
+    try:
+        for query in HOT_QUERIES:
+            seq_scans, indexes, plan = check(cur, query, args.realistic)
+            used = ", ".join(indexes) or "-"
+            if seq_scans:
+                failed += 1
+                print(f"✗ {query['name']}: Seq Scan en {', '.join(seq_scans)} (índices: {used})")
+                if args.verbose:
+                    print(json.dumps(plan, indent=2))
+            elif query["expect"] and query["expect"] not in indexes:
+                print(f"⚠ {query['name']}: usa {used}, se esperaba {query['expect']}")
+            else:
+                print(f"✓ {query['name']}: {used}")
+    finally:
+        cur.close()
+        conn.close()
+
+    print(f"\n{len(HOT_QUERIES) - failed}/{len(HOT_QUERIES)} consultas sin Seq Scan")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Verifica que los módulos copiados entre servicios sigan idénticos.
+
+Cada servicio se construye por separado (su Dockerfile solo copia su carpeta), así que los
+módulos compartidos viven como copias. Este script compara byte a byte cada copia con la
+primera de su grupo y falla (exit 1) mostrando el diff si alguna se desvió. Al cambiar uno
+de estos módulos, copiarlo a las demás carpetas; al agregar una copia nueva, sumarla aquí.
+
+Uso: python scripts/check_shared_modules.py
+"""
+
+import difflib
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SHARED_MODULES = {
+    "log_config.py": ["api", "mqtt_listener", "jobmaster", "jobmaster/worker"],
+    "codec.py": ["jobmaster", "jobmaster/worker"],
+    "receipt_keys.py": ["lambda-pdf-service", "api", "mqtt_listener"],
+}
+
+
+def _read(path):
+    with open(os.path.join(ROOT, path), "rb") as f:
+        return f.read()
+
+
+def check():
+    """Retorna la lista de copias que difieren de la primera de su grupo (o que faltan)."""
+    drifted = []
+    for name, dirs in SHARED_MODULES.items():
+        reference = f"{dirs[0]}/{name}"
+        expected = _read(reference)
+        for d in dirs[1:]:
+            path = f"{d}/{name}"
+            try:
+                actual = _read(path)
+            except FileNotFoundError:
+                print(f"❌ {path} no existe (copia de {reference})")
+                drifted.append(path)
+                continue
+            if actual == expected:
+                continue
+            drifted.append(path)
+            print(f"❌ {path} difiere de {reference}:")
+            sys.stdout.writelines(difflib.unified_diff(
+                expected.decode("utf-8", "replace").splitlines(keepends=True),
+                actual.decode("utf-8", "replace").splitlines(keepends=True),
+                fromfile=reference, tofile=path
+            ))
+    return drifted
+
+
+if __name__ == "__main__":
+    drifted = check()
+    if drifted:
+        print(f"\n{len(drifted)} copia(s) desviada(s): {', '.join(drifted)}")
+        sys.exit(1)
+    print(f"✅ Módulos compartidos idénticos: {', '.join(SHARED_MODULES)}")